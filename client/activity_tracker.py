@@ -0,0 +1,281 @@
+# Tracks which window has focus and records a timestamped event on every change.
+# Backends keep their platform handles (win32/AppKit/X11 connections) for the life of the agent.
+# Where the platform can notify us (Windows WinEvent hooks, X11 PropertyNotify) the tracker is
+# event-driven; otherwise it polls the backend cheaply and only records actual changes.
+import collections
+import logging
+import select
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_TITLE = "N/A (No active window title)"
+
+
+class FocusEvent:
+    """The window that gained focus, and when (epoch seconds)."""
+    __slots__ = ("timestamp", "title")
+
+    def __init__(self, timestamp, title):
+        self.timestamp = timestamp
+        self.title = title
+
+    def __repr__(self):
+        return f"FocusEvent({self.timestamp!r}, {self.title!r})"
+
+
+# --- Backends ---
+# A backend provides active_window_title() and watch(on_change, stop). watch() blocks, calling
+# on_change(title) on focus/title changes until stop is set, and returns False right away if the
+# backend cannot deliver events (the tracker then polls active_window_title()).
+
+class PollingBackend:
+    """Wraps a plain function; never event-driven."""
+    name = "polling"
+
+    def __init__(self, get_title):
+        self._get_title = get_title
+
+    def active_window_title(self):
+        return self._get_title()
+
+    def watch(self, on_change, stop):
+        return False
+
+
+class WindowsBackend:
+    """Foreground window via win32gui, with SetWinEventHook for focus and title changes."""
+    name = "win32"
+
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    EVENT_OBJECT_NAMECHANGE = 0x800C
+    WINEVENT_OUTOFCONTEXT = 0x0000
+    OBJID_WINDOW = 0
+    PM_REMOVE = 0x0001
+    QS_ALLINPUT = 0x04FF
+
+    def __init__(self):
+        import win32gui # Imported once; raises ImportError if pywin32 is missing
+        self._win32gui = win32gui
+
+    def _title_of(self, hwnd):
+        return self._win32gui.GetWindowText(hwnd) or UNKNOWN_TITLE
+
+    def active_window_title(self):
+        return self._title_of(self._win32gui.GetForegroundWindow())
+
+    def watch(self, on_change, stop):
+        import ctypes
+        from ctypes import wintypes
+        user32 = ctypes.WinDLL("user32") # Own instance: the prototypes below don't leak into ctypes.windll
+        WinEventProc = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                          wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+        # Without prototypes ctypes passes and returns C ints, truncating 64-bit handles
+        user32.SetWinEventHook.argtypes = [wintypes.DWORD, wintypes.DWORD, wintypes.HMODULE, WinEventProc,
+                                           wintypes.DWORD, wintypes.DWORD, wintypes.DWORD]
+        user32.SetWinEventHook.restype = wintypes.HANDLE
+        user32.UnhookWinEvent.argtypes = [wintypes.HANDLE]
+        user32.UnhookWinEvent.restype = wintypes.BOOL
+        user32.GetForegroundWindow.restype = wintypes.HWND
+
+        def callback(hook, event, hwnd, id_object, id_child, event_thread, event_time):
+            if event == self.EVENT_OBJECT_NAMECHANGE and (
+                    id_object != self.OBJID_WINDOW or hwnd != user32.GetForegroundWindow()):
+                return # Title change of some other (background) window or child object
+            on_change(self._title_of(hwnd))
+
+        proc = WinEventProc(callback) # Must stay referenced while the hooks are installed
+        hooks = [user32.SetWinEventHook(event, event, 0, proc, 0, 0, self.WINEVENT_OUTOFCONTEXT)
+                 for event in (self.EVENT_SYSTEM_FOREGROUND, self.EVENT_OBJECT_NAMECHANGE)]
+        if not all(hooks):
+            for hook in hooks:
+                if hook:
+                    user32.UnhookWinEvent(hook)
+            return False
+        try:
+            # Out-of-context hooks are delivered through this thread's message queue
+            msg = wintypes.MSG()
+            while not stop.is_set():
+                user32.MsgWaitForMultipleObjects(0, None, False, 500, self.QS_ALLINPUT)
+                while user32.PeekMessageW(ctypes.byref(msg), None, 0, 0, self.PM_REMOVE):
+                    user32.TranslateMessage(ctypes.byref(msg))
+                    user32.DispatchMessageW(ctypes.byref(msg))
+        finally:
+            for hook in hooks:
+                user32.UnhookWinEvent(hook)
+        return True
+
+
+class MacBackend:
+    """Frontmost application name via a cached NSWorkspace. Polled: workspace notifications
+    are only delivered on the main thread's run loop, which the agent does not run."""
+    name = "appkit"
+
+    def __init__(self):
+        from AppKit import NSWorkspace # Imported once; raises ImportError if pyobjc is missing
+        self._workspace = NSWorkspace.sharedWorkspace()
+
+    def active_window_title(self):
+        active_app = self._workspace.frontmostApplication()
+        return active_app.localizedName() if active_app else "N/A (No active app)"
+
+    def watch(self, on_change, stop):
+        return False
+
+
+class X11Backend:
+    """_NET_ACTIVE_WINDOW via python-xlib, with PropertyNotify events for focus and title changes."""
+    name = "x11"
+
+    def __init__(self, display_name=None):
+        from Xlib import X, display # Raises ImportError if python-xlib is missing
+        self._X = X
+        self._display = display.Display(display_name)
+        self._root = self._display.screen().root
+        self._active_atom = self._display.intern_atom('_NET_ACTIVE_WINDOW')
+        self._name_atoms = (self._display.intern_atom('_NET_WM_NAME'), self._display.intern_atom('WM_NAME'))
+        self._utf8_atom = self._display.intern_atom('UTF8_STRING')
+        self._watched_window = None
+
+    def _active_window(self):
+        prop = self._root.get_full_property(self._active_atom, self._X.AnyPropertyType)
+        if not prop or not prop.value or not prop.value[0]:
+            return None
+        return self._display.create_resource_object('window', prop.value[0])
+
+    def _title_of(self, window):
+        if window is None:
+            return UNKNOWN_TITLE
+        try:
+            prop = window.get_full_property(self._name_atoms[0], self._utf8_atom)
+            if prop and prop.value:
+                value = prop.value
+                return value.decode('utf-8', 'replace') if isinstance(value, bytes) else str(value)
+            return window.get_wm_name() or UNKNOWN_TITLE
+        except self._error_types():
+            return UNKNOWN_TITLE # Window closed between the lookup and the read
+
+    def _error_types(self):
+        from Xlib import error
+        return (error.BadWindow, error.BadMatch)
+
+    def active_window_title(self):
+        return self._title_of(self._active_window())
+
+    def _follow_active_window(self):
+        """Subscribes to title changes of the currently focused window only."""
+        window = self._active_window()
+        if window is not None and (self._watched_window is None or window.id != self._watched_window.id):
+            try:
+                window.change_attributes(event_mask=self._X.PropertyChangeMask)
+            except self._error_types():
+                window = None
+        self._watched_window = window
+        return window
+
+    def watch(self, on_change, stop):
+        X = self._X
+        self._root.change_attributes(event_mask=X.PropertyChangeMask)
+        self._display.flush()
+        on_change(self._title_of(self._follow_active_window()))
+        while not stop.is_set():
+            readable, _, _ = select.select([self._display], [], [], 0.5)
+            if not readable and not self._display.pending_events():
+                continue
+            changed = False
+            while self._display.pending_events():
+                event = self._display.next_event()
+                if event.type != X.PropertyNotify:
+                    continue
+                if event.window.id == self._root.id and event.atom == self._active_atom:
+                    changed = True
+                elif event.atom in self._name_atoms:
+                    changed = True
+            if changed:
+                on_change(self._title_of(self._follow_active_window()))
+        return True
+
+
+def create_backend(fallback_get_title):
+    """Picks the best backend for this platform, falling back to polling fallback_get_title."""
+    candidates = {"win32": WindowsBackend, "darwin": MacBackend}.get(sys.platform, X11Backend)
+    try:
+        return candidates()
+    except Exception as e: # ImportError, or no X display to connect to
+        logger.warning(f"{candidates.name} activity backend unavailable ({e}). Using polling.")
+        return PollingBackend(fallback_get_title)
+
+
+# --- Tracker ---
+class ActivityTracker:
+    """Runs a backend on its own thread and buffers FocusEvents until the next report drains them."""
+
+    def __init__(self, backend, poll_interval=2.0, max_events=1000):
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self._events = collections.deque(maxlen=max_events) # Oldest dropped if reports keep failing
+        self._current = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.event_driven = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ActivityTrackerThread", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        self._observe(self._read_title())
+        try:
+            self.event_driven = True
+            if self.backend.watch(self._observe, self._stop):
+                return
+        except Exception as e:
+            logger.warning(f"Focus events from {self.backend.name} failed ({e}). Falling back to polling.", exc_info=True)
+        self.event_driven = False
+        logger.info(f"Polling active window every {self.poll_interval}s ({self.backend.name}).")
+        while not self._stop.wait(self.poll_interval):
+            self._observe(self._read_title())
+
+    def _read_title(self):
+        try:
+            return self.backend.active_window_title()
+        except Exception as e:
+            logger.error(f"Error getting window title: {e}")
+            return "N/A (Error)"
+
+    def _observe(self, title):
+        """Records a FocusEvent only if the title differs from the current one."""
+        now = time.time()
+        with self._lock:
+            if title == self._current:
+                return
+            self._current = title
+            self._events.append(FocusEvent(now, title))
+
+    def current_title(self):
+        with self._lock:
+            return self._current if self._current is not None else UNKNOWN_TITLE
+
+    def drain(self):
+        """Returns and clears the buffered events, oldest first."""
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+    def restore(self, events):
+        """Puts events from a failed report back in front of newer ones."""
+        with self._lock:
+            newer = list(self._events)
+            self._events.clear()
+            self._events.extend(events)
+            self._events.extend(newer)
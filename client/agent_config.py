@@ -0,0 +1,161 @@
+# Server-pushed agent settings, cached locally so the agent starts with the last known config
+# even when the server is unreachable. See the server's /api/agent_config endpoint.
+import json
+import logging
+import os
+import threading
+import time
+import wire_format
+
+logger = logging.getLogger(__name__)
+
+# Intervals stretched when the server asks agents to shed load
+SHEDDABLE_INTERVALS = ("report_interval_seconds", "screenshot_interval_seconds")
+
+
+def load_bootstrap(path):
+    """Reads server_url / employee_id / client_secret overrides from a JSON file next to the agent.
+
+    Lets one build be deployed everywhere: only this small file differs per installation.
+    Returns {} if the file does not exist or cannot be read.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return {key: data[key] for key in ("server_url", "employee_id", "client_secret") if data.get(key)}
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read bootstrap config {path}: {e}")
+        return {}
+
+
+class AgentConfig:
+    """Holds the effective settings: built-in defaults overlaid with the server's document."""
+
+    def __init__(self, defaults, cache_path):
+        self.defaults = dict(defaults)
+        self.cache_path = cache_path
+        self._settings = dict(defaults)
+        self._etag = None
+        self._multiplier = 1 # Load-shedding hint from the server
+        self._ingest_url = None # Node this agent should send data to, when the server runs several
+        self._ingest_failed = False
+        self._report_format = (wire_format.JSON, None) # (Content-Type, Content-Encoding) for reports
+        self._report_format_rejected = False
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            return self._settings.get(name, self.defaults.get(name))
+
+    def interval(self, name):
+        """An interval setting with the server's current load-shedding multiplier applied."""
+        with self._lock:
+            value = self._settings.get(name, self.defaults.get(name))
+            return value * self._multiplier if name in SHEDDABLE_INTERVALS else value
+
+    def _apply(self, document):
+        settings = document.get("settings") or {}
+        with self._lock:
+            # Unknown keys are ignored so a newer server can't break an older agent
+            self._settings = dict(self.defaults, **{k: v for k, v in settings.items() if k in self.defaults})
+            self._multiplier = max(1, int((document.get("load_shedding") or {}).get("interval_multiplier", 1)))
+            self._ingest_url = (document.get("ingest_url") or "").rstrip("/") or None
+            self._ingest_failed = False
+            formats = document.get("report_formats") or {}
+            self._report_format = wire_format.choose(formats.get("content_types"), formats.get("encodings"))
+            self._report_format_rejected = False
+
+    def report_format(self):
+        """(Content-Type, Content-Encoding or None) to send reports with."""
+        with self._lock:
+            return (wire_format.JSON, None) if self._report_format_rejected else self._report_format
+
+    def note_report_format_rejected(self):
+        """Sends JSON until the next config refresh after a 415 (e.g. an ingest node without msgpack)."""
+        with self._lock:
+            if not self._report_format_rejected and self._report_format != (wire_format.JSON, None):
+                logger.warning(f"Server rejected report format {self._report_format}. Using JSON until the next config refresh.")
+                self._report_format_rejected = True
+                self._next_refresh = min(self._next_refresh, time.time() + 60)
+
+    def ingest_url(self, server_url):
+        """Base URL for reports and screenshots: the node the server assigned us, else server_url."""
+        with self._lock:
+            return self._ingest_url if self._ingest_url and not self._ingest_failed else server_url
+
+    def note_ingest_failure(self, url):
+        """Falls back to the main server URL until the next config refresh if our node is unreachable."""
+        with self._lock:
+            if self._ingest_url and url == self._ingest_url and not self._ingest_failed:
+                logger.warning(f"Ingest node {url} unreachable. Using the main server URL until the next config refresh.")
+                self._ingest_failed = True
+                self._next_refresh = min(self._next_refresh, time.time() + 60)
+
+    def load_cache(self):
+        """Applies the cached server config, if any. Returns True if one was loaded."""
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+            self._apply(cached.get("document") or {})
+            self._etag = cached.get("etag")
+            logger.info(f"Loaded cached agent config (etag {self._etag}).")
+            return True
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable agent config cache {self.cache_path}: {e}")
+            return False
+
+    def _save_cache(self, document):
+        try:
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"etag": self._etag, "document": document}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write agent config cache {self.cache_path}: {e}")
+
+    def refresh_due(self):
+        return time.time() >= self._next_refresh
+
+    def refresh(self, server_url, employee_id, client_secret):
+        """Fetches the config if it changed (ETag). Keeps the current settings on any failure."""
+        import requests # Imported here so the module itself stays cheap to import
+        self._next_refresh = time.time() + self.get("config_refresh_seconds")
+        headers = {'X-Client-Secret': client_secret}
+        if self._etag:
+            headers['If-None-Match'] = f'"{self._etag}"'
+        try:
+            response = requests.get(f"{server_url}/api/agent_config", params={"employee_id": employee_id},
+                                    headers=headers, timeout=10)
+            if response.status_code == 304:
+                logger.debug("Agent config unchanged (304).")
+                with self._lock:
+                    self._ingest_failed = False # Give our assigned ingest node another try
+                    self._report_format_rejected = False
+                return False
+            response.raise_for_status()
+            document = response.json()
+            self._etag = (response.headers.get('ETag') or '').strip('"') or None
+            self._apply(document)
+            self._save_cache(document)
+            self._next_refresh = time.time() + self.get("config_refresh_seconds")
+            logger.info(f"Agent config updated: {self._settings} (load-shed x{self._multiplier})")
+            return True
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"Could not refresh agent config, keeping current settings: {e}")
+            return False
+
+    def note_response(self, response):
+        """Picks up the X-Load-Shed-Multiplier hint from any ingest response."""
+        try:
+            multiplier = max(1, int(response.headers.get('X-Load-Shed-Multiplier', 1)))
+        except (TypeError, ValueError):
+            multiplier = 1
+        with self._lock:
+            if multiplier != self._multiplier:
+                logger.info(f"Server load-shedding multiplier changed: x{self._multiplier} -> x{multiplier}")
+            self._multiplier = multiplier
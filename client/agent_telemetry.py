@@ -0,0 +1,95 @@
+# Self-measurement of the agent's own overhead (CPU, memory, capture/upload cost).
+# A compact summary is attached to an activity report every TELEMETRY_INTERVAL_SECONDS.
+import threading
+import time
+
+
+class _Timing:
+    """Running count / total / max of one operation's duration in milliseconds."""
+    __slots__ = ("count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def merge(self, summary):
+        """Adds back a [count, avg_ms, max_ms] summary taken earlier."""
+        count, avg_ms, max_ms = summary
+        self.count += count
+        self.total_ms += count * avg_ms
+        self.max_ms = max(self.max_ms, max_ms)
+
+    def summary(self):
+        """[count, avg_ms, max_ms] - a list keeps the report payload small."""
+        avg = self.total_ms / self.count if self.count else 0.0
+        return [self.count, round(avg, 1), round(self.max_ms, 1)]
+
+
+class AgentTelemetry:
+    """Thread-safe accumulator for the agent's own resource usage between summaries."""
+
+    OPERATIONS = ("capture", "upload", "report")
+
+    def __init__(self, interval_seconds, get_rss_bytes=lambda: 0):
+        self.interval_seconds = interval_seconds
+        self._get_rss_bytes = get_rss_bytes
+        self._lock = threading.Lock()
+        self._reset(time.monotonic(), time.process_time())
+
+    def _reset(self, now, cpu):
+        self._window_start = now
+        self._cpu_start = cpu
+        self._timings = {name: _Timing() for name in self.OPERATIONS}
+        self._failures = {name: 0 for name in self.OPERATIONS}
+        self._upload_bytes = 0
+
+    def record(self, operation, seconds, num_bytes=0):
+        with self._lock:
+            self._timings[operation].add(seconds * 1000)
+            self._upload_bytes += num_bytes
+
+    def record_failure(self, operation):
+        with self._lock:
+            self._failures[operation] += 1
+
+    def due(self):
+        with self._lock:
+            return time.monotonic() - self._window_start >= self.interval_seconds
+
+    def take_summary(self):
+        """Returns the summary for the current window and starts a new one."""
+        now, cpu = time.monotonic(), time.process_time()
+        try:
+            rss_kb = int(self._get_rss_bytes() / 1024)
+        except Exception:
+            rss_kb = 0
+        with self._lock:
+            summary = {
+                "v": 1,
+                "interval_s": round(now - self._window_start, 1),
+                "cpu_s": round(cpu - self._cpu_start, 3), # CPU time used by the agent process in the window
+                "rss_kb": rss_kb,
+                "capture_ms": self._timings["capture"].summary(), # Screen grab + PNG encode
+                "upload_ms": self._timings["upload"].summary(),
+                "report_ms": self._timings["report"].summary(),
+                "upload_bytes": self._upload_bytes,
+                "failures": dict(self._failures),
+            }
+            self._reset(now, cpu)
+        return summary
+
+    def restore(self, summary):
+        """Merges a summary that could not be sent back into the current window, so it goes with the next one."""
+        with self._lock:
+            self._window_start -= summary["interval_s"]
+            self._cpu_start -= summary["cpu_s"]
+            for name in self.OPERATIONS:
+                self._timings[name].merge(summary[f"{name}_ms"])
+                self._failures[name] += summary["failures"].get(name, 0)
+            self._upload_bytes += summary["upload_bytes"]
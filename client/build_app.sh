@@ -16,7 +16,7 @@ pip3 install pyobjc-framework-Quartz pyobjc-framework-Cocoa
 # --windowed: Equivalent to --noconsole on Windows, creates a GUI app without a terminal
 # --name: Sets the name of the output .app bundle
 # Add --hidden-import if needed for pyobjc modules
-pyinstaller --windowed --name MonitorAgent client_agent.py macos_specific.py
+pyinstaller --windowed --name MonitorAgent client_agent.py macos_specific.py agent_telemetry.py agent_config.py screen_capture.py activity_tracker.py wire_format.py
 
 echo "---"
 echo "Build complete. Find the APP bundle in the 'dist' folder."
@@ -50,9 +50,14 @@ REM   --name      : Specify the name of the output executable file.
 REM   --hidden-import=win32timezone : Explicitly include modules PyInstaller might miss, common with pywin32.
 REM   client_agent.py    : Your main script.
 REM   windows_specific.py: Include platform-specific code (PyInstaller usually detects this, but explicit is safer).
+REM   agent_telemetry.py : Agent self-measurement helper (also picked up automatically via import).
+REM   agent_config.py    : Server-pushed settings with local cache (also picked up automatically via import).
+REM   screen_capture.py  : Multi-monitor capture with per-display change detection.
+REM   activity_tracker.py: Focus-change tracking (WinEvent hooks, polling fallback).
+REM   wire_format.py     : Compact report encoding (MessagePack/CBOR, zstd/gzip) when the server supports it.
 
 echo Running PyInstaller...
-pyinstaller --noconsole --onefile --name=MonitorAgent client_agent.py windows_specific.py --hidden-import=win32timezone
+pyinstaller --noconsole --onefile --name=MonitorAgent client_agent.py windows_specific.py agent_telemetry.py agent_config.py screen_capture.py activity_tracker.py wire_format.py --hidden-import=win32timezone
 
 IF %ERRORLEVEL% NEQ 0 (
     echo ERROR: PyInstaller failed to build the executable. Check the output above for specific errors.
@@ -74,6 +79,7 @@ echo [REMINDER] Ensure you have replaced placeholder values in client_agent.py:
 echo   - SERVER_URL
 echo   - EMPLOYEE_ID (Must be unique per installation)
 echo   - CLIENT_SECRET_KEY (Must match the server configuration)
+echo   (or ship a monitor_agent.json with server_url, employee_id, client_secret next to the EXE)
 echo [REMINDER] The final EXE might require Administrator privileges to run correctly
 echo          (e.g., for capturing screenshots or active window info reliably).
 echo ---
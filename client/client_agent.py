@@ -1,13 +1,20 @@
-import requests
+# requests and mss are imported inside the functions that use them: together they are most of the
+# agent's import time, and deferring them lets a cold start (e.g. at login) begin tracking sooner
 import time
-import mss # For screenshots
 import platform
 import threading
 import sys
 import io
 import os # Needed for logging path
+import json
+import uuid
 from datetime import datetime, timezone
 import logging # Basic logging for the client
+import activity_tracker
+import agent_telemetry
+import agent_config
+import screen_capture
+import wire_format
 
 # --- Configuration ---
 # IMPORTANT: Replace placeholders before building!
@@ -15,8 +22,27 @@ SERVER_URL = "http://10.0.1.126:5000" # <-- REPLACE WITH YOUR ACTUAL SERVER IP/D
 EMPLOYEE_ID = "EMP001" # <-- REPLACE with a unique ID for each employee/installation
 REPORT_INTERVAL_SECONDS = 60  # Send activity report every 60 seconds
 SCREENSHOT_INTERVAL_SECONDS = 300 # Take screenshot every 5 minutes (300 seconds)
+FOCUS_POLL_INTERVAL_SECONDS = 2 # Active window polling when the OS gives no focus-change events
+TELEMETRY_INTERVAL_SECONDS = 900 # Attach a summary of the agent's own overhead to a report every 15 minutes
 CLIENT_SECRET_KEY = "YOUR_STRONG_SHARED_SECRET_BETWEEN_SERVER_AND_CLIENTS" # <-- REPLACE with the actual secret key from server config
 
+# Defaults for settings the server can change at runtime via /api/agent_config
+DEFAULT_AGENT_SETTINGS = {
+    "report_interval_seconds": REPORT_INTERVAL_SECONDS,
+    "screenshot_interval_seconds": SCREENSHOT_INTERVAL_SECONDS,
+    "screenshots_enabled": True,
+    "activity_enabled": True,
+    "screenshot_format": "png", # "jpeg" requires Pillow; falls back to PNG without it
+    "png_compression_level": 6,
+    "jpeg_quality": 70,
+    "idle_skip_screenshot_seconds": 300, # Skip screenshots while the user has been idle this long (0 = never skip)
+    "capture_displays": "all", # "all", "primary" or a comma separated list of display numbers, e.g. "1,3"
+    "skip_unchanged_displays": True, # Only upload displays whose content changed since the last upload
+    "display_change_threshold_pct": 1.0, # Percent of screen tiles that must differ to count as changed
+    "unchanged_display_max_age_seconds": 3600, # Upload unchanged displays at least this often
+    "config_refresh_seconds": 900,
+}
+
 # --- Logging Setup ---
 # Determine base directory for log file (works for script and frozen EXE)
 if getattr(sys, 'frozen', False):
@@ -26,6 +52,13 @@ else:
     # If running as a script, log in the script's directory
     log_dir = os.path.dirname(__file__)
 
+# Optional per-installation overrides, so one build can be deployed to every machine:
+# monitor_agent.json next to the executable, e.g. {"server_url": "...", "employee_id": "EMP002", "client_secret": "..."}
+_bootstrap = agent_config.load_bootstrap(os.path.join(log_dir, "monitor_agent.json"))
+SERVER_URL = _bootstrap.get("server_url", SERVER_URL).rstrip("/")
+EMPLOYEE_ID = _bootstrap.get("employee_id", EMPLOYEE_ID)
+CLIENT_SECRET_KEY = _bootstrap.get("client_secret", CLIENT_SECRET_KEY)
+
 log_filename = f"monitor_agent_{EMPLOYEE_ID}.log" # Log file specific to employee
 log_filepath = os.path.join(log_dir, log_filename)
 
@@ -41,25 +74,39 @@ logger = logging.getLogger(__name__)
 logger.info(f"Logging initialized. Log file: {log_filepath}")
 
 # --- Platform Specific Imports ---
+def _linux_process_rss_bytes():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
 try:
     if platform.system() == "Windows":
-        from windows_specific import get_active_window_title, get_idle_time
+        from windows_specific import get_active_window_title, get_idle_time, get_process_rss_bytes
         logger.info("Imported Windows specific functions.")
     elif platform.system() == "Darwin": # macOS
-        from macos_specific import get_active_window_title, get_idle_time
+        from macos_specific import get_active_window_title, get_idle_time, get_process_rss_bytes
         logger.info("Imported macOS specific functions.")
     else:
         # Basic fallback for other OS (Linux desktop, etc.)
         logger.warning(f"Unsupported OS '{platform.system()}' for detailed activity tracking.")
         def get_active_window_title(): return "N/A (Unsupported OS)"
         def get_idle_time(): return 0
+        get_process_rss_bytes = _linux_process_rss_bytes
 except ImportError as e:
     logger.error(f"Could not import platform specific module: {e}. Activity/Idle tracking may fail.")
     def get_active_window_title(): return "N/A (Import Error)"
     def get_idle_time(): return 0
+    def get_process_rss_bytes(): return 0
 
 # --- Global State ---
 last_screenshot_time = 0
+screenshot_requested = threading.Event()
+telemetry = agent_telemetry.AgentTelemetry(TELEMETRY_INTERVAL_SECONDS, get_rss_bytes=get_process_rss_bytes)
+settings = agent_config.AgentConfig(DEFAULT_AGENT_SETTINGS,
+                                   os.path.join(log_dir, f"agent_config_cache_{EMPLOYEE_ID}.json"))
+tracker = None # activity_tracker.ActivityTracker, started in main_loop
 
 # --- Core Functions ---
 def get_utc_timestamp_iso():
@@ -78,90 +125,150 @@ def send_activity_report():
     current_thread = threading.current_thread()
     current_thread.name = f"ActivityReportThread-{current_thread.ident}" # Name thread for logging
 
+    import requests
     logger.info("Activity report thread started.")
     timestamp = get_utc_timestamp_iso()
     active_window = "Error"
     idle_time = -1
     try:
-        active_window = get_active_window_title()
+        active_window = tracker.current_title() # Kept up to date by the tracker thread, no OS call here
         idle_time = get_idle_time()
         logger.info(f"Collected activity: window='{active_window}', idle={idle_time}s")
     except Exception as e:
         logger.error(f"Error getting system info: {e}", exc_info=True)
+    focus_events = tracker.drain()
+    payload = {}
+    sent = False
+    try:
+        payload = {
+            "employee_id": EMPLOYEE_ID,
+            "timestamp_utc": timestamp,
+            "active_window": active_window,
+            "system_idle_time": int(idle_time), # Send as integer seconds
+            # Every focus change since the last report, oldest first: [timestamp_utc, window title]
+            "focus_events": [[datetime.fromtimestamp(event.timestamp, timezone.utc).isoformat(timespec='milliseconds'), event.title]
+                             for event in focus_events],
+        }
+        if telemetry.due():
+            payload["agent_stats"] = telemetry.take_summary() # Piggyback the agent's own overhead
+        # Most compact format the server advertised (MessagePack/CBOR, compressed if large), else JSON
+        content_type, encoding = settings.report_format()
+        body, headers = wire_format.encode(payload, content_type, encoding)
+        headers['X-Client-Secret'] = CLIENT_SECRET_KEY
 
-    payload = {
-        "employee_id": EMPLOYEE_ID,
-        "timestamp_utc": timestamp,
-        "active_window": active_window,
-        "system_idle_time": int(idle_time) # Send as integer seconds
-    }
-    headers = {'X-Client-Secret': CLIENT_SECRET_KEY, 'Content-Type': 'application/json'} # Explicit Content-Type
-
-    logger.info(f"Sending /api/report payload: {payload}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Sending /api/report payload ({headers['Content-Type']}, {len(body)} bytes): {payload}")
 
-    try:
-        url = f"{SERVER_URL}/api/report"
+        ingest_base = settings.ingest_url(SERVER_URL)
+        url = f"{ingest_base}/api/report"
         logger.info(f"Posting activity report to {url}")
-        response = requests.post(url, json=payload, headers=headers, timeout=15) # 15 sec timeout
+        send_start = time.perf_counter()
+        response = requests.post(url, data=body, headers=headers, timeout=15) # 15 sec timeout
+        settings.note_response(response)
+        if response.status_code == 415:
+            settings.note_report_format_rejected()
         response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+        sent = True
+        telemetry.record("report", time.perf_counter() - send_start)
         logger.info(f"Activity report sent successfully. Status: {response.status_code}, Response: {response.text}") # Log response text
     except requests.exceptions.RequestException as e:
+        telemetry.record_failure("report")
+        if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            settings.note_ingest_failure(ingest_base)
         logger.error(f"Failed to send activity report: {e}")
         if e.response is not None:
              logger.error(f"Server response: Status={e.response.status_code}, Text={e.response.text}")
     except Exception as e:
         logger.error(f"An unexpected error occurred sending activity report: {e}", exc_info=True)
+    finally:
+        if not sent:
+            tracker.restore(focus_events) # Resent with the next report
+            if "agent_stats" in payload:
+                telemetry.restore(payload["agent_stats"]) # Likewise the overhead summary
     logger.info("Activity report thread finished.")
 
 
-def take_and_send_screenshot():
-    """Takes a screenshot and uploads it to the server."""
-    global EMPLOYEE_ID, SERVER_URL, CLIENT_SECRET_KEY
-    current_thread = threading.current_thread()
-    current_thread.name = f"ScreenshotThread-{current_thread.ident}" # Name thread for logging
+def encode_screenshot(sct_img):
+    """Encodes a captured frame. Returns (bytes, file extension, MIME type)."""
+    import mss.tools
+    if settings.get("screenshot_format") == "jpeg":
+        try:
+            from PIL import Image
+            buffer = io.BytesIO()
+            Image.frombytes("RGB", sct_img.size, sct_img.rgb).save(
+                buffer, "JPEG", quality=settings.get("jpeg_quality"))
+            return buffer.getvalue(), "jpg", "image/jpeg"
+        except ImportError:
+            logger.warning("JPEG screenshots requested but Pillow is not installed. Using PNG.")
+    return mss.tools.to_png(sct_img.rgb, sct_img.size, level=settings.get("png_compression_level")), "png", "image/png"
 
-    logger.info("Screenshot thread started.")
+
+def take_and_send_screenshot(capturer):
+    """Captures the configured displays and uploads the changed ones in one multipart request."""
+    import mss
+    import requests
+    global EMPLOYEE_ID, SERVER_URL, CLIENT_SECRET_KEY
     timestamp_dt = datetime.now(timezone.utc) # Get datetime object
     # Format explicitly including 'T' separator and offset
     timestamp_iso = timestamp_dt.isoformat(timespec='seconds')
     logger.debug(f"Generated screenshot timestamp: {timestamp_iso}") # Example: 2025-04-29T13:07:51+00:00
 
     try:
-        with mss.mss() as sct:
-            # Capture the primary monitor
-            monitor = sct.monitors[1] # Index 1 is usually the primary monitor
-            logger.info(f"Capturing screenshot from monitor: {monitor}")
-            sct_img = sct.grab(monitor)
-
-            # Convert to PNG bytes in memory
-            img_bytes = mss.tools.to_png(sct_img.rgb, sct_img.size)
-            img_file = io.BytesIO(img_bytes)
-            logger.info(f"Screenshot taken, size: {len(img_bytes)} bytes")
-
-        # Prepare data for POST request (multipart/form-data)
-        screenshot_filename = f"{timestamp_dt.strftime('%Y%m%d_%H%M%S')}.png" # Simple filename
-        files = {'screenshot': (screenshot_filename, img_file, 'image/png')}
+        capture_start = time.perf_counter()
+        frames = capturer.capture(selection=settings.get("capture_displays"),
+                                  skip_unchanged=settings.get("skip_unchanged_displays"),
+                                  threshold=settings.get("display_change_threshold_pct") / 100,
+                                  max_unchanged_age=settings.get("unchanged_display_max_age_seconds"))
+        if not frames:
+            telemetry.record("capture", time.perf_counter() - capture_start)
+            logger.info("No display changed since the last upload. Skipping screenshot upload.")
+            return True
+
+        # Encode in memory using the server-configured format; one file part per display
+        files, displays, total_bytes = [], [], 0
+        for frame in frames:
+            img_bytes, img_ext, img_mime = encode_screenshot(frame.image)
+            field = f"screenshot_{frame.index}"
+            filename = f"{timestamp_dt.strftime('%Y%m%d_%H%M%S')}_d{frame.index}.{img_ext}"
+            files.append((field, (filename, io.BytesIO(img_bytes), img_mime)))
+            displays.append({"display": frame.index, "field": field, "changed": frame.changed,
+                             "left": frame.monitor["left"], "top": frame.monitor["top"],
+                             "width": frame.monitor["width"], "height": frame.monitor["height"]})
+            total_bytes += len(img_bytes)
+        telemetry.record("capture", time.perf_counter() - capture_start)
+        logger.info(f"Captured {len(frames)} display(s): {[d['display'] for d in displays]}, {total_bytes} bytes")
+
         payload = {
             'employee_id': EMPLOYEE_ID,
-            'timestamp_utc': timestamp_iso
+            'timestamp_utc': timestamp_iso,
+            'capture_id': uuid.uuid4().hex, # Links the per-display records of this capture on the server
+            'displays': json.dumps(displays),
         }
         # NOTE: Don't set Content-Type header manually for multipart/form-data, requests does it.
         headers = {'X-Client-Secret': CLIENT_SECRET_KEY}
 
-        logger.info(f"Sending /api/upload_screenshot payload: {payload}, filename: {screenshot_filename}")
-
-        url = f"{SERVER_URL}/api/upload_screenshot"
-        logger.info(f"Uploading screenshot to {url}")
-        response = requests.post(url, files=files, data=payload, headers=headers, timeout=30) # 30 sec timeout for upload
+        ingest_base = settings.ingest_url(SERVER_URL)
+        url = f"{ingest_base}/api/upload_screenshots"
+        logger.info(f"Uploading {len(files)} screenshot(s) to {url}, capture_id={payload['capture_id']}")
+        upload_start = time.perf_counter()
+        response = requests.post(url, files=files, data=payload, headers=headers, timeout=60) # 60 sec timeout for upload
+        settings.note_response(response)
         response.raise_for_status()
-        logger.info(f"Screenshot uploaded successfully. Status: {response.status_code}, Response: {response.text}") # Log response text
+        telemetry.record("upload", time.perf_counter() - upload_start, num_bytes=total_bytes)
+        capturer.mark_uploaded(frames)
+        logger.info(f"Screenshots uploaded successfully. Status: {response.status_code}, Response: {response.text}") # Log response text
         return True # Indicate success
 
     except (mss.ScreenShotError, IndexError) as e:
+        telemetry.record_failure("capture")
         logger.error(f"Failed to take screenshot: {e}", exc_info=True)
+        capturer.close() # Often a display was unplugged: re-read the monitor list next time
         return False
     except requests.exceptions.RequestException as e:
+        telemetry.record_failure("upload")
         logger.error(f"Failed to upload screenshot: {e}")
+        if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            settings.note_ingest_failure(ingest_base)
         # Log server response if available
         if e.response is not None:
              logger.error(f"Server response: Status={e.response.status_code}, Text={e.response.text}")
@@ -169,47 +276,80 @@ def take_and_send_screenshot():
     except Exception as e:
         logger.error(f"An unexpected error occurred during screenshot process: {e}", exc_info=True)
         return False
-    logger.info("Screenshot thread finished.")
+
+
+def screenshot_worker():
+    """Long-lived thread that owns the capture context and takes a screenshot whenever triggered."""
+    current_thread = threading.current_thread()
+    current_thread.name = "ScreenshotThread" # Name thread for logging
+    capturer = screen_capture.ScreenCapturer()
+    logger.info("Screenshot worker started.")
+    while True:
+        screenshot_requested.wait()
+        screenshot_requested.clear()
+        take_and_send_screenshot(capturer)
 
 
 # --- Main Loop ---
 def main_loop():
-    global last_screenshot_time
+    global last_screenshot_time, tracker
     main_thread = threading.current_thread()
     main_thread.name = "MainThread" # Name thread for logging
 
     logger.info(f"Client agent starting...")
     logger.info(f"Employee ID: {EMPLOYEE_ID}")
     logger.info(f"Server URL: {SERVER_URL}")
-    logger.info(f"Report Interval: {REPORT_INTERVAL_SECONDS}s, Screenshot Interval: {SCREENSHOT_INTERVAL_SECONDS}s")
+    logger.info(f"Report Interval: {REPORT_INTERVAL_SECONDS}s, Screenshot Interval: {SCREENSHOT_INTERVAL_SECONDS}s, Telemetry Interval: {TELEMETRY_INTERVAL_SECONDS}s")
+
+    threading.Thread(target=screenshot_worker, daemon=True).start()
+    tracker = activity_tracker.ActivityTracker(activity_tracker.create_backend(get_active_window_title),
+                                               poll_interval=FOCUS_POLL_INTERVAL_SECONDS).start()
+    logger.info(f"Activity tracker started with the {tracker.backend.name} backend.")
+
+    # Start from the last config we received, then ask the server for the current one: in the
+    # background if there was a cached config, so a slow or unreachable server doesn't hold up the
+    # first report; without one we need the server's settings first
+    if settings.load_cache():
+        threading.Thread(target=settings.refresh, args=(SERVER_URL, EMPLOYEE_ID, CLIENT_SECRET_KEY),
+                         name="ConfigRefreshThread", daemon=True).start()
+    else:
+        settings.refresh(SERVER_URL, EMPLOYEE_ID, CLIENT_SECRET_KEY)
 
     # Initialize last screenshot time correctly relative to current time
-    last_screenshot_time = time.time() - SCREENSHOT_INTERVAL_SECONDS # Ensure first screenshot runs soon if needed
+    last_screenshot_time = time.time() - settings.interval("screenshot_interval_seconds") # Ensure first screenshot runs soon if needed
 
     while True:
         current_time = time.time()
         logger.debug(f"Main loop iteration. Current time: {current_time}") # Debug log level
 
         try:
+            if settings.refresh_due():
+                settings.refresh(SERVER_URL, EMPLOYEE_ID, CLIENT_SECRET_KEY)
+
             # Send Activity Report Thread
-            logger.debug("Starting activity report thread.")
-            activity_thread = threading.Thread(target=send_activity_report, daemon=True)
-            activity_thread.start()
+            if settings.get("activity_enabled"):
+                logger.debug("Starting activity report thread.")
+                activity_thread = threading.Thread(target=send_activity_report, daemon=True)
+                activity_thread.start()
 
             # Check if it's time for a screenshot
             time_since_last_screenshot = current_time - last_screenshot_time
             logger.debug(f"Time since last screenshot: {time_since_last_screenshot:.2f}s")
-            if time_since_last_screenshot >= SCREENSHOT_INTERVAL_SECONDS:
-                logger.info("Screenshot interval reached. Starting screenshot thread.")
-                 # Run in a separate thread
-                screenshot_thread = threading.Thread(target=take_and_send_screenshot, daemon=True)
-                screenshot_thread.start()
-                last_screenshot_time = current_time # Update time
-            else:
+            idle_skip_seconds = settings.get("idle_skip_screenshot_seconds")
+            if not settings.get("screenshots_enabled"):
+                logger.debug("Screenshots disabled by server config.")
+            elif time_since_last_screenshot < settings.interval("screenshot_interval_seconds"):
                 logger.debug("Screenshot interval not reached.")
+            elif idle_skip_seconds and get_idle_time() >= idle_skip_seconds:
+                # Screen is unlikely to change while nobody uses it; capture as soon as the user is back
+                logger.info(f"Screenshot skipped: user idle for at least {idle_skip_seconds}s.")
+            else:
+                logger.info("Screenshot interval reached. Triggering screenshot worker.")
+                screenshot_requested.set() # Handled by the long-lived screenshot worker thread
+                last_screenshot_time = current_time # Update time
 
             # Wait before next cycle
-            sleep_duration = REPORT_INTERVAL_SECONDS
+            sleep_duration = settings.interval("report_interval_seconds")
             logger.debug(f"Sleeping for {sleep_duration} seconds.")
             time.sleep(sleep_duration)
 
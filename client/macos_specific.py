@@ -32,4 +32,35 @@ def get_idle_time():
     except ImportError:
         return 0
     except Exception:
-        return 0 # Error getting idle time
\ No newline at end of file
+        return 0 # Error getting idle time
+
+
+def get_process_rss_bytes():
+    """Gets the agent's current resident memory in bytes on macOS (like the working set on Windows).
+
+    Uses task_info(MACH_TASK_BASIC_INFO); ru_maxrss would be the peak, not the current value.
+    """
+    if sys.platform != 'darwin':
+        return 0
+    try:
+        import ctypes
+        import ctypes.util
+
+        class MachTaskBasicInfo(ctypes.Structure):
+            _fields_ = [("virtual_size", ctypes.c_uint64), ("resident_size", ctypes.c_uint64),
+                        ("resident_size_max", ctypes.c_uint64), ("user_time", ctypes.c_int32 * 2),
+                        ("system_time", ctypes.c_int32 * 2), ("policy", ctypes.c_int32),
+                        ("suspend_count", ctypes.c_int32)]
+
+        MACH_TASK_BASIC_INFO = 20
+        libc = ctypes.CDLL(ctypes.util.find_library("c"))
+        libc.mach_task_self.restype = ctypes.c_uint32
+        libc.task_info.argtypes = [ctypes.c_uint32, ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint32)]
+        libc.task_info.restype = ctypes.c_int
+        info = MachTaskBasicInfo()
+        count = ctypes.c_uint32(ctypes.sizeof(info) // 4) # In natural_t units
+        if libc.task_info(libc.mach_task_self(), MACH_TASK_BASIC_INFO, ctypes.byref(info), ctypes.byref(count)) != 0:
+            return 0
+        return info.resident_size
+    except Exception:
+        return 0 # Error getting memory info
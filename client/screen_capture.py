@@ -0,0 +1,112 @@
+# Multi-monitor screen capture with per-display change detection.
+# The mss instance is reused between captures; mss handles are tied to the thread that created
+# them, so a ScreenCapturer must only be used from one (the screenshot worker) thread. mss reads
+# the monitor list once per instance, so the instance is re-created every MONITOR_REFRESH_SECONDS
+# (and after a failed capture, see close()) to pick up displays that were added or removed.
+import time
+import zlib
+
+# Displays are compared on a GRID x GRID tile grid, sampling every ROW_STEP-th pixel row of each tile
+GRID = 16
+ROW_STEP = 4
+MONITOR_REFRESH_SECONDS = 60
+
+
+def parse_display_selection(selection, count):
+    """Turns 'all', 'primary' or '1,3' into a list of 1-based monitor indexes that exist."""
+    if selection == "primary":
+        return [1] if count >= 1 else []
+    if selection in (None, "", "all"):
+        return list(range(1, count + 1))
+    indexes = []
+    for part in str(selection).split(","):
+        part = part.strip()
+        if part.isdigit() and 1 <= int(part) <= count and int(part) not in indexes:
+            indexes.append(int(part))
+    return indexes
+
+
+def tile_fingerprint(raw, width, height, bytes_per_pixel=4):
+    """CRC of each tile of a BGRA frame; cheap enough to run on every capture."""
+    stride = width * bytes_per_pixel
+    view = memoryview(raw)
+    tiles = []
+    for tile_row in range(GRID):
+        y_start, y_end = tile_row * height // GRID, (tile_row + 1) * height // GRID
+        for tile_col in range(GRID):
+            x_start = tile_col * width // GRID * bytes_per_pixel
+            x_end = (tile_col + 1) * width // GRID * bytes_per_pixel
+            crc = 0
+            for y in range(y_start, y_end, ROW_STEP):
+                offset = y * stride
+                crc = zlib.crc32(view[offset + x_start:offset + x_end], crc)
+            tiles.append(crc)
+    return tiles
+
+
+def changed_fraction(previous, current):
+    if previous is None or len(previous) != len(current):
+        return 1.0
+    return sum(1 for a, b in zip(previous, current) if a != b) / len(current)
+
+
+class DisplayFrame:
+    __slots__ = ("index", "monitor", "image", "fingerprint", "changed")
+
+    def __init__(self, index, monitor, image, fingerprint, changed):
+        self.index = index
+        self.monitor = monitor
+        self.image = image
+        self.fingerprint = fingerprint
+        self.changed = changed
+
+
+class ScreenCapturer:
+    """Captures the selected displays and reports which of them changed since the last upload."""
+
+    def __init__(self):
+        self._sct = None
+        self._opened_at = 0
+        self._monitors = None # Display geometry seen by the current instance
+        self._uploaded = {} # display index -> (fingerprint, upload time)
+
+    def _grabber(self):
+        if self._sct is not None and time.monotonic() - self._opened_at >= MONITOR_REFRESH_SECONDS:
+            self.close()
+        if self._sct is None:
+            import mss # Imported on first capture, in the thread that will keep using it
+            self._sct = mss.mss()
+            self._opened_at = time.monotonic()
+            monitors = self._sct.monitors[1:]
+            if self._monitors is not None and monitors != self._monitors:
+                self._uploaded.clear() # Displays were added, removed or rearranged: indexes may now differ
+            self._monitors = monitors
+        return self._sct
+
+    def capture(self, selection="all", skip_unchanged=True, threshold=0.01, max_unchanged_age=3600):
+        """Grabs the selected displays. Returns the DisplayFrames that should be uploaded."""
+        sct = self._grabber()
+        monitors = sct.monitors # [0] is the virtual screen spanning all displays, [1:] the real ones
+        frames = []
+        now = time.time()
+        for index in parse_display_selection(selection, len(monitors) - 1):
+            monitor = monitors[index]
+            image = sct.grab(monitor)
+            fingerprint = tile_fingerprint(image.raw, image.width, image.height)
+            previous, uploaded_at = self._uploaded.get(index, (None, 0))
+            changed = changed_fraction(previous, fingerprint) > threshold
+            if changed or not skip_unchanged or now - uploaded_at >= max_unchanged_age:
+                frames.append(DisplayFrame(index, monitor, image, fingerprint, changed))
+        return frames
+
+    def mark_uploaded(self, frames):
+        """Records frames as the new baseline. Call only after the upload succeeded."""
+        now = time.time()
+        for frame in frames:
+            self._uploaded[frame.index] = (frame.fingerprint, now)
+
+    def close(self):
+        """Releases the mss instance; the next capture opens a new one and re-reads the monitor list."""
+        if self._sct is not None:
+            self._sct.close()
+            self._sct = None
@@ -28,4 +28,18 @@ def get_idle_time():
      except ImportError:
          return 0
      except Exception:
-        return 0 # Error getting idle time
\ No newline at end of file
+        return 0 # Error getting idle time
+
+
+def get_process_rss_bytes():
+    """Gets the agent's own working set size in bytes on Windows."""
+    if sys.platform != 'win32':
+        return 0
+    try:
+        import win32api
+        import win32process
+        return win32process.GetProcessMemoryInfo(win32api.GetCurrentProcess())['WorkingSetSize']
+    except ImportError:
+        return 0
+    except Exception:
+        return 0 # Error getting memory info
@@ -0,0 +1,63 @@
+# Encodes activity reports for /api/report in the most compact format both sides support.
+# The server lists what it accepts in /api/agent_config ("report_formats"); see server/wire_format.py.
+# msgpack and zstandard (and cbor2, for encode()) are optional: without them reports are sent as (gzip-compressed) JSON.
+import gzip
+import importlib.util
+import json
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+# MessagePack is the smallest and cheapest to parse. CBOR is accepted and can be encoded, but cbor2
+# serializes and parses slower than json (server/benchmarks/bench_wire.py), so it is never picked automatically.
+CONTENT_TYPE_PREFERENCE = (MSGPACK, JSON)
+ENCODING_PREFERENCE = ("zstd", "gzip")
+COMPRESS_MIN_BYTES = 512 # A report without focus events is smaller than the compression overhead saves
+
+
+def _module_available(name):
+    return importlib.util.find_spec(name) is not None # Without importing it: keeps agent start-up cheap
+
+
+def local_content_types():
+    available = {MSGPACK: _module_available("msgpack"), JSON: True}
+    return [content_type for content_type in CONTENT_TYPE_PREFERENCE if available[content_type]]
+
+
+def local_encodings():
+    available = {"zstd": _module_available("zstandard"), "gzip": True}
+    return [encoding for encoding in ENCODING_PREFERENCE if available[encoding]]
+
+
+def choose(server_content_types, server_encodings):
+    """(content_type, encoding) to use: the preferred format both sides support; encoding may be None.
+
+    Servers that don't advertise formats (older versions) only get plain JSON.
+    """
+    content_type = next((ct for ct in local_content_types() if ct in (server_content_types or ())), JSON)
+    encoding = next((enc for enc in local_encodings() if enc in (server_encodings or ())), None)
+    return content_type, encoding
+
+
+def encode(payload, content_type=JSON, encoding=None):
+    """Serializes payload. Returns (body bytes, headers dict with Content-Type/Content-Encoding)."""
+    if content_type == MSGPACK:
+        import msgpack
+        body = msgpack.packb(payload, use_bin_type=True)
+    elif content_type == CBOR:
+        import cbor2
+        body = cbor2.dumps(payload)
+    else:
+        content_type = JSON
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    headers = {"Content-Type": content_type}
+    if encoding and len(body) >= COMPRESS_MIN_BYTES:
+        if encoding == "zstd":
+            import zstandard
+            body = zstandard.ZstdCompressor(level=3).compress(body)
+        else:
+            encoding = "gzip"
+            body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = encoding
+    return body, headers
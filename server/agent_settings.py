@@ -0,0 +1,141 @@
+import hashlib
+import json
+import threading
+import time
+import config
+
+# Settings the server may push to agents: name -> (type, default, min, max / allowed values)
+SCHEMA = {
+    "report_interval_seconds": (int, config.AGENT_DEFAULT_REPORT_INTERVAL_SECONDS, 10, 3600),
+    "screenshot_interval_seconds": (int, config.AGENT_DEFAULT_SCREENSHOT_INTERVAL_SECONDS, 30, 86400),
+    "screenshots_enabled": (bool, True, None, None),
+    "activity_enabled": (bool, True, None, None),
+    "screenshot_format": (str, "png", None, ("png", "jpeg")),
+    "png_compression_level": (int, 6, 0, 9),
+    "jpeg_quality": (int, 70, 10, 95),
+    "idle_skip_screenshot_seconds": (int, 300, 0, 86400), # 0 = always capture
+    "config_refresh_seconds": (int, 900, 60, 86400),
+    "capture_displays": ("displays", "all", None, None), # "all", "primary" or e.g. "1,3"
+    "skip_unchanged_displays": (bool, True, None, None),
+    "display_change_threshold_pct": (float, 1.0, 0.0, 100.0),
+    "unchanged_display_max_age_seconds": (int, 3600, 60, 86400),
+}
+
+DEFAULTS = {name: spec[1] for name, spec in SCHEMA.items()}
+
+def validate_settings(settings):
+    """Checks a partial settings dict against SCHEMA. Returns (clean_settings, errors)."""
+    clean, errors = {}, []
+    if not isinstance(settings, dict):
+        return {}, ["Settings must be a JSON object"]
+    for name, value in settings.items():
+        spec = SCHEMA.get(name)
+        if spec is None:
+            errors.append(f"Unknown setting '{name}'")
+            continue
+        kind, _, low, high = spec
+        if kind is bool:
+            if not isinstance(value, bool):
+                errors.append(f"'{name}' must be true or false")
+                continue
+        elif kind is int:
+            if isinstance(value, bool) or not isinstance(value, int):
+                errors.append(f"'{name}' must be an integer")
+                continue
+            if not low <= value <= high:
+                errors.append(f"'{name}' must be between {low} and {high}")
+                continue
+        elif kind is str:
+            if value not in high:
+                errors.append(f"'{name}' must be one of {', '.join(high)}")
+                continue
+        elif kind is float:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                errors.append(f"'{name}' must be a number")
+                continue
+            if not low <= value <= high:
+                errors.append(f"'{name}' must be between {low} and {high}")
+                continue
+            value = float(value)
+        elif kind == "displays":
+            if not isinstance(value, str) or (value not in ("all", "primary") and not all(
+                    part.strip().isdigit() and int(part) >= 1 for part in value.split(","))):
+                errors.append(f"'{name}' must be 'all', 'primary' or display numbers like '1,3'")
+                continue
+        clean[name] = value
+    return clean, errors
+
+
+def merge_settings(*layers):
+    """Merges DEFAULTS with the given partial settings, later layers winning."""
+    merged = dict(DEFAULTS)
+    for layer in layers:
+        if layer:
+            merged.update(layer)
+    return merged
+
+
+def compute_etag(document):
+    body = json.dumps(document, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+# --- Load Shedding ---
+class LoadShedder:
+    """
+    Tracks ingest latency (exponentially weighted) and requests in flight for this process,
+    and turns them into an interval multiplier hint for agents: 1 (normal), 2 or 4.
+
+    The latency average also decays with elapsed time (halving every decay_half_life seconds),
+    so a burst of slow requests followed by quiet traffic doesn't keep agents backed off.
+    """
+
+    def __init__(self, latency_threshold_ms, inflight_threshold, alpha=0.1, hold_seconds=60, decay_half_life=10):
+        self.latency_threshold = latency_threshold_ms / 1000
+        self.inflight_threshold = inflight_threshold
+        self.alpha = alpha
+        self.hold_seconds = hold_seconds # Keep shedding at least this long once triggered, to avoid flapping
+        self.decay_half_life = decay_half_life
+        self._ewma = 0.0
+        self._ewma_updated = time.monotonic()
+        self._inflight = 0
+        self._level = 1
+        self._level_since = 0.0
+        self._lock = threading.Lock()
+
+    def request_started(self):
+        with self._lock:
+            self._inflight += 1
+
+    def _decay(self, now):
+        """Ages the latency average to now. Caller holds the lock."""
+        elapsed = now - self._ewma_updated
+        if elapsed > 0 and self.decay_half_life:
+            self._ewma *= 0.5 ** (elapsed / self.decay_half_life)
+        self._ewma_updated = now
+
+    def request_finished(self, seconds):
+        with self._lock:
+            self._inflight -= 1
+            self._decay(time.monotonic())
+            self._ewma = self.alpha * seconds + (1 - self.alpha) * self._ewma
+
+    def interval_multiplier(self):
+        if not config.LOAD_SHED_ENABLED:
+            return 1
+        with self._lock:
+            self._decay(time.monotonic())
+            pressure = max(self._ewma / self.latency_threshold if self.latency_threshold else 0,
+                           self._inflight / self.inflight_threshold if self.inflight_threshold else 0)
+            level = 4 if pressure >= 2 else 2 if pressure >= 1 else 1
+            now = time.monotonic()
+            if level >= self._level:
+                if level > 1:
+                    self._level_since = now
+                self._level = level
+            elif now - self._level_since >= self.hold_seconds:
+                self._level = level
+            return self._level
+
+
+load_shedder = LoadShedder(config.LOAD_SHED_LATENCY_MS, config.LOAD_SHED_INFLIGHT)
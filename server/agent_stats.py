@@ -0,0 +1,117 @@
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+FAILURE_KINDS = ("capture", "upload", "report")
+TIMED_OPERATIONS = ("capture", "upload", "report")
+
+# Per-agent figures shown on the fleet page: (key, label)
+FLEET_METRICS = [
+    ("cpu_pct", "CPU (% of one core)"),
+    ("rss_mb", "Memory RSS (MB, max)"),
+    ("capture_ms_avg", "Capture + encode (ms, avg)"),
+    ("capture_ms_max", "Capture + encode (ms, max)"),
+    ("upload_ms_avg", "Screenshot upload (ms, avg)"),
+    ("report_ms_avg", "Activity report (ms, avg)"),
+    ("upload_mb_per_hour", "Upload volume (MB/hour)"),
+    ("failures_per_hour", "Failures (per hour)"),
+]
+
+
+def _finite(value):
+    """float(value), rejecting NaN and Infinity (Python's JSON parser accepts both)."""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"non-finite number {value!r}")
+    return number
+
+
+def _timing(value):
+    """Parses the agent's [count, avg_ms, max_ms] triple."""
+    if not isinstance(value, (list, tuple)) or len(value) != 3:
+        return 0, 0.0, 0.0
+    count, avg_ms, max_ms = value
+    return max(0, int(_finite(count))), max(0.0, _finite(avg_ms)), max(0.0, _finite(max_ms))
+
+
+def normalize_agent_stats(stats):
+    """Validates the compact summary sent by client/agent_telemetry.py and flattens it for storage.
+
+    Returns None if the summary is unusable.
+    """
+    if not isinstance(stats, dict):
+        return None
+    try:
+        interval_s = _finite(stats.get("interval_s", 0))
+        if interval_s <= 0:
+            return None
+        cpu_s = max(0.0, _finite(stats.get("cpu_s", 0)))
+        document = {
+            "interval_s": interval_s,
+            "cpu_s": cpu_s,
+            "cpu_pct": round(cpu_s / interval_s * 100, 3),
+            "rss_kb": max(0, int(_finite(stats.get("rss_kb", 0)))),
+            "upload_bytes": max(0, int(_finite(stats.get("upload_bytes", 0)))),
+        }
+        for operation in TIMED_OPERATIONS:
+            count, avg_ms, max_ms = _timing(stats.get(f"{operation}_ms"))
+            document[f"{operation}_count"] = count
+            document[f"{operation}_ms_avg"] = avg_ms
+            document[f"{operation}_ms_max"] = max_ms
+        failures = stats.get("failures") or {}
+        for kind in FAILURE_KINDS:
+            document[f"failures_{kind}"] = max(0, int(_finite(failures.get(kind, 0))))
+        document["failures_total"] = sum(document[f"failures_{kind}"] for kind in FAILURE_KINDS)
+        return document
+    except (TypeError, ValueError, AttributeError) as e:
+        logger.warning(f"Discarding malformed agent_stats {stats!r}: {e}")
+        return None
+
+
+def per_agent_figures(group):
+    """Turns one employee's aggregated telemetry (see models.get_agent_telemetry_by_employee) into fleet figures."""
+    interval_hours = group["interval_s"] / 3600 if group["interval_s"] else None
+
+    def weighted_avg(operation):
+        count = group[f"{operation}_count"]
+        return round(group[f"{operation}_ms_total"] / count, 1) if count else None
+
+    return {
+        "employee_id": group["_id"],
+        "cpu_pct": round(group["cpu_s"] / group["interval_s"] * 100, 2) if group["interval_s"] else None,
+        "rss_mb": round(group["rss_kb_max"] / 1024, 1),
+        "capture_ms_avg": weighted_avg("capture"),
+        "capture_ms_max": round(group["capture_ms_max"], 1),
+        "upload_ms_avg": weighted_avg("upload"),
+        "report_ms_avg": weighted_avg("report"),
+        "upload_mb_per_hour": round(group["upload_bytes"] / 1024 / 1024 / interval_hours, 2) if interval_hours else None,
+        "failures_per_hour": round(group["failures_total"] / interval_hours, 2) if interval_hours else None,
+    }
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    # Smallest value with at least fraction of the values at or below it. round() drops float noise
+    # (0.7 * 90 is 63.00000000000001), which ceil would turn into the next rank
+    index = min(len(sorted_values) - 1, max(0, math.ceil(round(fraction * len(sorted_values), 9)) - 1))
+    return sorted_values[index]
+
+
+def fleet_percentiles(agents):
+    """Returns [{key, label, p50, p90, p99, max, agents}] across all agents for each fleet metric."""
+    rows = []
+    for key, label in FLEET_METRICS:
+        values = sorted(agent[key] for agent in agents if agent.get(key) is not None)
+        rows.append({
+            "key": key,
+            "label": label,
+            "agents": len(values),
+            "p50": percentile(values, 0.50),
+            "p90": percentile(values, 0.90),
+            "p99": percentile(values, 0.99),
+            "max": values[-1] if values else None,
+        })
+    return rows
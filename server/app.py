@@ -1,39 +1,44 @@
-from flask import Flask
+from flask import Flask, jsonify, request, Response, abort
+from datetime import timedelta
+import hmac
 import config
 import models
 import routes
+import timefmt
+import metrics
+import agent_settings
 import logging
-from datetime import datetime, timezone # Import timezone
-import pytz # Import pytz
 
-# --- Define IST Timezone ---
-IST = pytz.timezone('Asia/Kolkata')
-
-# --- Custom Jinja Filter for IST Formatting ---
+# --- Scrape-Time Metrics ---
+# Agents counted by how recently they last reported
+AGENT_FRESHNESS_WINDOWS = {"5m": timedelta(minutes=5), "1h": timedelta(hours=1), "24h": timedelta(hours=24)}
+
+metrics.CallbackGauge(
+    "em_agents_seen", "Employees whose agent reported within the given window.",
+    lambda: {(label,): count for label, count in models.count_employees_seen_within(AGENT_FRESHNESS_WINDOWS).items()},
+    ("within",))
+metrics.CallbackGauge(
+    "em_load_shed_multiplier", "Interval multiplier currently requested from agents (1 = no shedding).",
+    agent_settings.load_shedder.interval_multiplier)
+
+def _query_cache_lookups():
+    stats = models.query_cache.stats()
+    lookups = {(namespace, "hit"): count for namespace, count in stats["hits"].items()}
+    lookups.update({(namespace, "miss"): count for namespace, count in stats["misses"].items()})
+    return lookups
+
+metrics.CallbackCounter(
+    "em_query_cache_lookups_total", "Admin view query cache lookups, by namespace and result.",
+    _query_cache_lookups, ("namespace", "result"))
+
+# --- Custom Jinja Filter for Display Timezone Formatting ---
 def format_datetime_ist(dt_utc):
-    """Converts a UTC datetime object to a formatted IST string."""
-    if dt_utc is None:
-        return "N/A"
-    if not isinstance(dt_utc, datetime):
-        return str(dt_utc) # Return as string if not a datetime object
-
-    try:
-        # Ensure the input datetime is UTC aware
-        if dt_utc.tzinfo is None:
-            # If naive, assume it's UTC (as stored in DB)
-            dt_utc = dt_utc.replace(tzinfo=timezone.utc)
-        elif dt_utc.tzinfo != timezone.utc:
-            # If aware but not UTC, convert to UTC first
-             dt_utc = dt_utc.astimezone(timezone.utc)
-
-        # Convert UTC datetime to IST
-        dt_ist = dt_utc.astimezone(IST)
-        # Format as desired (e.g., including AM/PM and timezone abbr)
-        return dt_ist.strftime('%Y-%m-%d %I:%M:%S %p %Z') # Example: 2024-04-29 07:30:00 PM IST
-    except Exception as e:
-        # Log error and return original representation or an error string
-        models.logger.error(f"Error formatting datetime to IST: {e}", exc_info=True)
-        return str(dt_utc) # Fallback
+    """Converts a UTC datetime object to a formatted string in the configured display timezone.
+
+    Views precompute '<field>_display' values with timefmt.localize_records; this filter is kept
+    for ad-hoc template use.
+    """
+    return timefmt.format_datetime(dt_utc)
 
 
 def create_app():
@@ -55,20 +60,16 @@ def create_app():
     # Ensure our models logger uses Flask's config level
     models.logger.setLevel(log_level)
     app.logger.setLevel(log_level)
+    for level, message in config.STARTUP_MESSAGES:
+        app.logger.log(level, message)
 
 
     # --- Database Initialization ---
-    with app.app_context():
-        try:
-            # Connect to DB and ensure collections/indexes exist on startup
-            models.connect_db()
-            # Create initial admin user if needed (idempotent)
-            models.setup_initial_admin_user()
-            app.logger.info("Database connection established and initial setup checked.")
-        except ConnectionError as e:
-            app.logger.critical(f"CRITICAL: Failed to connect to MongoDB on startup: {e}. Application might not function correctly.")
-        except Exception as e:
-             app.logger.critical(f"CRITICAL: An unexpected error occurred during DB setup: {e}", exc_info=True)
+    # Connect, verify collections/indexes and create the initial admin user in the background,
+    # so the server accepts requests right away (requests connect on demand); see /ready
+    models.start_background_setup()
+    models.last_seen_buffer.start() # Flushes coalesced last_seen updates; also flushes at exit
+    models.title_indexer.start() # Re-indexes new screenshots' window titles once their reports are in
 
 
     # --- Register Custom Jinja Filter ---
@@ -79,6 +80,9 @@ def create_app():
     # --- Register Blueprints ---
     app.register_blueprint(routes.bp)
 
+    # --- Request Timing (feeds /metrics and Server-Timing headers) ---
+    metrics.init_app(app)
+
     # Add a simple health check endpoint
     @app.route('/health')
     def health_check():
@@ -91,9 +95,28 @@ def create_app():
             else:
                  db_status = "disconnected (no client)"
         except Exception as e:
-            db_status = f"error ({e})"
+            app.logger.warning(f"/health database ping failed: {e}")
+            db_status = "error" # Details stay in the log; /health is unauthenticated
+        # Cache statistics are exported on /metrics (em_query_cache_*), which requires a token or localhost
         return jsonify({"status": "ok", "db_status": db_status})
 
+    @app.route('/ready')
+    def readiness_check():
+        """Readiness for load balancers and rolling deploys: 503 until the background DB setup has finished."""
+        ready = models.is_ready()
+        return jsonify({"status": "ready" if ready else "starting", **models.startup_state}), 200 if ready else 503
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Prometheus text format metrics for this server process."""
+        if config.METRICS_TOKEN:
+            expected = f"Bearer {config.METRICS_TOKEN}"
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+                abort(401)
+        elif request.remote_addr not in ('127.0.0.1', '::1'):
+            abort(403) # Without a token, only scrapers on this machine may read the metrics
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
     app.logger.info("Flask application created and configured.")
     return app
 
@@ -0,0 +1,106 @@
+"""
+Render-time benchmark for the dashboard and employee detail templates.
+
+Renders both templates with synthetic data (no MongoDB needed) and reports the time spent
+converting timestamps and rendering, so regressions in the view/template layer show up
+before they reach production.
+
+Usage (from the server directory):
+    python benchmarks/bench_render.py [--employees 500] [--logs 200] [--screenshots 100] [--rounds 50]
+"""
+import argparse
+import os
+import sys
+import time
+import statistics
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, render_template  # noqa: E402
+import pytz  # noqa: E402
+import routes  # noqa: E402
+import timefmt  # noqa: E402
+import app as server_app  # noqa: E402
+
+
+def legacy_format_datetime_ist(dt_utc):
+    """The original per-cell filter, kept here as the comparison baseline."""
+    if dt_utc.tzinfo is None:
+        dt_utc = dt_utc.replace(tzinfo=timezone.utc)
+    return dt_utc.astimezone(pytz.timezone('Asia/Kolkata')).strftime('%Y-%m-%d %I:%M:%S %p %Z')
+
+
+def make_app():
+    server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    app = Flask('bench', template_folder=os.path.join(server_dir, 'templates'),
+                static_folder=os.path.join(server_dir, 'static'))
+    app.config['SECRET_KEY'] = 'bench'
+    app.jinja_env.filters['to_ist'] = server_app.format_datetime_ist
+    app.register_blueprint(routes.bp)
+    return app
+
+
+def make_data(num_employees, num_logs, num_screenshots):
+    now = datetime.utcnow()
+    employees = [{"employee_id": f"EMP{i:05d}", "first_seen": now - timedelta(days=30, seconds=i),
+                  "last_seen": now - timedelta(seconds=i * 7)} for i in range(num_employees)]
+    logs = [{"employee_id": "EMP00001", "timestamp": now - timedelta(seconds=60 * i),
+             "active_window_title": f"Window {i}", "system_idle_time_seconds": i % 30} for i in range(num_logs)]
+    screenshots = [{"employee_id": "EMP00001", "timestamp": now - timedelta(seconds=300 * i),
+                    "screenshot_path": f"EMP00001/{i}.png", "url_path": f"/screenshots/EMP00001/{i}.png"}
+                   for i in range(num_screenshots)]
+    return employees, logs, screenshots
+
+
+def measure(label, func, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    print(f"{label:<45} median {statistics.median(samples):8.3f} ms   "
+          f"p95 {samples[int(len(samples) * 0.95) - 1]:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, default=500)
+    parser.add_argument('--logs', type=int, default=200)
+    parser.add_argument('--screenshots', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--timezone', default='Asia/Kolkata')
+    args = parser.parse_args()
+
+    app = make_app()
+    employees, logs, screenshots = make_data(args.employees, args.logs, args.screenshots)
+    tz_name = args.timezone
+    all_stamps = [e["first_seen"] for e in employees] + [e["last_seen"] for e in employees] + \
+                 [l["timestamp"] for l in logs] + [s["timestamp"] for s in screenshots]
+
+    print(f"{len(all_stamps)} timestamps, {args.rounds} rounds\n")
+    measure("timestamp conversion: legacy per-cell pytz", lambda: [legacy_format_datetime_ist(t) for t in all_stamps], args.rounds)
+    measure("timestamp conversion: timefmt (memoized)", lambda: [timefmt.format_datetime(t, tz_name) for t in all_stamps], args.rounds)
+
+    with app.test_request_context('/'):
+        def render_dashboard():
+            render_template('dashboard.html',
+                            employees=timefmt.localize_records(employees, ('first_seen', 'last_seen'), tz_name),
+                            tz_label=timefmt.timezone_label(tz_name))
+
+        def render_detail():
+            render_template('employee_detail.html',
+                            employee=timefmt.localize_record(employees[0], ('first_seen', 'last_seen'), tz_name),
+                            activity_logs=timefmt.localize_records(logs, ('timestamp',), tz_name),
+                            captures=routes.group_captures(timefmt.localize_records(screenshots, ('timestamp',), tz_name)),
+                            tz_label=timefmt.timezone_label(tz_name))
+
+        render_dashboard()  # Warm the Jinja template cache
+        render_detail()
+        measure(f"dashboard.html ({args.employees} employees)", render_dashboard, args.rounds)
+        measure(f"employee_detail.html ({args.logs} logs, {args.screenshots} shots)", render_detail, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Start-up benchmark for the server and the client agent.
+
+Every measurement runs in a fresh Python process (imports are cached per process), repeated
+--repeat times, and reports the median and minimum:
+  server  import of app.py, create_app(), and time until /ready returns 200 (background DB setup)
+  agent   import of client_agent.py, the deferred imports (requests, mss) paid on the first
+          report/screenshot, and creation of the activity tracker
+  exe     with --agent-exe: launch of a built agent until its log says the activity tracker started
+          (includes PyInstaller unpacking; --onefile builds unpack on every start)
+
+The server runs against mongomock unless --mongo-uri is given. Use --importtime to list the
+slowest imports of each target (python -X importtime).
+
+Usage (from the server directory):
+    python benchmarks/bench_startup.py --repeat 5
+    python benchmarks/bench_startup.py --mongo-uri mongodb://localhost:27017 --importtime
+    python benchmarks/bench_startup.py --agent-exe ../client/dist/MonitorAgent.exe
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLIENT_DIR = os.path.join(os.path.dirname(SERVER_DIR), "client")
+
+# Child process scripts; each prints one JSON object of timings in seconds
+SERVER_CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+import config
+if {mongo_uri!r}:
+    config.MONGO_URI = {mongo_uri!r}
+    config.MONGO_DB_NAME = "bench_startup"
+import models
+if not {mongo_uri!r}:
+    import mongomock
+    models.client = mongomock.MongoClient()
+    models.db = models.client[config.MONGO_DB_NAME]
+    models.get_db = lambda: models.db
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+client = flask_app.test_client()
+while client.get('/ready').status_code != 200:
+    if time.perf_counter() - created > 60:
+        sys.exit("not ready after 60s")
+    time.sleep(0.005)
+ready = time.perf_counter()
+print(json.dumps({{"import": imported - start, "create_app": created - imported, "ready": ready - created,
+                  "total": ready - start}}))
+"""
+
+AGENT_CHILD = r"""
+import json, time
+start = time.perf_counter()
+import client_agent
+imported = time.perf_counter()
+import activity_tracker
+tracker = activity_tracker.ActivityTracker(activity_tracker.create_backend(client_agent.get_active_window_title)).start()
+tracker_started = time.perf_counter()
+import requests
+try:
+    import mss
+except ImportError:
+    pass
+deferred = time.perf_counter()
+tracker.stop()
+print(json.dumps({"import": imported - start, "tracker": tracker_started - imported,
+                  "deferred_imports": deferred - tracker_started, "total_to_tracking": tracker_started - start}))
+"""
+
+
+def run_child(code, cwd, repeat):
+    runs = []
+    for _ in range(repeat):
+        wall_start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True)
+        wall = time.perf_counter() - wall_start
+        if result.returncode != 0:
+            raise RuntimeError(f"Child process failed:\n{result.stderr[-2000:]}")
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        timings["process_wall"] = wall # Includes interpreter start-up
+        runs.append(timings)
+    return summarize(runs)
+
+
+def summarize(runs):
+    return {key: {"median_ms": round(statistics.median(run[key] for run in runs) * 1000, 1),
+                  "min_ms": round(min(run[key] for run in runs) * 1000, 1)}
+            for key in runs[0]}
+
+
+def slowest_imports(module, cwd, top=15):
+    """Cumulative import times from python -X importtime, slowest first."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=cwd, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return [{"module": name, "cumulative_ms": round(ms, 1)} for ms, name in sorted(rows, reverse=True)[:top]]
+
+
+def time_agent_exe(exe_path, repeat, marker="Activity tracker started", timeout=60):
+    """Launches a built agent and waits for marker in its log file (written next to the executable)."""
+    exe_dir = os.path.dirname(os.path.abspath(exe_path))
+    runs = []
+    for _ in range(repeat):
+        before = {name: os.path.getsize(os.path.join(exe_dir, name))
+                  for name in os.listdir(exe_dir) if name.startswith("monitor_agent_") and name.endswith(".log")}
+        start = time.perf_counter()
+        process = subprocess.Popen([exe_path], cwd=exe_dir)
+        try:
+            while time.perf_counter() - start < timeout:
+                if _log_contains(exe_dir, before, marker):
+                    runs.append({"launch_to_tracking": time.perf_counter() - start})
+                    break
+                time.sleep(0.01)
+            else:
+                raise RuntimeError(f"'{marker}' not logged within {timeout}s")
+        finally:
+            process.terminate()
+            process.wait(10)
+    return summarize(runs)
+
+
+def _log_contains(exe_dir, sizes_before, marker):
+    for name in os.listdir(exe_dir):
+        if name.startswith("monitor_agent_") and name.endswith(".log"):
+            with open(os.path.join(exe_dir, name), encoding="utf-8", errors="replace") as f:
+                f.seek(sizes_before.get(name, 0))
+                if marker in f.read():
+                    return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--mongo-uri', help="Use this mongod for the server instead of mongomock")
+    parser.add_argument('--agent-exe', help="Also time a built agent executable from launch to tracking")
+    parser.add_argument('--importtime', action='store_true', help="List the slowest imports of each target")
+    parser.add_argument('--save', help="Write results JSON to this file")
+    args = parser.parse_args()
+
+    results = {"server": run_child(SERVER_CHILD.format(mongo_uri=args.mongo_uri or ""), SERVER_DIR, args.repeat)}
+
+    # The agent writes its log and config cache next to its script, so run a copy in a temp dir
+    agent_dir = tempfile.mkdtemp(prefix="bench_agent_")
+    try:
+        for name in os.listdir(CLIENT_DIR):
+            if name.endswith(".py"):
+                shutil.copy(os.path.join(CLIENT_DIR, name), agent_dir)
+        results["agent"] = run_child(AGENT_CHILD, agent_dir, args.repeat)
+        if args.importtime:
+            results["agent_slowest_imports"] = slowest_imports("client_agent", agent_dir)
+    finally:
+        shutil.rmtree(agent_dir, ignore_errors=True)
+
+    if args.importtime:
+        results["server_slowest_imports"] = slowest_imports("app", SERVER_DIR)
+    if args.agent_exe:
+        results["agent_exe"] = time_agent_exe(args.agent_exe, args.repeat)
+
+    print(json.dumps(results, indent=2))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Wire-format micro-benchmark for /api/report: bytes on the wire and CPU per report for each body format.
+
+For every Content-Type (JSON, MessagePack, CBOR) and Content-Encoding (none, gzip, zstd) whose
+library is installed, encodes synthetic agent reports with the agent's encoder (client/wire_format.py)
+and reports:
+  bytes       body size as sent
+  encode_us   agent-side serialization + compression
+  decode_us   server-side wire_format.decode (what api_report_activity pays before touching the data)
+  route_us    with --route: a full POST /api/report through the Flask test client against mongomock
+
+Reports are generated with 0, 20 and 200 focus events (an idle minute, a typical minute and a
+burst of window switching); change with --focus-events.
+
+Usage (from the server directory):
+    python benchmarks/bench_wire.py [--rounds 2000] [--focus-events 0,20,200] [--route]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+import wire_format  # noqa: E402
+
+
+def load_client_encoder():
+    """The agent's client/wire_format.py (same module name as the server's, so loaded by path)."""
+    import importlib.util
+    path = os.path.join(os.path.dirname(SERVER_DIR), "client", "wire_format.py")
+    spec = importlib.util.spec_from_file_location("client_wire_format", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_report(num_events):
+    start = datetime(2024, 1, 1, 9, 0, tzinfo=timezone.utc)
+    titles = ["Inbox - Outlook", "Quarterly Report.xlsx - Excel", "Jira - Sprint Board - Google Chrome",
+              "client_agent.py - Visual Studio Code", "Slack | #general"]
+    return {
+        "employee_id": "EMP00042",
+        "timestamp_utc": (start + timedelta(minutes=1)).isoformat(timespec='seconds'),
+        "active_window": titles[0],
+        "system_idle_time": 3,
+        "focus_events": [[(start + timedelta(seconds=i * 60 / max(num_events, 1))).isoformat(timespec='milliseconds'),
+                          titles[i % len(titles)]] for i in range(num_events)],
+    }
+
+
+def time_per_call_us(func, rounds):
+    samples = []
+    for _ in range(5): # Best of 5 batches; single calls are too short to time individually
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        samples.append((time.perf_counter() - start) / rounds * 1e6)
+    return round(min(samples), 2)
+
+
+def make_route_client():
+    import logging
+    logging.disable(logging.INFO) # Measure the handler, not log output
+    import config
+    import models
+    import mongomock
+    from loadtest import CommandCounter, CountingDatabase
+    models.client = mongomock.MongoClient()
+    models.db = CountingDatabase(models.client[config.MONGO_DB_NAME], CommandCounter())
+    models.get_db = lambda: models.db
+    config.LOAD_SHED_ENABLED = False
+    import app as server_app
+    return server_app.create_app().test_client(), {'X-Client-Secret': config.CLIENT_SECRET_KEY}
+
+
+def time_route_us(client, secret_header, body, headers, rounds):
+    headers = dict(headers, **secret_header)
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = client.post('/api/report', data=body, headers=headers)
+        samples.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/report returned {response.status_code}: {response.get_data(as_text=True)}")
+    return round(statistics.median(samples) * 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=2000)
+    parser.add_argument('--focus-events', default="0,20,200", help="Comma separated focus event counts per report")
+    parser.add_argument('--route', action='store_true', help="Also time POST /api/report in-process (needs mongomock)")
+    parser.add_argument('--save', help="Write results JSON to this file")
+    args = parser.parse_args()
+
+    client_wire = load_client_encoder()
+    content_types = wire_format.supported_content_types() # All of them, not just those the agent would pick
+    encodings = [None] + [enc for enc in client_wire.local_encodings() if enc in wire_format.supported_encodings()]
+    if args.route:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        route_client, secret_header = make_route_client()
+
+    results = []
+    for num_events in (int(n) for n in args.focus_events.split(",")):
+        report = make_report(num_events)
+        for content_type in content_types:
+            for encoding in encodings:
+                # Bypass the agent's size threshold so every combination is measured as named
+                threshold, client_wire.COMPRESS_MIN_BYTES = client_wire.COMPRESS_MIN_BYTES, 0
+                try:
+                    body, headers = client_wire.encode(report, content_type, encoding)
+                    encode_us = time_per_call_us(lambda: client_wire.encode(report, content_type, encoding), args.rounds)
+                finally:
+                    client_wire.COMPRESS_MIN_BYTES = threshold
+                if wire_format.decode(body, content_type, encoding) != report:
+                    raise RuntimeError(f"{content_type}/{encoding} did not round-trip")
+                row = {"focus_events": num_events, "content_type": content_type, "encoding": encoding or "identity",
+                       "bytes": len(body), "encode_us": encode_us,
+                       "decode_us": time_per_call_us(lambda: wire_format.decode(body, content_type, encoding), args.rounds)}
+                if args.route:
+                    row["route_us"] = time_route_us(route_client, secret_header, body, headers, min(args.rounds, 500))
+                results.append(row)
+
+    columns = ["focus_events", "content_type", "encoding", "bytes", "encode_us", "decode_us"] + (["route_us"] if args.route else [])
+    print("  ".join(f"{column:>20}" for column in columns))
+    for row in results:
+        print("  ".join(f"{row[column]!s:>20}" for column in columns))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
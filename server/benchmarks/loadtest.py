@@ -0,0 +1,540 @@
+"""
+Ingest load test: simulates a fleet of client agents against the server.
+
+Each simulated agent speaks the same protocol as client/client_agent.py:
+  - POST /api/report             {employee_id, timestamp_utc, active_window, system_idle_time, focus_events},
+                                 encoded by client/wire_format.py (JSON or MessagePack, gzip/zstd; see --wire-format)
+  - POST /api/upload_screenshots multipart: one file part per display plus employee_id, timestamp_utc,
+                                 capture_id and the displays JSON form fields (see --displays)
+
+Targets:
+  --inprocess                       Flask app in this process with an in-memory MongoDB stand-in (mongomock)
+  --inprocess --mongo-uri URI       Flask app in this process backed by a real (local) mongod
+  --url http://host:5000            An already running server (pass --server-pid to sample its RSS)
+
+Scenarios:
+  steady           every agent sends report cycles; one screenshot every SCREENSHOT/REPORT interval cycles
+  reconnect-storm  all agents come back at once and flush a backlog of reports plus a screenshot
+  screenshot-burst all agents upload screenshots at the same moment
+
+Reports throughput, p50/p95/p99 latency per endpoint, Mongo operations per request, server RSS
+and disk bytes per agent-hour. Use --save to write the results as JSON and --baseline to compare
+against a previous run (exit status 1 if throughput or p95 latency regressed beyond --tolerance).
+
+Usage (from the server directory):
+    python benchmarks/loadtest.py --inprocess --agents 200 --scenario steady --cycles 10
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+# Intervals used by client_agent.py, needed to convert requests into agent-hours
+REPORT_INTERVAL_SECONDS = 60
+SCREENSHOT_INTERVAL_SECONDS = 300
+
+
+# --- Synthetic Screenshots ---
+def make_png(approx_bytes, width=1920):
+    """Builds a valid PNG of roughly approx_bytes (noise compresses poorly, like busy desktops)."""
+    row_bytes = width * 3
+    height = max(1, approx_bytes // (row_bytes + 1))
+    raw = b"".join(b"\x00" + os.urandom(row_bytes) for _ in range(height))
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b"")
+
+
+def make_screenshot_pool(median_kb, count=8, seed=1):
+    """A handful of PNGs with log-normally distributed sizes around median_kb."""
+    rng = random.Random(seed)
+    return [make_png(int(rng.lognormvariate(0, 0.5) * median_kb * 1024)) for _ in range(count)]
+
+
+# --- Agent Protocol ---
+WINDOW_TITLES = ["Inbox - Outlook", "report.xlsx - Excel", "Slack | #general", "client_agent.py - Visual Studio Code",
+                 "Jira - Sprint Board - Google Chrome"]
+WIRE_FORMATS = ["auto", "json", "json+gzip", "json+zstd", "msgpack", "msgpack+gzip", "msgpack+zstd", "cbor"]
+
+
+def agent_id(index):
+    return f"LOADAGENT{index:05d}"
+
+
+def report_payload(employee_id, timestamp, mean_focus_events):
+    """A report as the agent builds it: every focus change of the last interval, oldest first."""
+    count = random.randint(0, 2 * mean_focus_events)
+    changes = sorted(timestamp - timedelta(seconds=random.uniform(0, REPORT_INTERVAL_SECONDS)) for _ in range(count))
+    focus_events = [[changed_at.isoformat(timespec='milliseconds'), random.choice(WINDOW_TITLES)] for changed_at in changes]
+    return {
+        "employee_id": employee_id,
+        "timestamp_utc": timestamp.isoformat(timespec='seconds'),
+        "active_window": focus_events[-1][1] if focus_events else random.choice(WINDOW_TITLES),
+        "system_idle_time": random.randint(0, 120),
+        "focus_events": focus_events,
+    }
+
+
+class ReportEncoder:
+    """Serializes reports with the agent's client/wire_format.py.
+
+    wire_format is "auto" (what the agent would pick from the server's /api/agent_config) or
+    "<json|msgpack|cbor>[+<gzip|zstd>]". Like the agent, only reports of at least
+    COMPRESS_MIN_BYTES are compressed.
+    """
+
+    def __init__(self, wire_format, transport):
+        from bench_wire import load_client_encoder
+        self._wire = load_client_encoder()
+        if wire_format == "auto":
+            formats = transport.get_agent_config(agent_id(0)).get("report_formats") or {}
+            self.content_type, self.encoding = self._wire.choose(formats.get("content_types"), formats.get("encodings"))
+        else:
+            content_type, _, encoding = wire_format.partition("+")
+            self.content_type = {"json": self._wire.JSON, "msgpack": self._wire.MSGPACK, "cbor": self._wire.CBOR}[content_type]
+            self.encoding = encoding or None
+
+    def describe(self):
+        return f"{self.content_type}+{self.encoding}" if self.encoding else self.content_type
+
+    def __call__(self, payload):
+        return self._wire.encode(payload, self.content_type, self.encoding)
+
+
+def capture_upload(employee_id, timestamp, pngs):
+    """(form, files) of one multi-display capture as the agent uploads it; files: [(field, filename, bytes)]."""
+    files, displays = [], []
+    for index, png in enumerate(pngs):
+        field = f"screenshot_{index}"
+        files.append((field, f"{timestamp:%Y%m%d_%H%M%S}_d{index}.png", png))
+        displays.append({"display": index, "field": field, "changed": True,
+                         "left": 1920 * index, "top": 0, "width": 1920, "height": 1080})
+    form = {"employee_id": employee_id, "timestamp_utc": timestamp.isoformat(timespec='seconds'),
+            "capture_id": uuid.uuid4().hex, "displays": json.dumps(displays)}
+    return form, files
+
+
+class Agent:
+    """Builds one simulated agent's requests and sends them through a transport."""
+
+    def __init__(self, transport, recorder, encode, pool, displays, mean_focus_events):
+        self.transport = transport
+        self.recorder = recorder
+        self.encode = encode
+        self.pool = pool
+        self.displays = displays
+        self.mean_focus_events = mean_focus_events
+
+    def report(self, employee_id, timestamp):
+        body, headers = self.encode(report_payload(employee_id, timestamp, self.mean_focus_events))
+        self.recorder.timed("report", self.transport.post_report, body, headers)
+
+    def capture(self, employee_id, timestamp, seed):
+        pngs = [self.pool[(seed + display) % len(self.pool)] for display in range(self.displays)]
+        form, files = capture_upload(employee_id, timestamp, pngs)
+        self.recorder.timed("screenshot", self.transport.post_screenshots, form, files)
+
+
+# --- Transports ---
+class HttpTransport:
+    """Talks to a running server over HTTP, one requests.Session per worker thread."""
+
+    def __init__(self, base_url, secret):
+        import requests
+        self._requests = requests
+        self.base_url = base_url.rstrip("/")
+        self.secret = secret
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = self._requests.Session()
+        return self._local.session
+
+    def get_agent_config(self, employee_id):
+        response = self._session().get(f"{self.base_url}/api/agent_config", params={"employee_id": employee_id},
+                                       headers={'X-Client-Secret': self.secret}, timeout=15)
+        response.raise_for_status()
+        return response.json()
+
+    def post_report(self, body, headers):
+        response = self._session().post(f"{self.base_url}/api/report", data=body, timeout=15,
+                                        headers=dict(headers, **{'X-Client-Secret': self.secret}))
+        return response.status_code
+
+    def post_screenshots(self, form, files):
+        response = self._session().post(f"{self.base_url}/api/upload_screenshots", data=form, timeout=60,
+                                        files=[(field, (filename, png, 'image/png')) for field, filename, png in files],
+                                        headers={'X-Client-Secret': self.secret})
+        return response.status_code
+
+
+class InProcessTransport:
+    """Drives the Flask app directly through its test client (no sockets)."""
+
+    def __init__(self, app, secret):
+        self.app = app
+        self.secret = secret
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, "client"):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def get_agent_config(self, employee_id):
+        return self._client().get('/api/agent_config', query_string={"employee_id": employee_id},
+                                  headers={'X-Client-Secret': self.secret}).get_json()
+
+    def post_report(self, body, headers):
+        return self._client().post('/api/report', data=body,
+                                   headers=dict(headers, **{'X-Client-Secret': self.secret})).status_code
+
+    def post_screenshots(self, form, files):
+        import io
+        data = dict(form)
+        for field, filename, png in files:
+            data[field] = (io.BytesIO(png), filename, 'image/png')
+        return self._client().post('/api/upload_screenshots', data=data, content_type='multipart/form-data',
+                                   headers={'X-Client-Secret': self.secret}).status_code
+
+
+# --- Mongo Operation Counting ---
+class CommandCounter:
+    """pymongo CommandListener counting commands sent to the server."""
+
+    IGNORED = ("ping", "ismaster", "isMaster", "hello", "endSessions")
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.count += 1
+
+    def started(self, event):
+        if event.command_name not in self.IGNORED:
+            self.increment()
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class CountingCollection:
+    """Wraps a mongomock collection and counts data operations, standing in for CommandCounter."""
+
+    OPERATIONS = {"insert_one", "insert_many", "update_one", "update_many", "find", "find_one",
+                  "count_documents", "bulk_write", "delete_one", "delete_many", "distinct", "aggregate"}
+
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def bulk_write(self, requests, ordered=True):
+        """mongomock can't execute UpdateOne objects from current pymongo; replay them as update_one."""
+        self._counter.increment()
+        for request in requests:
+            self._collection.update_one(request._filter, request._doc, upsert=request._upsert)
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in self.OPERATIONS:
+            return attr
+
+        def counted(*args, **kwargs):
+            self._counter.increment()
+            return attr(*args, **kwargs)
+        return counted
+
+
+class CountingDatabase:
+    """Wraps a mongomock database so every collection it hands out is a CountingCollection."""
+
+    def __init__(self, database, counter):
+        self._database = database
+        self._counter = counter
+
+    def __getitem__(self, name):
+        return CountingCollection(self._database[name], self._counter)
+
+    def __getattr__(self, name):
+        attr = getattr(self._database, name)
+        if type(attr).__name__ == "Collection":
+            return CountingCollection(attr, self._counter)
+        return attr
+
+
+# --- Server Resource Sampling ---
+def read_rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+# --- Scenarios ---
+class Recorder:
+    def __init__(self):
+        self.samples = {"report": [], "screenshot": []}
+        self.errors = {"report": 0, "screenshot": 0}
+        self._lock = threading.Lock()
+
+    def timed(self, kind, func, *args):
+        start = time.perf_counter()
+        try:
+            status = func(*args)
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.samples[kind].append(elapsed)
+            if status != 200:
+                self.errors[kind] += 1
+
+
+def run_steady(agent, agents, cycles, start_time):
+    shots_every = max(1, SCREENSHOT_INTERVAL_SECONDS // REPORT_INTERVAL_SECONDS)
+
+    def run(index):
+        employee_id = agent_id(index)
+        for cycle in range(cycles):
+            ts = start_time + timedelta(seconds=cycle * REPORT_INTERVAL_SECONDS + index % REPORT_INTERVAL_SECONDS)
+            agent.report(employee_id, ts)
+            if cycle % shots_every == 0:
+                agent.capture(employee_id, ts, index + cycle)
+    return run, cycles * REPORT_INTERVAL_SECONDS
+
+
+def run_reconnect_storm(agent, agents, cycles, start_time):
+    # Every agent was offline for `cycles` report intervals and reconnects at the same instant
+    def run(index):
+        employee_id = agent_id(index)
+        for cycle in range(cycles):
+            agent.report(employee_id, start_time + timedelta(seconds=cycle * REPORT_INTERVAL_SECONDS))
+        agent.capture(employee_id, start_time, index)
+    return run, cycles * REPORT_INTERVAL_SECONDS
+
+
+def run_screenshot_burst(agent, agents, cycles, start_time):
+    def run(index):
+        employee_id = agent_id(index)
+        for cycle in range(cycles):
+            agent.capture(employee_id, start_time + timedelta(seconds=cycle * SCREENSHOT_INTERVAL_SECONDS), index + cycle)
+    return run, cycles * SCREENSHOT_INTERVAL_SECONDS
+
+
+SCENARIOS = {
+    "steady": run_steady,
+    "reconnect-storm": run_reconnect_storm,
+    "screenshot-burst": run_screenshot_burst,
+}
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * fraction))]
+
+
+def summarize(recorder, wall_seconds, ops, rss_before, rss_after, disk_bytes, agent_hours):
+    total_requests = sum(len(s) for s in recorder.samples.values())
+    results = {
+        "requests": total_requests,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(total_requests / wall_seconds, 2) if wall_seconds else None,
+        "mongo_ops_per_request": round(ops / total_requests, 2) if ops is not None and total_requests else None,
+        "server_rss_bytes": rss_after,
+        "server_rss_growth_bytes": rss_after - rss_before if rss_before and rss_after else None,
+        "disk_bytes_per_agent_hour": int(disk_bytes / agent_hours) if disk_bytes is not None and agent_hours else None,
+        "endpoints": {},
+    }
+    for kind, samples in recorder.samples.items():
+        if not samples:
+            continue
+        samples = sorted(samples)
+        results["endpoints"][kind] = {
+            "requests": len(samples),
+            "errors": recorder.errors[kind],
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+        }
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Returns a list of human readable regressions (empty if none)."""
+    regressions = []
+    if baseline.get("throughput_rps") and results["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"throughput {results['throughput_rps']} rps < baseline {baseline['throughput_rps']} rps")
+    for kind, stats in results["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(kind)
+        if base and stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{kind} p95 {stats['p95_ms']} ms > baseline {base['p95_ms']} ms")
+    return regressions
+
+
+# --- Target Setup ---
+def build_inprocess_target(mongo_uri, counter):
+    """Creates the Flask app in this process, backed by mongod (mongo_uri) or mongomock."""
+    import config
+    config.SCREENSHOT_STORAGE_PATH = tempfile.mkdtemp(prefix="loadtest_screens_")
+    if mongo_uri:
+        from pymongo import monitoring
+        monitoring.register(counter) # Must happen before models creates its MongoClient
+        config.MONGO_URI = mongo_uri
+        config.MONGO_DB_NAME = f"loadtest_{os.getpid()}"
+    import models
+    if not mongo_uri:
+        import mongomock
+        models.client = mongomock.MongoClient()
+        raw_db = models.client[config.MONGO_DB_NAME]
+        models.db = CountingDatabase(raw_db, counter)
+        models.get_db = lambda: models.db
+    import app as server_app
+    flask_app = server_app.create_app()
+    return flask_app, config.SCREENSHOT_STORAGE_PATH
+
+
+def drop_inprocess_database(keep):
+    """Drops the loadtest_<pid> database build_inprocess_target created on the target mongod."""
+    import config
+    import models
+    if keep:
+        print(f"Kept database {config.MONGO_DB_NAME}", file=sys.stderr)
+        return
+    # Write out what the app still buffers first, or its exit handlers would re-create the database
+    models.last_seen_buffer.stop()
+    models.title_indexer.stop()
+    if models.client is not None:
+        models.client.drop_database(config.MONGO_DB_NAME)
+        print(f"Dropped database {config.MONGO_DB_NAME}", file=sys.stderr)
+
+
+def run_load(args, transport, storage_path, server_pid, counter):
+    pool = make_screenshot_pool(args.screenshot_kb)
+    recorder = Recorder()
+    encode = ReportEncoder(args.wire_format, transport)
+    agent = Agent(transport, recorder, encode, pool, args.displays, args.focus_events)
+    start_time = datetime.now(timezone.utc).replace(microsecond=0)
+    run_agent, seconds_per_agent = SCENARIOS[args.scenario](agent, args.agents, args.cycles, start_time)
+
+    rss_before = read_rss_bytes(server_pid) if server_pid else None
+    disk_before = directory_bytes(storage_path) if storage_path else None
+    ops_before = counter.count
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(run_agent, range(args.agents)))
+    wall_seconds = time.perf_counter() - wall_start
+
+    ops = counter.count - ops_before if args.inprocess else None
+    disk_bytes = directory_bytes(storage_path) - disk_before if storage_path else None
+    agent_hours = args.agents * seconds_per_agent / 3600
+    results = summarize(recorder, wall_seconds, ops, rss_before,
+                        read_rss_bytes(server_pid) if server_pid else None, disk_bytes, agent_hours)
+    results["scenario"] = args.scenario
+    results["agents"] = args.agents
+    results["cycles"] = args.cycles
+    results["displays"] = args.displays
+    results["focus_events"] = args.focus_events
+    results["wire_format"] = encode.describe()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help="Base URL of a running server")
+    target.add_argument('--inprocess', action='store_true', help="Run the Flask app in this process")
+    parser.add_argument('--mongo-uri', help="With --inprocess: use this mongod instead of mongomock")
+    parser.add_argument('--keep-db', action='store_true',
+                        help="With --mongo-uri: keep the loadtest_<pid> database instead of dropping it at the end")
+    parser.add_argument('--server-pid', type=int, help="With --url: PID of the server process for RSS sampling")
+    parser.add_argument('--storage-path', help="With --url: server screenshot directory, for disk usage")
+    parser.add_argument('--secret', default=None, help="X-Client-Secret (default: config.CLIENT_SECRET_KEY)")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='steady')
+    parser.add_argument('--agents', type=int, default=100)
+    parser.add_argument('--cycles', type=int, default=5, help="Report (or screenshot) intervals per agent")
+    parser.add_argument('--concurrency', type=int, default=32, help="Worker threads sending requests")
+    parser.add_argument('--screenshot-kb', type=int, default=350, help="Median screenshot size (per display)")
+    parser.add_argument('--displays', type=int, default=1, help="Displays per capture (one file part each)")
+    parser.add_argument('--focus-events', type=int, default=10, help="Mean focus events per report")
+    parser.add_argument('--wire-format', choices=WIRE_FORMATS, default="auto",
+                        help="Report body format; auto picks what the agent would from /api/agent_config")
+    parser.add_argument('--save', help="Write results JSON to this file")
+    parser.add_argument('--baseline', help="Compare against a results JSON from a previous run")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Allowed regression vs baseline (fraction)")
+    args = parser.parse_args()
+
+    import config
+    secret = args.secret or config.CLIENT_SECRET_KEY
+    counter = CommandCounter()
+    cleanup_dir = None
+
+    if args.inprocess:
+        flask_app, storage_path = build_inprocess_target(args.mongo_uri, counter)
+        cleanup_dir = storage_path
+        transport = InProcessTransport(flask_app, secret)
+        server_pid = os.getpid()
+    else:
+        transport = HttpTransport(args.url, secret)
+        storage_path = args.storage_path
+        server_pid = args.server_pid
+
+    try:
+        results = run_load(args, transport, storage_path, server_pid, counter)
+    finally:
+        if cleanup_dir:
+            shutil.rmtree(cleanup_dir, ignore_errors=True)
+        if args.inprocess and args.mongo_uri:
+            drop_inprocess_database(args.keep_db)
+    print(json.dumps(results, indent=2))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+Multi-node ingest check: starts several server processes on this machine and drives agents through them.
+
+Every node gets the same INGEST_NODES list, so each can compute the consistent-hash ring. The script checks:
+  - routing   every node hands an agent the same ingest_url in /api/agent_config, and the
+              X-Ingest-Node header of the ingest response shows the write landed on that node
+  - balance   agents per node (max/mean), for the configured number of virtual nodes
+  - remap     removing one node from the ring only moves that node's agents (~1/N of the fleet)
+  - failover  after killing a node, its agents' reports and screenshots are accepted by any other node
+  - data      with --mongo-uri, every write is visible in the shared database regardless of node
+
+Nodes share one screenshot directory (a temp dir standing in for shared storage). Without
+--mongo-uri each node uses its own mongomock database, so only the HTTP-level checks run;
+point --mongo-uri at a local mongod (or a mongos in front of a local sharded cluster) for the full run.
+
+Usage (from the server directory):
+    python benchmarks/multinode.py --nodes 3 --agents 300
+    python benchmarks/multinode.py --nodes 4 --agents 1000 --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- Node Process ---
+def serve_node(port, mongo_uri, db_name):
+    """Runs one server node (in a child process). Ingest settings come from the parent's environment."""
+    import logging
+    logging.disable(logging.WARNING) # Per-request INFO logs from every node would drown the summary
+    import config
+    if mongo_uri:
+        config.MONGO_URI = mongo_uri
+        config.MONGO_DB_NAME = db_name
+    import models
+    if not mongo_uri:
+        import mongomock
+        from loadtest import CommandCounter, CountingDatabase
+        models.client = mongomock.MongoClient()
+        models.db = CountingDatabase(models.client[config.MONGO_DB_NAME], CommandCounter()) # Adds bulk_write support
+        models.get_db = lambda: models.db
+    import app as server_app
+    server_app.create_app().run(host='127.0.0.1', port=port, threaded=True)
+
+
+def start_nodes(count, base_port, mongo_uri, db_name, storage_path):
+    urls = [f"http://127.0.0.1:{base_port + i}" for i in range(count)]
+    processes = {}
+    for i, url in enumerate(urls):
+        env = dict(os.environ,
+                   INGEST_NODES=",".join(urls),
+                   INGEST_NODE_ID=url,
+                   SCREENSHOT_STORAGE_PATH=storage_path,
+                   LOAD_SHED_ENABLED="False")
+        command = [sys.executable, os.path.abspath(__file__), '--serve-node', str(base_port + i), '--db-name', db_name]
+        if mongo_uri:
+            command += ['--mongo-uri', mongo_uri]
+        processes[url] = subprocess.Popen(command, cwd=SERVER_DIR, env=env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return processes
+
+
+def wait_until_up(urls, timeout=30):
+    import requests
+    deadline = time.time() + timeout
+    pending = set(urls)
+    while pending and time.time() < deadline:
+        for url in list(pending):
+            try:
+                requests.get(f"{url}/health", timeout=1)
+                pending.discard(url)
+            except requests.exceptions.RequestException:
+                pass
+        time.sleep(0.2)
+    if pending:
+        raise RuntimeError(f"Nodes did not start: {sorted(pending)}")
+
+
+# --- Agent Simulation ---
+class FleetDriver:
+    def __init__(self, urls, secret):
+        import requests
+        self.requests = requests
+        self.urls = urls
+        self.headers = {'X-Client-Secret': secret}
+        from loadtest import make_png
+        self.png = make_png(20 * 1024)
+
+    def ingest_url(self, employee_id, via):
+        response = self.requests.get(f"{via}/api/agent_config", params={"employee_id": employee_id},
+                                     headers=self.headers, timeout=10)
+        response.raise_for_status()
+        return response.json().get("ingest_url")
+
+    def send(self, employee_id, base_url, second):
+        """One report plus one screenshot. Returns the X-Ingest-Node values of both responses."""
+        timestamp = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp() + second
+        timestamp_iso = datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='seconds')
+        report = self.requests.post(f"{base_url}/api/report", timeout=15, headers=self.headers, json={
+            "employee_id": employee_id, "timestamp_utc": timestamp_iso,
+            "active_window": "Multinode Check", "system_idle_time": 0})
+        shot = self.requests.post(f"{base_url}/api/upload_screenshot", timeout=30, headers=self.headers,
+                                  data={"employee_id": employee_id, "timestamp_utc": timestamp_iso},
+                                  files={"screenshot": ("screen.png", self.png, "image/png")})
+        report.raise_for_status()
+        shot.raise_for_status()
+        return report.headers.get('X-Ingest-Node'), shot.headers.get('X-Ingest-Node')
+
+
+def run(args):
+    import config
+    from cluster import HashRing
+    secret = args.secret or config.CLIENT_SECRET_KEY
+    storage_path = tempfile.mkdtemp(prefix="multinode_screens_")
+    db_name = f"multinode_{os.getpid()}"
+    processes = start_nodes(args.nodes, args.base_port, args.mongo_uri, db_name, storage_path)
+    urls = list(processes)
+    failures = []
+    results = {"nodes": args.nodes, "agents": args.agents}
+    try:
+        wait_until_up(urls)
+        driver = FleetDriver(urls, secret)
+        employees = [f"MN{i:05d}" for i in range(args.agents)]
+
+        # Routing: two different nodes must agree on every agent's ingest node
+        def assign(employee_id):
+            first, second = random.sample(urls, 2) if len(urls) > 1 else (urls[0], urls[0])
+            return employee_id, driver.ingest_url(employee_id, first), driver.ingest_url(employee_id, second)
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            assignments = {}
+            for employee_id, url_a, url_b in executor.map(assign, employees):
+                if url_a != url_b:
+                    failures.append(f"routing: nodes disagree for {employee_id}: {url_a} vs {url_b}")
+                assignments[employee_id] = url_a
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            served = list(executor.map(lambda e: (e, driver.send(e, assignments[e], 0)), employees))
+        results["ingest_seconds"] = round(time.perf_counter() - start, 2)
+        for employee_id, nodes in served:
+            if any(node != assignments[employee_id] for node in nodes):
+                failures.append(f"routing: {employee_id} assigned {assignments[employee_id]} but served by {nodes}")
+
+        per_node = Counter(assignments.values())
+        mean = args.agents / args.nodes
+        results["agents_per_node"] = dict(sorted(per_node.items()))
+        results["balance_max_over_mean"] = round(max(per_node.values()) / mean, 3)
+
+        # Remap: dropping one node from the ring may only move the agents that were on it
+        removed = urls[-1]
+        smaller = HashRing(urls[:-1])
+        moved = [e for e in employees if smaller.node_for(e) != assignments[e]]
+        results["remap_fraction"] = round(len(moved) / args.agents, 3)
+        stray = [e for e in moved if assignments[e] != removed]
+        if stray:
+            failures.append(f"remap: {len(stray)} agents moved that were not on the removed node")
+
+        # Failover: kill that node, then send its agents' data to their new node
+        processes[removed].terminate()
+        processes[removed].wait(10)
+        orphans = [e for e in employees if assignments[e] == removed]
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(lambda e: driver.send(e, smaller.node_for(e), 60), orphans))
+        results["failover_agents"] = len(orphans)
+
+        if args.mongo_uri:
+            from pymongo import MongoClient
+            database = MongoClient(args.mongo_uri)[db_name]
+            expected = args.agents + len(orphans)
+            counts = {"activity_logs": database.activity_logs.count_documents({}),
+                      "screenshots": database.screenshots.count_documents({}),
+                      "employees": database.employees.count_documents({})}
+            results["documents"] = counts
+            if counts["activity_logs"] != expected or counts["screenshots"] != expected:
+                failures.append(f"data: expected {expected} reports and screenshots, found {counts}")
+            if counts["employees"] != args.agents:
+                failures.append(f"data: expected {args.agents} employees, found {counts['employees']}")
+            if not args.keep_db:
+                MongoClient(args.mongo_uri).drop_database(db_name)
+    finally:
+        for process in processes.values():
+            if process.poll() is None:
+                process.terminate()
+                process.wait(10)
+        shutil.rmtree(storage_path, ignore_errors=True)
+
+    results["failures"] = failures
+    print(json.dumps(results, indent=2))
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--agents', type=int, default=300)
+    parser.add_argument('--base-port', type=int, default=5101)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--mongo-uri', help="Shared mongod/mongos for all nodes (default: per-node mongomock)")
+    parser.add_argument('--keep-db', action='store_true', help="Don't drop the test database afterwards")
+    parser.add_argument('--secret', default=None, help="X-Client-Secret (default: config.CLIENT_SECRET_KEY)")
+    parser.add_argument('--serve-node', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--db-name', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_node:
+        serve_node(args.serve_node, args.mongo_uri, args.db_name)
+        return
+    if args.nodes < 2:
+        parser.error("--nodes must be at least 2")
+    sys.exit(0 if run(args) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+import threading
+import time
+import pickle
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+# --- In-Process Backend ---
+class MemoryBackend:
+    """Thread-safe LRU store with a per-entry TTL. Lives inside a single worker process."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._generations = {}      # scope -> int, never evicted so invalidation is not lost
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)  # Mark as most recently used
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)  # Evict least recently used
+
+    def generation(self, scope):
+        with self._lock:
+            return self._generations.get(scope, 0)
+
+    def bump_generation(self, scope):
+        with self._lock:
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+
+    def size(self):
+        with self._lock:
+            return len(self._data)
+
+
+# --- Shared Backend (optional, requires 'redis' package) ---
+class RedisBackend:
+    """Stores pickled query results in Redis so every ingest/admin node shares one cache."""
+
+    def __init__(self, url, prefix="emcache:"):
+        import redis  # Imported lazily; only needed when CACHE_BACKEND=redis
+        self._redis = redis.Redis.from_url(url, socket_connect_timeout=2, socket_timeout=2)
+        self._redis.ping() # from_url() connects lazily; fail here so create_query_cache can fall back
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._redis.get(self._prefix + key)
+        if raw is None:
+            return False, None
+        return True, pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self._redis.set(self._prefix + key, pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def generation(self, scope):
+        raw = self._redis.get(f"{self._prefix}gen:{scope}")
+        return int(raw) if raw is not None else 0
+
+    def bump_generation(self, scope):
+        self._redis.incr(f"{self._prefix}gen:{scope}")
+
+    def clear(self):
+        for key in self._redis.scan_iter(match=self._prefix + "*"):
+            self._redis.delete(key)
+
+    def size(self):
+        return None  # Not tracked for the shared backend
+
+
+# --- Query Cache ---
+class QueryCache:
+    """
+    Caches read-only query results grouped into invalidation scopes.
+
+    Each scope (e.g. 'employee:EMP001') carries a generation counter that is part of
+    every cache key, so invalidating a scope is a single counter bump and stale entries
+    simply age out of the backend.
+
+    Invalidation is only as wide as the backend: with MemoryBackend, other processes keep
+    serving their own entries until the TTL expires. After a backend error the cache is
+    bypassed for error_backoff seconds, so an unreachable Redis costs one failed call per
+    backoff period instead of one per request.
+    """
+
+    def __init__(self, backend, ttl=30, enabled=True, error_backoff=30):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.error_backoff = error_backoff
+        self._bypass_until = 0.0
+        self._hits = {}
+        self._misses = {}
+        self._invalidations = {}
+        self._errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter, namespace):
+        with self._lock:
+            counter[namespace] = counter.get(namespace, 0) + 1
+
+    def _backend_failed(self):
+        with self._lock:
+            self._errors += 1
+            self._bypass_until = time.monotonic() + self.error_backoff
+
+    def _bypassed(self):
+        return time.monotonic() < self._bypass_until
+
+    def get_or_load(self, scope, key, loader):
+        """Returns the cached value for key within scope, calling loader() on a miss.
+
+        A loader result of None is passed through without being cached.
+        """
+        namespace = key.split(":", 1)[0]
+        if not self.enabled or self._bypassed():
+            return loader()
+
+        try:
+            full_key = f"{scope}@{self.backend.generation(scope)}|{key}"
+            hit, value = self.backend.get(full_key)
+        except Exception as e:
+            # A broken shared backend must never take the admin views down with it
+            logger.error(f"Cache lookup failed for '{key}', bypassing the cache for {self.error_backoff}s: {e}")
+            self._backend_failed()
+            return loader()
+
+        if hit:
+            self._count(self._hits, namespace)
+            return value
+
+        self._count(self._misses, namespace)
+        value = loader()
+        if value is not None:
+            try:
+                self.backend.set(full_key, value, self.ttl)
+            except Exception as e:
+                logger.error(f"Cache store failed for '{key}': {e}")
+                self._backend_failed()
+        return value
+
+    def invalidate(self, *scopes):
+        """Invalidates every cached entry belonging to the given scopes."""
+        if not self.enabled:
+            return
+        for scope in scopes:
+            try:
+                self.backend.bump_generation(scope)
+                self._count(self._invalidations, scope.split(":", 1)[0])
+            except Exception as e:
+                logger.error(f"Cache invalidation failed for scope '{scope}': {e}")
+                self._backend_failed()
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        """Returns hit/miss counters per namespace, suitable for JSON output."""
+        with self._lock:
+            hits = dict(self._hits)
+            misses = dict(self._misses)
+            invalidations = dict(self._invalidations)
+            errors = self._errors
+        total_hits = sum(hits.values())
+        total_lookups = total_hits + sum(misses.values())
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.size(),
+            "hits": hits,
+            "misses": misses,
+            "invalidations": invalidations,
+            "errors": errors,
+            "hit_ratio": round(total_hits / total_lookups, 4) if total_lookups else None,
+        }
+
+
+def create_query_cache(backend_name="memory", redis_url=None, ttl=30, max_entries=1024, enabled=True, processes=1):
+    """Builds the configured QueryCache, falling back to the in-process backend if Redis is unavailable.
+
+    backend_name "auto" uses Redis when processes > 1 (several workers or nodes share the data),
+    since MemoryBackend invalidations don't reach other processes.
+    """
+    if backend_name == "auto":
+        backend_name = "redis" if processes > 1 else "memory"
+    backend = None
+    if backend_name == "redis":
+        try:
+            backend = RedisBackend(redis_url)
+            logger.info("Query cache using shared Redis backend.")
+        except Exception as e:
+            logger.error(f"Could not initialise Redis cache backend ({e}). Falling back to in-process cache.")
+    if backend is None:
+        backend = MemoryBackend(max_entries=max_entries)
+        if processes > 1:
+            logger.warning(f"In-process query cache with {processes} server processes: admin views may be "
+                           f"up to {ttl}s stale after an update handled by another process.")
+    return QueryCache(backend, ttl=ttl, enabled=enabled)
@@ -0,0 +1,96 @@
+"""
+Multi-node deployment helpers: MongoDB shard keys and consistent-hash routing of agents to ingest nodes.
+
+Sharding is applied once by an operator, against a mongos, with cluster admin rights:
+    python cluster.py --apply        # enableSharding + shardCollection for SHARD_KEYS
+    python cluster.py                # print the plan only
+Set MONGO_SHARDED=True on every server so models.ensure_collections_and_indexes creates the
+matching index layout.
+"""
+import bisect
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Per-employee time series are sharded on hashed employee_id (spreads agents evenly across shards,
+# and every per-employee query stays on one shard) plus timestamp (splits a busy employee's chunks).
+# users and agent_configs are small and stay unsharded on the primary shard.
+SHARD_KEYS = {
+    "employees": {"employee_id": "hashed"},
+    "activity_logs": {"employee_id": "hashed", "timestamp": 1},
+    "screenshots": {"employee_id": "hashed", "timestamp": 1},
+    "agent_telemetry": {"employee_id": "hashed", "timestamp": 1},
+}
+
+
+def shard_key_index(collection_name):
+    """The shard key as a create_index spec, or None for unsharded collections."""
+    key = SHARD_KEYS.get(collection_name)
+    return list(key.items()) if key else None
+
+
+def apply_sharding(client, db_name):
+    """Enables sharding for the database and shards every collection in SHARD_KEYS.
+
+    Safe to re-run: collections that are already sharded are skipped.
+    """
+    from pymongo import errors
+    try:
+        client.admin.command("enableSharding", db_name)
+    except errors.OperationFailure as e:
+        if e.code != 23: # AlreadyInitialized
+            raise
+    sharded = {entry["_id"] for entry in client.config.collections.find({"_id": {"$regex": f"^{db_name}\\."}})}
+    for collection_name, key in SHARD_KEYS.items():
+        namespace = f"{db_name}.{collection_name}"
+        if namespace in sharded:
+            logger.info(f"{namespace} is already sharded.")
+            continue
+        client[db_name][collection_name].create_index(list(key.items()))
+        client.admin.command("shardCollection", namespace, key=key)
+        logger.info(f"Sharded {namespace} on {key}.")
+
+
+# --- Ingest Routing ---
+class HashRing:
+    """Consistent-hash ring mapping keys (employee IDs) to nodes (ingest base URLs).
+
+    Each node gets `replicas` points on the ring, so adding or removing a node only moves
+    about 1/N of the keys. Every server builds the same ring from the same node list, so
+    any node can tell an agent where to send its writes.
+    """
+
+    def __init__(self, nodes, replicas=128):
+        self.nodes = sorted(set(nodes))
+        self.replicas = replicas
+        self._points = []
+        self._owners = []
+        for point, node in sorted((self._hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas)):
+            self._points.append(point)
+            self._owners.append(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def node_for(self, key):
+        """The node responsible for key, or None if the ring is empty."""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+if __name__ == "__main__":
+    import argparse
+    import config
+    parser = argparse.ArgumentParser(description="Shard the employee monitor collections (run against a mongos).")
+    parser.add_argument("--apply", action="store_true", help="Run enableSharding/shardCollection (default: print the plan)")
+    args = parser.parse_args()
+    for name, key in SHARD_KEYS.items():
+        print(f"{config.MONGO_DB_NAME}.{name}: {key}")
+    if args.apply:
+        from pymongo import MongoClient
+        logging.basicConfig(level=logging.INFO)
+        apply_sharding(MongoClient(config.MONGO_URI), config.MONGO_DB_NAME)
@@ -1,7 +1,13 @@
 import os
 from dotenv import load_dotenv
+import logging
+import pytz
 from urllib.parse import quote_plus # Import quote_plus for URL encoding
 
+# Problems found while loading the settings, as (logging level, message). Nothing is printed at
+# import time; create_app logs these once logging is configured.
+STARTUP_MESSAGES = []
+
 # Load environment variables from a .env file if present
 # Place the .env file in the same directory as this config.py
 load_dotenv()
@@ -27,9 +33,9 @@ MONGO_URI = None # Initialize MONGO_URI
 
 # Check if required credentials are provided
 if not MONGO_USERNAME:
-    print("WARNING: MONGO_USERNAME environment variable not set.")
+    STARTUP_MESSAGES.append((logging.WARNING, "MONGO_USERNAME environment variable not set."))
 if not MONGO_PASSWORD:
-    print("WARNING: MONGO_PASSWORD environment variable not set.")
+    STARTUP_MESSAGES.append((logging.WARNING, "MONGO_PASSWORD environment variable not set."))
 
 # Construct the URI only if username and password are provided
 # Apply URL encoding using quote_plus
@@ -39,14 +45,14 @@ if MONGO_USERNAME and MONGO_PASSWORD:
             f"mongodb://{quote_plus(MONGO_USERNAME)}:{quote_plus(MONGO_PASSWORD)}"
             f"@{MONGO_HOST}:{MONGO_PORT}/{MONGO_DB_NAME}?authSource={MONGO_AUTH_DB}"
         )
-        print(f"MongoDB URI constructed with authentication for user '{MONGO_USERNAME}'")
+        STARTUP_MESSAGES.append((logging.INFO, f"MongoDB URI constructed with authentication for user '{MONGO_USERNAME}'"))
     except Exception as e:
-         print(f"ERROR: Failed to construct MongoDB URI: {e}")
+         STARTUP_MESSAGES.append((logging.ERROR, f"Failed to construct MongoDB URI: {e}"))
          # Optionally raise an error here if URI construction fails critically
          # raise ValueError(f"Failed to construct MongoDB URI: {e}") from e
 else:
     # Handle case without authentication (or raise error if auth is mandatory)
-    print("WARNING: Attempting to construct MongoDB URI without authentication (username or password missing).")
+    STARTUP_MESSAGES.append((logging.WARNING, "Attempting to construct MongoDB URI without authentication (username or password missing)."))
     # If your setup requires auth, you should probably raise an error here instead.
     # raise ValueError("MongoDB username and password are required but not set in environment.")
     MONGO_URI = f"mongodb://{MONGO_HOST}:{MONGO_PORT}/{MONGO_DB_NAME}"
@@ -55,7 +61,96 @@ else:
 # --- Storage Settings ---
 # Define the base directory for the server application
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-SCREENSHOT_STORAGE_PATH = os.path.join(BASE_DIR, "storage", "screenshots")
+# With several ingest nodes this must be storage shared by all of them (e.g. an NFS mount)
+SCREENSHOT_STORAGE_PATH = os.getenv("SCREENSHOT_STORAGE_PATH", os.path.join(BASE_DIR, "storage", "screenshots"))
+
+
+# --- Multi-Node Settings ---
+# Set when the database is a sharded cluster (see cluster.py); switches to shard-compatible indexes
+MONGO_SHARDED = os.getenv("MONGO_SHARDED", "False").lower() in ("true", "1", "t")
+# Base URLs of all ingest nodes, comma separated. If set, /api/agent_config tells each agent which
+# node to send its reports and screenshots to (consistent hash of its employee ID).
+INGEST_NODES = [url.strip().rstrip("/") for url in os.getenv("INGEST_NODES", "").split(",") if url.strip()]
+# Returned in the X-Ingest-Node header of ingest responses (defaults to hostname:pid)
+INGEST_NODE_ID = os.getenv("INGEST_NODE_ID")
+
+
+# --- Ingest Settings ---
+# Employee last_seen bumps are buffered per process and written in one bulk write this often.
+# 0 writes every bump immediately (one employee upsert per report/screenshot).
+LAST_SEEN_FLUSH_SECONDS = float(os.getenv("LAST_SEEN_FLUSH_SECONDS", "5"))
+# /api/report bodies (JSON, MessagePack or CBOR; optionally gzip/zstd compressed, see wire_format.py)
+# are rejected (413) if they are larger than this, as sent or after decompression
+REPORT_MAX_BODY_BYTES = int(os.getenv("REPORT_MAX_BODY_BYTES", str(1024 * 1024)))
+
+
+# --- Startup Settings ---
+# Collections/indexes are only (re)created when the schema version stored in the database differs
+# from models.SCHEMA_VERSION; set this to verify them on every start regardless
+FORCE_INDEX_CHECK = os.getenv("FORCE_INDEX_CHECK", "False").lower() in ("true", "1", "t")
+# Seconds between attempts when the database is unreachable at startup (see /ready)
+STARTUP_RETRY_SECONDS = int(os.getenv("STARTUP_RETRY_SECONDS", "5"))
+
+
+# --- Display Settings ---
+# Default timezone for timestamps in the admin UI; each admin can override it on the Preferences page
+DISPLAY_TIMEZONE = os.getenv("DISPLAY_TIMEZONE", "Asia/Kolkata")
+if DISPLAY_TIMEZONE not in pytz.all_timezones_set:
+    # Every page renders a timezone label, so an unknown zone would break all of them
+    STARTUP_MESSAGES.append((logging.WARNING, f"DISPLAY_TIMEZONE '{DISPLAY_TIMEZONE}' is not a known timezone. Using UTC."))
+    DISPLAY_TIMEZONE = "UTC"
+
+
+# --- Query Cache Settings (Admin Views) ---
+# "memory" keeps a per-process LRU whose invalidations don't reach other processes (they serve their
+# entries until CACHE_TTL_SECONDS); "redis" shares one cache across all server processes/nodes.
+# "auto" picks redis when WEB_CONCURRENCY (gunicorn's worker count) > 1 or INGEST_NODES lists several nodes.
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "True").lower() in ("true", "1", "t")
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "auto").lower()
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+
+
+# --- Export Settings ---
+# Documents fetched per MongoDB round trip and rows per Parquet row group / CSV flush
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+EXPORT_ROW_GROUP_SIZE = int(os.getenv("EXPORT_ROW_GROUP_SIZE", "50000"))
+EXPORT_MAX_DAYS = int(os.getenv("EXPORT_MAX_DAYS", "92"))
+
+
+# --- Screenshot Search Settings ---
+# Window titles focused within this many seconds of a screenshot are indexed with it
+SCREENSHOT_SEARCH_CONTEXT_SECONDS = int(os.getenv("SCREENSHOT_SEARCH_CONTEXT_SECONDS", "120"))
+SCREENSHOT_SEARCH_MAX_RESULTS = int(os.getenv("SCREENSHOT_SEARCH_MAX_RESULTS", "200"))
+# Searches without a From date only look this many days back (before To, if given); 0 searches everything.
+# $text matches are filtered and sorted in memory, so the window bounds the cost of common words.
+SCREENSHOT_SEARCH_DEFAULT_DAYS = int(os.getenv("SCREENSHOT_SEARCH_DEFAULT_DAYS", "30"))
+
+
+# --- Metrics Settings ---
+# If set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>" (configure the same token in Prometheus).
+# If not set, /metrics only answers requests from localhost.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+# --- Agent Telemetry Settings ---
+# How long the agents' self-reported overhead summaries are kept (TTL index)
+AGENT_TELEMETRY_RETENTION_DAYS = int(os.getenv("AGENT_TELEMETRY_RETENTION_DAYS", "30"))
+
+
+# --- Agent Configuration Settings ---
+# Defaults pushed to agents via /api/agent_config (override per group/employee on the Agent Config page)
+AGENT_DEFAULT_REPORT_INTERVAL_SECONDS = int(os.getenv("AGENT_DEFAULT_REPORT_INTERVAL_SECONDS", "60"))
+AGENT_DEFAULT_SCREENSHOT_INTERVAL_SECONDS = int(os.getenv("AGENT_DEFAULT_SCREENSHOT_INTERVAL_SECONDS", "300"))
+# Ask agents to stretch their intervals (x2, x4) when ingest latency or requests in flight exceed these
+LOAD_SHED_ENABLED = os.getenv("LOAD_SHED_ENABLED", "True").lower() in ("true", "1", "t")
+LOAD_SHED_LATENCY_MS = int(os.getenv("LOAD_SHED_LATENCY_MS", "500"))
+LOAD_SHED_INFLIGHT = int(os.getenv("LOAD_SHED_INFLIGHT", "64"))
+# Longest stretch one report's focus events are credited for (time per window, screenshot search).
+# Covers the default interval stretched x4 by load shedding; longer gaps mean the agent was not running.
+FOCUS_MAX_GAP_SECONDS = int(os.getenv("FOCUS_MAX_GAP_SECONDS", str(4 * AGENT_DEFAULT_REPORT_INTERVAL_SECONDS)))
 
 
 # --- Admin Credentials (For initial setup or fallback) ---
@@ -65,6 +160,17 @@ ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = str(os.getenv("ADMIN_PASSWORD", "password")) # CHANGE THIS in .env! Hash this in production DB.
 
 
+# --- Login Hardening ---
+# Werkzeug hash method for admin passwords, e.g. "pbkdf2:sha256:600000" or "scrypt".
+# Existing hashes are upgraded transparently on the next successful login after this changes.
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+# Token buckets: a burst of N attempts, then one more attempt every REFILL seconds
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_IP_REFILL_SECONDS = float(os.getenv("LOGIN_IP_REFILL_SECONDS", "6"))
+LOGIN_USER_BURST = int(os.getenv("LOGIN_USER_BURST", "5"))
+LOGIN_USER_REFILL_SECONDS = float(os.getenv("LOGIN_USER_REFILL_SECONDS", "60"))
+
+
 # --- Client Settings ---
 # Store this in your .env file and ensure it matches the client agent
 CLIENT_SECRET_KEY = os.getenv("CLIENT_SECRET_KEY", "default_client_secret_CHANGE_ME") # Change this!
@@ -72,15 +178,15 @@ CLIENT_SECRET_KEY = os.getenv("CLIENT_SECRET_KEY", "default_client_secret_CHANGE
 
 # --- Validation (Optional but recommended) ---
 if not SECRET_KEY or SECRET_KEY == "a_very_insecure_default_secret_key_CHANGE_ME":
-    print("WARNING: SECRET_KEY is not set or is using the default insecure value. Please set a strong SECRET_KEY in your .env file.")
+    STARTUP_MESSAGES.append((logging.WARNING, "SECRET_KEY is not set or is using the default insecure value. Please set a strong SECRET_KEY in your .env file."))
 
 if not CLIENT_SECRET_KEY or CLIENT_SECRET_KEY == "default_client_secret_CHANGE_ME":
-     print("WARNING: CLIENT_SECRET_KEY is not set or is using the default insecure value. Please set a strong CLIENT_SECRET_KEY in your .env file and the client.")
+     STARTUP_MESSAGES.append((logging.WARNING, "CLIENT_SECRET_KEY is not set or is using the default insecure value. Please set a strong CLIENT_SECRET_KEY in your .env file and the client."))
 
 if ADMIN_PASSWORD == "password" or ADMIN_PASSWORD == "Asset@123": # Example weak passwords
-    print(f"WARNING: Default or potentially weak ADMIN_PASSWORD ('{ADMIN_PASSWORD}') is being used. Please change it in your .env file.")
+    STARTUP_MESSAGES.append((logging.WARNING, f"Default or potentially weak ADMIN_PASSWORD ('{ADMIN_PASSWORD}') is being used. Please change it in your .env file."))
 
 if MONGO_URI is None and (MONGO_USERNAME and MONGO_PASSWORD):
-     print("CRITICAL WARNING: MongoDB URI could not be constructed despite username/password being present. Check for errors above.")
+     STARTUP_MESSAGES.append((logging.CRITICAL, "MongoDB URI could not be constructed despite username/password being present. Check for errors above."))
 elif MONGO_URI is None:
-     print("CRITICAL WARNING: MongoDB URI is None. Check environment variables and potential errors.")
\ No newline at end of file
+     STARTUP_MESSAGES.append((logging.CRITICAL, "MongoDB URI is None. Check environment variables and potential errors."))
\ No newline at end of file
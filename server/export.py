@@ -0,0 +1,142 @@
+import csv
+import io
+import logging
+import math
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Column order shared by every export format
+ACTIVITY_COLUMNS = ["employee_id", "timestamp", "active_window_title", "system_idle_time_seconds", "received_at"]
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+# Ingest doesn't enforce field types, so Parquet values are coerced to the column type (or null)
+# one by one; a single odd document must not abort the stream halfway through the download.
+def _as_string(value):
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def _as_float(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _as_datetime(value):
+    return value if isinstance(value, datetime) else None
+
+
+_PARQUET_COERCIONS = {
+    "employee_id": _as_string,
+    "timestamp": _as_datetime,
+    "active_window_title": _as_string,
+    "system_idle_time_seconds": _as_float,
+    "received_at": _as_datetime,
+}
+
+
+def stream_activity_csv(rows, flush_every=5000):
+    """Yields CSV text chunks for activity log documents, flushing every flush_every rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ACTIVITY_COLUMNS)
+    pending = 0
+    for row in rows:
+        writer.writerow([
+            row.get("employee_id"),
+            _isoformat(row.get("timestamp")),
+            row.get("active_window_title"),
+            row.get("system_idle_time_seconds"),
+            _isoformat(row.get("received_at")),
+        ])
+        pending += 1
+        if pending >= flush_every:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the caller instead of storing them."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_activity_parquet(rows, row_group_size=50000):
+    """Yields Parquet file bytes, writing one row group at a time so memory stays bounded."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("employee_id", pa.string()),
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("active_window_title", pa.string()),
+        ("system_idle_time_seconds", pa.float64()),
+        ("received_at", pa.timestamp("us", tz="UTC")),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    columns = {name: [] for name in ACTIVITY_COLUMNS}
+
+    def write_row_group():
+        table = pa.Table.from_pydict(columns, schema=schema)
+        writer.write_table(table, row_group_size=row_group_size)
+        for values in columns.values():
+            values.clear()
+
+    try:
+        for row in rows:
+            for name in ACTIVITY_COLUMNS:
+                columns[name].append(_PARQUET_COERCIONS[name](row.get(name)))
+            if len(columns["employee_id"]) >= row_group_size:
+                write_row_group()
+                yield sink.drain()
+        if columns["employee_id"]:
+            write_row_group()
+    finally:
+        writer.close() # Writes the footer
+    yield sink.drain()
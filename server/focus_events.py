@@ -0,0 +1,108 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_FOCUS_EVENTS = 1000 # Per report; matches the agent's buffer size
+MAX_TITLE_LENGTH = 512
+
+
+def normalize_focus_events(events):
+    """Validates the agent's [[timestamp_utc, window title], ...] list (see client/activity_tracker.py).
+
+    Returns a list of {"timestamp": naive UTC datetime, "window": title}, oldest first.
+    Malformed entries are dropped.
+    """
+    if not isinstance(events, list):
+        return []
+    normalized = []
+    for entry in events[-MAX_FOCUS_EVENTS:]:
+        try:
+            timestamp_str, title = entry
+            timestamp = datetime.fromisoformat(timestamp_str)
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            normalized.append({"timestamp": timestamp, "window": str(title)[:MAX_TITLE_LENGTH]})
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Discarding malformed focus event {entry!r}: {e}")
+    normalized.sort(key=lambda event: event["timestamp"])
+    return normalized
+
+
+def _idle_seconds(log):
+    try:
+        return max(float(log.get("system_idle_time_seconds") or 0), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def focus_intervals(activity_logs, max_gap_seconds, subtract_idle=False):
+    """Yields (title, start, end) focus intervals from the focus_events of activity logs, oldest first.
+
+    Each report covers the time since the agent's previous report, but never more than
+    max_gap_seconds: time the agent was stopped or offline is not credited to the window that
+    happened to be focused before. With subtract_idle, the report's system idle time (how long
+    the user had been inactive when it was sent) is cut from the end of its window.
+    Logs from agents that send no focus events are ignored.
+    """
+    max_gap = timedelta(seconds=max_gap_seconds)
+    focused, previous_end = None, None # Title carried over from the previous report window
+    for log in sorted(activity_logs, key=lambda log: naive_utc(log["timestamp"])):
+        end = naive_utc(log["timestamp"])
+        if previous_end is None or end - previous_end > max_gap:
+            start, focused = end - max_gap, None # Whatever was focused before the gap is unknown
+        else:
+            start = previous_end
+        previous_end = end
+        events = log.get("focus_events") or ()
+        if not events and focused is None:
+            continue
+        active_end = max(start, end - timedelta(seconds=_idle_seconds(log))) if subtract_idle else end
+        cursor = start
+        for event in events:
+            switched_at = min(max(event["timestamp"], start), end)
+            if focused is not None and min(switched_at, active_end) > cursor:
+                yield focused, cursor, min(switched_at, active_end)
+            focused, cursor = event["window"], max(switched_at, cursor)
+        if focused is not None and active_end > cursor:
+            yield focused, cursor, active_end
+
+
+def time_per_window(activity_logs, max_gap_seconds):
+    """Adds up focus time per window title (see focus_intervals), idle time excluded.
+
+    Returns [(title, seconds)], longest first.
+    """
+    totals = {}
+    for title, start, end in focus_intervals(activity_logs, max_gap_seconds, subtract_idle=True):
+        totals[title] = totals.get(title, 0) + (end - start).total_seconds()
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def naive_utc(timestamp):
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None) if timestamp.tzinfo is not None else timestamp
+
+
+def titles_around(timestamp, activity_logs, context_seconds, max_gap_seconds):
+    """Window titles focused at any point within context_seconds of timestamp, for search indexing.
+
+    Uses the logs' focus_events where present (see focus_intervals; idle time counts, the
+    window was still on screen). The window focused at the newest report is assumed to stay
+    focused for at most max_gap_seconds after it. For logs from agents without focus events,
+    the log's active_window_title counts if the log itself falls in the window.
+    """
+    timestamp = naive_utc(timestamp)
+    start, end = timestamp - timedelta(seconds=context_seconds), timestamp + timedelta(seconds=context_seconds)
+    titles = []
+    last = None
+    for title, focus_start, focus_end in focus_intervals(activity_logs, max_gap_seconds):
+        if focus_start <= end and focus_end >= start:
+            titles.append(title)
+        last = (title, focus_end)
+    newest = max((naive_utc(log["timestamp"]) for log in activity_logs), default=None)
+    if last is not None and last[1] == newest and newest <= end and newest + timedelta(seconds=max_gap_seconds) >= start:
+        titles.append(last[0])
+    for log in activity_logs:
+        if not log.get("focus_events") and start <= naive_utc(log["timestamp"]) <= end:
+            titles.append(log.get("active_window_title"))
+    return sorted({title for title in titles if title and not title.startswith("N/A")})
@@ -0,0 +1,295 @@
+import threading
+import time
+import logging
+from flask import request, g
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, tuned for web requests and single MongoDB commands
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+# --- Metric Types (Prometheus text exposition format) ---
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One failing collector (e.g. DB down) must not hide every other metric
+                logger.error(f"Failed to collect metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self._header() + [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                                 for key, value in values.items()]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self._header() + [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                                 for key, value in values.items()]
+
+
+class CallbackGauge(_Metric):
+    """Gauge whose values are computed at scrape time.
+
+    callback returns a number, or a dict mapping label value tuples to numbers.
+    """
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, callback, labelnames=(), registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.callback = callback
+
+    def render(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return self._header() + [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                                 for key, value in values.items() if value is not None]
+
+
+class CallbackCounter(CallbackGauge):
+    """Counter maintained elsewhere (e.g. cache statistics) and read at scrape time."""
+    type_name = "counter"
+
+
+_queue_depth_sources = {}
+
+
+def register_queue_depth(name, callback):
+    """Exposes callback() as em_queue_depth{queue=name}. Used by in-process buffers and queues."""
+    _queue_depth_sources[name] = callback
+
+
+queue_depth = CallbackGauge(
+    "em_queue_depth", "Items waiting in in-process queues/buffers.",
+    lambda: {(name,): callback() for name, callback in _queue_depth_sources.items()}, ("queue",))
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0] # bucket counts, count, sum
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    def render(self):
+        with self._lock:
+            values = {key: (list(state[0]), state[1], state[2]) for key, state in self._values.items()}
+        lines = self._header()
+        for key, (bucket_counts, count, total) in values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+        return lines
+
+
+# --- Server Metrics ---
+http_requests_total = Counter(
+    "em_http_requests_total", "HTTP requests handled, by route.", ("endpoint", "method", "status"))
+http_request_duration = Histogram(
+    "em_http_request_duration_seconds", "HTTP request latency, by route.", ("endpoint", "method"))
+mongo_command_duration = Histogram(
+    "em_mongo_command_duration_seconds", "MongoDB command latency, by command.", ("command",))
+mongo_command_failures_total = Counter(
+    "em_mongo_command_failures_total", "MongoDB commands that failed, by command.", ("command",))
+mongo_pool_connections = Gauge(
+    "em_mongo_pool_connections", "MongoDB pool connections, by state (open / checked_out).", ("address", "state"))
+screenshot_bytes_written_total = Counter(
+    "em_screenshot_bytes_written_total", "Bytes of screenshot files written to storage.")
+screenshots_written_total = Counter(
+    "em_screenshots_written_total", "Screenshot files written to storage.")
+
+
+# --- Per-Request DB Accounting (feeds Server-Timing) ---
+_request_state = threading.local()
+
+
+def _reset_request_state():
+    _request_state.db_seconds = 0.0
+    _request_state.db_commands = 0
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every MongoDB command and attributes it to the current request thread."""
+
+    def started(self, event):
+        pass
+
+    def _record(self, event):
+        seconds = event.duration_micros / 1_000_000
+        mongo_command_duration.observe(seconds, command=event.command_name)
+        if hasattr(_request_state, "db_seconds"):
+            _request_state.db_seconds += seconds
+            _request_state.db_commands += 1
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+        mongo_command_failures_total.inc(command=event.command_name)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Tracks open and checked-out connections per server address."""
+
+    def _address(self, event):
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): pass
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc(address=self._address(event), state="open")
+
+    def connection_closed(self, event):
+        mongo_pool_connections.dec(address=self._address(event), state="open")
+
+    def connection_checked_out(self, event):
+        mongo_pool_connections.inc(address=self._address(event), state="checked_out")
+
+    def connection_checked_in(self, event):
+        mongo_pool_connections.dec(address=self._address(event), state="checked_out")
+
+
+def mongo_event_listeners():
+    """Listeners to pass to MongoClient(event_listeners=...)."""
+    return [MongoCommandListener(), MongoPoolListener()]
+
+
+def record_screenshot_written(num_bytes):
+    screenshots_written_total.inc()
+    screenshot_bytes_written_total.inc(num_bytes)
+
+
+# --- Flask Integration ---
+def init_app(app):
+    """Installs request timing hooks. Server-Timing headers are added to non-API (admin) responses."""
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+        _reset_request_state()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        # Label by URL rule, not raw path, so per-employee URLs don't explode the series count
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        http_requests_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        http_request_duration.observe(elapsed, endpoint=endpoint, method=request.method)
+
+        if not request.path.startswith("/api/"):
+            db_ms = getattr(_request_state, "db_seconds", 0.0) * 1000
+            db_commands = getattr(_request_state, "db_commands", 0)
+            response.headers.add(
+                "Server-Timing",
+                f'db;dur={db_ms:.1f};desc="{db_commands} Mongo commands", total;dur={elapsed * 1000:.1f}')
+        return response
+
+
+def render():
+    return REGISTRY.render()
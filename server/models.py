@@ -1,10 +1,18 @@
-from pymongo import MongoClient, errors
+from pymongo import MongoClient, UpdateOne, errors
 from pymongo.server_api import ServerApi
 from werkzeug.security import generate_password_hash, check_password_hash
 import config
+import cache
+import metrics
+import focus_events
+import cluster
+import presence
+import search_index
 import os
 import logging
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,42 +20,86 @@ logger = logging.getLogger(__name__)
 # --- Global Variables ---
 db = None
 client = None
+_connect_lock = threading.Lock()
+
+# Bump whenever ensure_collections_and_indexes changes. The applied version is stored in the
+# 'meta' collection, so restarts skip the collection/index round trips when nothing changed.
+SCHEMA_VERSION = 1
+
+# Progress of start_background_setup(), reported by /ready
+startup_state = {"database": "pending", "schema": "pending", "admin_user": "pending", "error": None}
+
+# Read-through cache for the admin view queries; invalidated by the ingest writes below
+query_cache = cache.create_query_cache(
+    backend_name=config.CACHE_BACKEND,
+    redis_url=config.CACHE_REDIS_URL,
+    ttl=config.CACHE_TTL_SECONDS,
+    max_entries=config.CACHE_MAX_ENTRIES,
+    enabled=config.CACHE_ENABLED,
+    processes=max(config.WEB_CONCURRENCY, len(config.INGEST_NODES)),
+)
+
+def _cache_counter(name):
+    return lambda: {(namespace,): count for namespace, count in query_cache.stats()[name].items()}
+
+metrics.CallbackCounter("em_query_cache_hits_total", "Admin view query cache hits, by namespace.",
+                        _cache_counter("hits"), ("namespace",))
+metrics.CallbackCounter("em_query_cache_misses_total", "Admin view query cache misses, by namespace.",
+                        _cache_counter("misses"), ("namespace",))
+metrics.CallbackCounter("em_query_cache_invalidations_total", "Admin view query cache invalidations, by namespace.",
+                        _cache_counter("invalidations"), ("namespace",))
+metrics.CallbackCounter("em_query_cache_errors_total", "Query cache backend errors.",
+                        lambda: query_cache.stats()["errors"])
+metrics.CallbackGauge("em_query_cache_entries", "Entries in the in-process query cache (absent for Redis).",
+                      lambda: query_cache.backend.size())
+
+def invalidate_employee_cache(employee_id):
+    """Drops cached admin view data for one employee (and the employee list it appears in)."""
+    query_cache.invalidate(f"employee:{employee_id}", "employees")
 
 # --- Database Connection ---
 def connect_db():
-    """Connects to MongoDB and returns the database object."""
-    global client, db
+    """Connects to MongoDB and returns the database object.
+
+    Collections and indexes are not touched here; start_background_setup() verifies them.
+    """
     if db is None:
-        try:
-            logger.info(f"Attempting to connect to MongoDB at {config.MONGO_HOST}:{config.MONGO_PORT}")
-            client = MongoClient(
-                config.MONGO_URI,
-                server_api=ServerApi('1'), # Use modern Server API
-                serverSelectionTimeoutMS=5000 # Timeout after 5 seconds
-            )
-            # The ismaster command is cheap and does not require auth.
-            client.admin.command('ismaster')
-            logger.info("MongoDB connection successful.")
-            db = client[config.MONGO_DB_NAME]
-            ensure_collections_and_indexes() # Ensure collections exist after connection
-            # Create storage directories if they don't exist
-            os.makedirs(config.SCREENSHOT_STORAGE_PATH, exist_ok=True)
-            logger.info(f"Screenshot storage path ensured: {config.SCREENSHOT_STORAGE_PATH}")
-
-        except errors.ConnectionFailure as e:
-            logger.error(f"Could not connect to MongoDB: {e}")
-            db = None # Ensure db is None if connection fails
-            raise ConnectionError(f"Failed to connect to MongoDB: {e}") from e
-        except errors.ConfigurationError as e:
-             logger.error(f"MongoDB configuration error (check username/password/authSource): {e}")
-             db = None
-             raise ConnectionError(f"MongoDB configuration error: {e}") from e
-        except Exception as e:
-            logger.error(f"An unexpected error occurred during DB connection: {e}")
-            db = None
-            raise ConnectionError(f"Unexpected error connecting to DB: {e}") from e
+        with _connect_lock: # Startup thread and first requests may race to connect
+            if db is None:
+                _open_connection()
     return db
 
+def _open_connection():
+    global client, db
+    try:
+        logger.info(f"Attempting to connect to MongoDB at {config.MONGO_HOST}:{config.MONGO_PORT}")
+        client = MongoClient(
+            config.MONGO_URI,
+            server_api=ServerApi('1'), # Use modern Server API
+            serverSelectionTimeoutMS=5000, # Timeout after 5 seconds
+            event_listeners=metrics.mongo_event_listeners() # Command timing and pool stats for /metrics
+        )
+        # The ismaster command is cheap and does not require auth.
+        client.admin.command('ismaster')
+        logger.info("MongoDB connection successful.")
+        db = client[config.MONGO_DB_NAME]
+        # Create storage directories if they don't exist
+        os.makedirs(config.SCREENSHOT_STORAGE_PATH, exist_ok=True)
+        logger.info(f"Screenshot storage path ensured: {config.SCREENSHOT_STORAGE_PATH}")
+
+    except errors.ConnectionFailure as e:
+        logger.error(f"Could not connect to MongoDB: {e}")
+        db = None # Ensure db is None if connection fails
+        raise ConnectionError(f"Failed to connect to MongoDB: {e}") from e
+    except errors.ConfigurationError as e:
+         logger.error(f"MongoDB configuration error (check username/password/authSource): {e}")
+         db = None
+         raise ConnectionError(f"MongoDB configuration error: {e}") from e
+    except Exception as e:
+        logger.error(f"An unexpected error occurred during DB connection: {e}")
+        db = None
+        raise ConnectionError(f"Unexpected error connecting to DB: {e}") from e
+
 def get_db():
     """Returns the database object, connecting if necessary."""
     if db is None:
@@ -62,14 +114,28 @@ def get_db():
     return db
 
 
-def ensure_collections_and_indexes():
-    """Checks if required collections exist and creates them if not. Also ensures indexes."""
+def _schema_fingerprint():
+    # The index layout also depends on whether the cluster is sharded
+    return f"{SCHEMA_VERSION}:{'sharded' if config.MONGO_SHARDED else 'single'}"
+
+def ensure_collections_and_indexes(force=False):
+    """Checks if required collections exist and creates them if not. Also ensures indexes.
+
+    Skipped when the database already records the current schema version, unless force is set.
+    Returns True if the collections/indexes were verified, False if skipped.
+    """
     database = get_db()
     if database is None:
         logger.error("Cannot ensure collections, DB connection not available.")
-        return
+        return False
 
-    required_collections = ["users", "employees", "activity_logs", "screenshots"]
+    fingerprint = _schema_fingerprint()
+    stored = database.meta.find_one({"_id": "schema"})
+    if not force and stored and stored.get("version") == fingerprint:
+        logger.info(f"Schema version {fingerprint} already applied. Skipping collection/index verification.")
+        return False
+
+    required_collections = ["users", "employees", "activity_logs", "screenshots", "agent_telemetry", "agent_configs"]
     existing_collections = database.list_collection_names()
 
     for col_name in required_collections:
@@ -89,14 +155,40 @@ def ensure_collections_and_indexes():
     # Employees
     database.employees.create_index("employee_id", unique=True)
     database.employees.create_index("name")
+    database.employees.create_index("last_seen") # Dashboard sort and /metrics freshness counts
 
     # Activity Logs
     database.activity_logs.create_index([("employee_id", 1), ("timestamp", -1)]) # Compound index
 
     # Screenshots
     database.screenshots.create_index([("employee_id", 1), ("timestamp", -1)]) # Compound index
-    database.screenshots.create_index("screenshot_path", unique=True)
+    # A sharded collection can only enforce uniqueness on its shard key; paths are unique by construction
+    # (employee ID + microsecond timestamp + display), so the index is plain when sharded
+    try:
+        database.screenshots.create_index("screenshot_path", unique=not config.MONGO_SHARDED)
+    except errors.OperationFailure as e:
+        # Existing unique index from before MONGO_SHARDED was set; drop it before sharding (see cluster.py)
+        logger.warning(f"Keeping existing screenshot_path index: {e}")
+    database.screenshots.create_index("capture_id", sparse=True) # Groups the displays of one capture
+    # Window titles focused around each capture; no stemming/stop words since titles are names, not prose
+    database.screenshots.create_index([("window_titles", "text")], default_language="none",
+                                      name="window_titles_text")
+
+    # Agent Configs (one document per scope: 'default', 'group:<name>' or 'employee:<id>')
+    database.agent_configs.create_index("scope", unique=True)
+
+    # Agent Telemetry (self-reported overhead of the monitoring agent, expires automatically)
+    database.agent_telemetry.create_index([("employee_id", 1), ("timestamp", -1)])
+    database.agent_telemetry.create_index("received_at", expireAfterSeconds=config.AGENT_TELEMETRY_RETENTION_DAYS * 86400)
+
+    # Shard key indexes (hashed employee_id + timestamp); shardCollection itself is run via cluster.py
+    if config.MONGO_SHARDED:
+        for col_name in cluster.SHARD_KEYS:
+            database[col_name].create_index(cluster.shard_key_index(col_name))
     logger.info("Ensured necessary indexes exist.")
+    database.meta.update_one({"_id": "schema"}, {"$set": {"version": fingerprint, "applied_at": datetime.utcnow()}},
+                             upsert=True)
+    return True
 
 
 def setup_initial_admin_user():
@@ -108,7 +200,7 @@ def setup_initial_admin_user():
 
     try:
         if database.users.count_documents({"username": config.ADMIN_USERNAME}) == 0:
-            hashed_password = generate_password_hash(config.ADMIN_PASSWORD, method='pbkdf2:sha256')
+            hashed_password = generate_password_hash(config.ADMIN_PASSWORD, method=config.PASSWORD_HASH_METHOD)
             database.users.insert_one({
                 "username": config.ADMIN_USERNAME,
                 "password_hash": hashed_password,
@@ -121,36 +213,99 @@ def setup_initial_admin_user():
     except Exception as e:
         logger.error(f"Error setting up initial admin user: {e}")
 
+def start_background_setup():
+    """Connects, verifies collections/indexes and seeds the admin user on a background thread.
+
+    Lets the app start serving immediately; /ready reports when this has finished. Retries every
+    STARTUP_RETRY_SECONDS while the database is unreachable.
+    """
+    def run():
+        while True:
+            try:
+                connect_db()
+                startup_state["database"] = "connected"
+                startup_state["schema"] = "verifying"
+                verified = ensure_collections_and_indexes(force=config.FORCE_INDEX_CHECK)
+                startup_state["schema"] = "verified" if verified else "current"
+                setup_initial_admin_user()
+                startup_state["admin_user"] = "checked"
+                startup_state["error"] = None
+                logger.info(f"Background database setup finished (schema {startup_state['schema']}).")
+                return
+            except Exception as e:
+                startup_state["error"] = str(e)
+                logger.error(f"Background database setup failed, retrying in {config.STARTUP_RETRY_SECONDS}s: {e}")
+                time.sleep(config.STARTUP_RETRY_SECONDS)
+
+    thread = threading.Thread(target=run, name="StartupSetupThread", daemon=True)
+    thread.start()
+    return thread
+
+def is_ready():
+    return startup_state["admin_user"] == "checked"
+
 # --- Data Operations ---
 
 # Employee Management
-def add_or_update_employee(employee_id, name=None, last_seen=None):
-    database = get_db()
-    if database is None: return None
-    now = datetime.utcnow()
-    update_data = {"last_seen": last_seen or now}
-    if name:
-        update_data["name"] = name
-
-    result = database.employees.update_one(
-        {"employee_id": employee_id},
-        {"$set": update_data, "$setOnInsert": {"employee_id": employee_id, "first_seen": now}},
-        upsert=True
-    )
-    return result
-
 def get_employees():
-    database = get_db()
-    if database is None: return []
-    return list(database.employees.find().sort("last_seen", -1))
+    def load():
+        database = get_db()
+        if database is None: return None
+        return list(database.employees.find().sort("last_seen", -1))
+    employees = query_cache.get_or_load("employees", "employees:all", load) or []
+    pending = last_seen_buffer.pending()
+    if not pending:
+        return employees
+    # Read-through: overlay presence this node has buffered but not written yet
+    merged = [_with_pending_last_seen(employee, pending.get(employee["employee_id"])) for employee in employees]
+    known = {employee["employee_id"] for employee in employees}
+    merged.extend({"employee_id": employee_id, "first_seen": last_seen, "last_seen": last_seen}
+                  for employee_id, last_seen in pending.items() if employee_id not in known)
+    merged.sort(key=lambda employee: employee.get("last_seen") or datetime.min, reverse=True)
+    return merged
 
 def get_employee_by_id(employee_id):
+    def load():
+        database = get_db()
+        if database is None: return None
+        return database.employees.find_one({"employee_id": employee_id})
+    employee = query_cache.get_or_load(f"employee:{employee_id}", f"employee:{employee_id}", load)
+    pending = last_seen_buffer.pending(employee_id)
+    if employee is None and pending is not None: # Seen by this node, not flushed yet
+        return {"employee_id": employee_id, "first_seen": pending, "last_seen": pending}
+    return _with_pending_last_seen(employee, pending) if employee else employee
+
+# --- Presence (last_seen) ---
+# Ingest events bump last_seen through a per-process buffer that is flushed as one bulk write every
+# LAST_SEEN_FLUSH_SECONDS, instead of an upsert on the employee document for every event.
+def _write_last_seen(batch):
     database = get_db()
-    if database is None: return None
-    return database.employees.find_one({"employee_id": employee_id})
+    if database is None:
+        raise ConnectionError("Database connection not available")
+    database.employees.bulk_write([
+        UpdateOne({"employee_id": employee_id},
+                  {"$max": {"last_seen": last_seen}, # Never moves backwards if reports arrive out of order
+                   "$setOnInsert": {"employee_id": employee_id, "first_seen": first_seen}},
+                  upsert=True)
+        for employee_id, (first_seen, last_seen) in batch.items()], ordered=False)
+    query_cache.invalidate("employees", *(f"employee:{employee_id}" for employee_id in batch))
+
+last_seen_buffer = presence.LastSeenBuffer(_write_last_seen, flush_interval=config.LAST_SEEN_FLUSH_SECONDS)
+metrics.register_queue_depth("last_seen", lambda: len(last_seen_buffer))
+
+def record_last_seen(employee_id, timestamp):
+    """Marks the employee as seen at timestamp; the employee document is created on the first flush."""
+    last_seen_buffer.record(employee_id, focus_events.naive_utc(timestamp))
+    # The employee's logs/screenshots changed now; the employee list is invalidated when last_seen is written
+    query_cache.invalidate(f"employee:{employee_id}")
+
+def _with_pending_last_seen(employee, pending_last_seen):
+    if pending_last_seen is None or (employee.get("last_seen") and employee["last_seen"] >= pending_last_seen):
+        return employee
+    return dict(employee, last_seen=pending_last_seen) # Copy: the cached document must not change
 
 # Activity Log
-def add_activity_log(employee_id, timestamp, active_window_title="N/A", system_idle_time=0):
+def add_activity_log(employee_id, timestamp, active_window_title="N/A", system_idle_time=0, focus_events=None):
     database = get_db()
     if database is None: return None
     log_entry = {
@@ -160,17 +315,121 @@ def add_activity_log(employee_id, timestamp, active_window_title="N/A", system_i
         "system_idle_time_seconds": system_idle_time, # Placeholder
         "received_at": datetime.utcnow()
     }
+    if focus_events:
+        log_entry["focus_events"] = focus_events # [{timestamp, window}] since the agent's previous report
     result = database.activity_logs.insert_one(log_entry)
     # Also update employee's last seen status
-    add_or_update_employee(employee_id, last_seen=timestamp)
+    record_last_seen(employee_id, timestamp)
     return result.inserted_id
 
 def get_activity_logs(employee_id, limit=100):
+    def load():
+        database = get_db()
+        if database is None: return None
+        return list(database.activity_logs.find({"employee_id": employee_id})
+                    .sort("timestamp", -1)
+                    .limit(limit))
+    return query_cache.get_or_load(f"employee:{employee_id}", f"activity_logs:{employee_id}:{limit}", load) or []
+
+def count_employees_seen_within(windows):
+    """Returns {label: number of employees whose last_seen is within that timedelta}."""
+    database = get_db()
+    if database is None: return {}
+    now = datetime.utcnow()
+    return {label: database.employees.count_documents({"last_seen": {"$gte": now - window}})
+            for label, window in windows.items()}
+
+def get_employee_ids():
     database = get_db()
     if database is None: return []
-    return list(database.activity_logs.find({"employee_id": employee_id})
-                .sort("timestamp", -1)
-                .limit(limit))
+    # Employees seen by this node but not flushed yet have no employee document
+    return sorted(set(database.employees.distinct("employee_id")) | set(last_seen_buffer.pending()))
+
+def iter_activity_logs(employee_ids, start, end, batch_size=5000):
+    """Yields activity logs for each employee in [start, end), oldest first, without materializing them.
+
+    Runs one query per employee so each is a bounded range scan on the
+    (employee_id, timestamp) compound index.
+    """
+    database = get_db()
+    if database is None: return
+    projection = {"_id": 0, "employee_id": 1, "timestamp": 1, "active_window_title": 1,
+                  "system_idle_time_seconds": 1, "received_at": 1}
+    for employee_id in employee_ids:
+        cursor = (database.activity_logs
+                  .find({"employee_id": employee_id, "timestamp": {"$gte": start, "$lt": end}}, projection)
+                  .sort("timestamp", 1)
+                  .hint([("employee_id", 1), ("timestamp", -1)])
+                  .batch_size(batch_size))
+        try:
+            for log in cursor:
+                yield log
+        finally:
+            cursor.close()
+
+# Screenshot Search
+# Focus events reach the server with the report *after* they happen. A new screenshot picks up the
+# titles of the logs already stored around it, and is re-indexed in a batch once the following
+# reports have arrived (see search_index.py).
+def _search_lookaround():
+    # A log can describe focus changes up to FOCUS_MAX_GAP_SECONDS before it
+    return timedelta(seconds=config.SCREENSHOT_SEARCH_CONTEXT_SECONDS + config.FOCUS_MAX_GAP_SECONDS)
+
+def _find_logs_around(database, employee_id, first, last):
+    lookaround = _search_lookaround()
+    return list(database.activity_logs.find(
+        {"employee_id": employee_id, "timestamp": {"$gte": first - lookaround, "$lte": last + lookaround}},
+        {"_id": 0, "timestamp": 1, "active_window_title": 1, "focus_events": 1}))
+
+def _titles_around(timestamp, logs):
+    return focus_events.titles_around(timestamp, logs, config.SCREENSHOT_SEARCH_CONTEXT_SECONDS,
+                                      config.FOCUS_MAX_GAP_SECONDS)
+
+def _screenshot_window_titles(database, employee_id, timestamp):
+    ts = focus_events.naive_utc(timestamp)
+    return _titles_around(ts, _find_logs_around(database, employee_id, ts, ts))
+
+def _reindex_screenshot_titles(captures):
+    """captures: {employee_id: [(timestamp, [screenshot _id, ...])]}. One log query per employee, one bulk write."""
+    database = get_db()
+    if database is None:
+        raise ConnectionError("Database connection not available")
+    updates = []
+    for employee_id, shots in captures.items():
+        timestamps = [focus_events.naive_utc(timestamp) for timestamp, _ in shots]
+        logs = _find_logs_around(database, employee_id, min(timestamps), max(timestamps))
+        for ts, (_, screenshot_ids) in zip(timestamps, shots):
+            titles = _titles_around(ts, logs)
+            if titles:
+                updates.extend(UpdateOne({"employee_id": employee_id, "_id": screenshot_id}, # employee_id targets one shard
+                                         {"$addToSet": {"window_titles": {"$each": titles}}})
+                               for screenshot_id in screenshot_ids)
+    if updates:
+        database.screenshots.bulk_write(updates, ordered=False)
+
+title_indexer = search_index.DeferredTitleIndexer(
+    _reindex_screenshot_titles, delay_seconds=config.SCREENSHOT_SEARCH_CONTEXT_SECONDS + config.FOCUS_MAX_GAP_SECONDS)
+metrics.register_queue_depth("screenshot_titles", lambda: len(title_indexer))
+
+def search_screenshots(query, employee_ids=None, start=None, end=None, limit=50):
+    """Screenshots whose surrounding window titles match the words in query, newest first.
+
+    MongoDB evaluates $text on the text index alone: the employee and time filters and the sort
+    are applied in memory to every match before the limit, so callers should bound start.
+    """
+    database = get_db()
+    if database is None: return []
+    criteria = {"$text": {"$search": query}}
+    if employee_ids:
+        criteria["employee_id"] = {"$in": list(employee_ids)}
+    if start or end:
+        criteria["timestamp"] = {key: value for key, value in (("$gte", start), ("$lt", end)) if value}
+    results = list(database.screenshots.find(criteria, {"received_at": 0})
+                   .sort("timestamp", -1)
+                   .limit(limit))
+    for item in results:
+        item['url_path'] = f"/screenshots/{item['screenshot_path']}"
+    return results
 
 # Screenshots
 def add_screenshot_record(employee_id, timestamp, screenshot_filename):
@@ -184,24 +443,129 @@ def add_screenshot_record(employee_id, timestamp, screenshot_filename):
         "employee_id": employee_id,
         "timestamp": timestamp, # Expecting datetime object
         "screenshot_path": relative_path, # Store relative path
+        "window_titles": _screenshot_window_titles(database, employee_id, timestamp),
         "received_at": datetime.utcnow()
     }
     result = database.screenshots.insert_one(screenshot_entry)
+    title_indexer.schedule(employee_id, timestamp, [result.inserted_id])
      # Also update employee's last seen status
-    add_or_update_employee(employee_id, last_seen=timestamp)
+    record_last_seen(employee_id, timestamp)
     return result.inserted_id
 
+def add_screenshot_records(employee_id, timestamp, capture_id, displays):
+    """Stores the per-display screenshots of one multi-monitor capture.
+
+    displays: list of dicts with 'filename', 'display' and the monitor geometry.
+    """
+    database = get_db()
+    if database is None: return None
+
+    received_at = datetime.utcnow()
+    window_titles = _screenshot_window_titles(database, employee_id, timestamp) # Shared by all displays
+    entries = [{
+        "employee_id": employee_id,
+        "timestamp": timestamp,
+        "screenshot_path": os.path.join(employee_id, item["filename"]),
+        "capture_id": capture_id,
+        "display": item["display"],
+        "display_geometry": {key: item[key] for key in ("left", "top", "width", "height")},
+        "changed": item["changed"],
+        "window_titles": window_titles,
+        "received_at": received_at,
+    } for item in displays]
+    result = database.screenshots.insert_many(entries, ordered=True)
+    title_indexer.schedule(employee_id, timestamp, result.inserted_ids)
+    # One last_seen update for the whole capture
+    record_last_seen(employee_id, timestamp)
+    return result.inserted_ids
+
 def get_screenshots(employee_id, limit=50):
+    def load():
+        database = get_db()
+        if database is None: return None
+        screenshots_data = list(database.screenshots.find({"employee_id": employee_id})
+                               .sort("timestamp", -1)
+                               .limit(limit))
+        # Add full URL or relative path for template rendering
+        for item in screenshots_data:
+            # Creating a URL path relative to the 'static' or a dedicated 'media' route
+            item['url_path'] = f"/screenshots/{item['screenshot_path']}"
+        return screenshots_data
+    return query_cache.get_or_load(f"employee:{employee_id}", f"screenshots:{employee_id}:{limit}", load) or []
+
+# Agent Telemetry
+def add_agent_telemetry(employee_id, timestamp, stats):
+    """Stores one normalized agent_stats summary (see agent_stats.normalize_agent_stats)."""
+    database = get_db()
+    if database is None: return None
+    document = dict(stats, employee_id=employee_id, timestamp=timestamp, received_at=datetime.utcnow())
+    return database.agent_telemetry.insert_one(document).inserted_id
+
+def get_agent_telemetry_by_employee(since):
+    """Aggregates telemetry received since `since` into one summary per employee."""
     database = get_db()
     if database is None: return []
-    screenshots_data = list(database.screenshots.find({"employee_id": employee_id})
-                           .sort("timestamp", -1)
-                           .limit(limit))
-    # Add full URL or relative path for template rendering
-    for item in screenshots_data:
-        # Creating a URL path relative to the 'static' or a dedicated 'media' route
-        item['url_path'] = f"/screenshots/{item['screenshot_path']}"
-    return screenshots_data
+    pipeline = [
+        {"$match": {"received_at": {"$gte": since}}},
+        {"$group": {
+            "_id": "$employee_id",
+            "interval_s": {"$sum": "$interval_s"},
+            "cpu_s": {"$sum": "$cpu_s"},
+            "rss_kb_max": {"$max": "$rss_kb"},
+            "capture_count": {"$sum": "$capture_count"},
+            "capture_ms_total": {"$sum": {"$multiply": ["$capture_count", "$capture_ms_avg"]}},
+            "capture_ms_max": {"$max": "$capture_ms_max"},
+            "upload_count": {"$sum": "$upload_count"},
+            "upload_ms_total": {"$sum": {"$multiply": ["$upload_count", "$upload_ms_avg"]}},
+            "report_count": {"$sum": "$report_count"},
+            "report_ms_total": {"$sum": {"$multiply": ["$report_count", "$report_ms_avg"]}},
+            "upload_bytes": {"$sum": "$upload_bytes"},
+            "failures_total": {"$sum": "$failures_total"},
+        }},
+    ]
+    return list(database.agent_telemetry.aggregate(pipeline))
+
+# Agent Configuration
+def get_agent_configs():
+    def load():
+        database = get_db()
+        if database is None: return None
+        return {doc["scope"]: doc for doc in database.agent_configs.find()}
+    return query_cache.get_or_load("agent_configs", "agent_configs:all", load) or {}
+
+def get_agent_config_layers(employee_id):
+    """Returns the partial settings that apply to an employee, least specific first."""
+    configs = get_agent_configs()
+    employee = get_employee_by_id(employee_id) or {}
+    scopes = ["default"]
+    if employee.get("group"):
+        scopes.append(f"group:{employee['group']}")
+    scopes.append(f"employee:{employee_id}")
+    return [configs[scope]["settings"] for scope in scopes if scope in configs]
+
+def save_agent_config(scope, settings, updated_by=None):
+    """Stores the settings for a scope; an empty settings dict removes the scope's document."""
+    database = get_db()
+    if database is None: return None
+    if settings:
+        result = database.agent_configs.update_one(
+            {"scope": scope},
+            {"$set": {"settings": settings, "updated_at": datetime.utcnow(), "updated_by": updated_by}},
+            upsert=True)
+    else:
+        result = database.agent_configs.delete_one({"scope": scope})
+    query_cache.invalidate("agent_configs")
+    return result
+
+def set_employee_group(employee_id, group):
+    database = get_db()
+    if database is None: return None
+    if last_seen_buffer.pending(employee_id) is not None:
+        last_seen_buffer.flush() # The employee document may not exist until its first last_seen is written
+    update = {"$set": {"group": group}} if group else {"$unset": {"group": ""}}
+    result = database.employees.update_one({"employee_id": employee_id}, update)
+    invalidate_employee_cache(employee_id)
+    return result
 
 # User Authentication
 def get_user(username):
@@ -209,5 +573,46 @@ def get_user(username):
     if database is None: return None
     return database.users.find_one({"username": username})
 
+def set_user_display_timezone(username, tz_name):
+    database = get_db()
+    if database is None: return None
+    return database.users.update_one({"username": username}, {"$set": {"display_timezone": tz_name}})
+
 def verify_password(stored_hash, provided_password):
-    return check_password_hash(stored_hash, provided_password)
\ No newline at end of file
+    return check_password_hash(stored_hash, provided_password)
+
+# Hash of a random password, generated once with the current parameters. Unknown usernames are
+# checked against it so they cost the same time as real ones and can't be enumerated by timing.
+_dummy_password_hash = None
+
+def _get_dummy_password_hash():
+    global _dummy_password_hash
+    if _dummy_password_hash is None:
+        _dummy_password_hash = generate_password_hash(os.urandom(16).hex(), method=config.PASSWORD_HASH_METHOD)
+    return _dummy_password_hash
+
+def _hash_params(password_hash):
+    """The 'method:params' prefix of a werkzeug hash, e.g. 'pbkdf2:sha256:600000'."""
+    return password_hash.split("$", 1)[0]
+
+def authenticate_user(username, provided_password):
+    """Returns the user document if the credentials are valid, otherwise None.
+
+    Always performs exactly one password hash check, and re-hashes the stored password when
+    PASSWORD_HASH_METHOD has changed since it was created.
+    """
+    user = get_user(username)
+    if user is None:
+        check_password_hash(_get_dummy_password_hash(), provided_password)
+        return None
+    if not verify_password(user['password_hash'], provided_password):
+        return None
+
+    if _hash_params(user['password_hash']) != _hash_params(_get_dummy_password_hash()):
+        try:
+            new_hash = generate_password_hash(provided_password, method=config.PASSWORD_HASH_METHOD)
+            get_db().users.update_one({"_id": user["_id"]}, {"$set": {"password_hash": new_hash}})
+            logger.info(f"Upgraded password hash parameters for user '{username}'.")
+        except Exception as e:
+            logger.error(f"Failed to rehash password for user '{username}': {e}")
+    return user
\ No newline at end of file
@@ -0,0 +1,131 @@
+import atexit
+import logging
+import os
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LastSeenBuffer:
+    """
+    Coalesces employee last_seen bumps in memory and writes them in batches.
+
+    Every activity report and screenshot used to upsert the employee document. Instead, record()
+    keeps the newest timestamp per employee, and a background thread hands all pending entries
+    to write_batch every flush_interval seconds: one bulk write instead of one write per ingest
+    event. pending() lets readers overlay values that are not written yet, including the batch
+    being written. Pending entries are also flushed at exit and on SIGTERM.
+
+    write_batch({employee_id: (first_seen, last_seen)}) must be idempotent (e.g. upserts with $max),
+    since a failed batch is merged back and retried on the next flush.
+    """
+
+    def __init__(self, write_batch, flush_interval=5.0):
+        self._write_batch = write_batch
+        self.flush_interval = flush_interval
+        self._pending = {} # employee_id -> (earliest timestamp seen, newest timestamp seen)
+        self._inflight = {} # The batch being written: still pending() until the write is done
+        # Reentrant: the SIGTERM handler flushes on the main thread, which may be holding either lock
+        self._lock = threading.RLock()
+        self._flush_lock = threading.RLock() # One flush at a time (timer thread vs. shutdown)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def record(self, employee_id, timestamp):
+        if not self.running:
+            # No flusher (scripts, coalescing disabled): write through
+            self._write_batch({employee_id: (timestamp, timestamp)})
+            return
+        with self._lock:
+            self._merge(employee_id, timestamp, timestamp)
+
+    def _merge(self, employee_id, first, last):
+        current = self._pending.get(employee_id)
+        if current is None:
+            self._pending[employee_id] = (first, last)
+        else:
+            self._pending[employee_id] = (min(current[0], first), max(current[1], last))
+
+    def pending(self, employee_id=None):
+        """Unwritten last_seen values: {employee_id: last_seen}, or one value (None if nothing pending)."""
+        with self._lock:
+            if employee_id is not None:
+                entries = [batch[employee_id][1] for batch in (self._inflight, self._pending) if employee_id in batch]
+                return max(entries) if entries else None
+            merged = {key: last for key, (_, last) in self._inflight.items()}
+            for key, (_, last) in self._pending.items():
+                merged[key] = max(merged[key], last) if key in merged else last
+            return merged
+
+    def flush(self):
+        """Writes all pending entries. Returns the number written (0 on failure; entries are kept)."""
+        with self._flush_lock:
+            with self._lock:
+                for employee_id, (first, last) in self._inflight.items(): # Interrupted flush (SIGTERM)
+                    self._merge(employee_id, first, last)
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            if not batch:
+                return 0
+            try:
+                self._write_batch(batch)
+                return len(batch)
+            except Exception as e:
+                logger.error(f"Failed to flush {len(batch)} last_seen updates, will retry: {e}")
+                with self._lock:
+                    for employee_id, (first, last) in batch.items():
+                        self._merge(employee_id, first, last)
+                return 0
+            finally:
+                with self._lock:
+                    self._inflight = {}
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        if self.running or self.flush_interval <= 0:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="LastSeenFlushThread", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop) # Daemon threads are killed at exit, so flush what's left first
+        self._flush_on_sigterm()
+        return self
+
+    def _flush_on_sigterm(self):
+        # atexit doesn't run when SIGTERM terminates the process (flask run, a stopped container);
+        # flush first, then hand over to the previous handler (e.g. gunicorn's graceful worker exit)
+        try:
+            previous = signal.getsignal(signal.SIGTERM)
+
+            def handler(signum, frame):
+                self.stop()
+                if callable(previous):
+                    previous(signum, frame)
+                elif previous != signal.SIG_IGN: # Default action: terminate, as without this handler
+                    signal.signal(signum, signal.SIG_DFL)
+                    os.kill(os.getpid(), signum)
+            signal.signal(signal.SIGTERM, handler)
+        except ValueError: # Signal handlers can only be installed from the main thread
+            logger.warning("last_seen buffer started outside the main thread: pending updates are only flushed at normal exit.")
+
+    def stop(self, timeout=10):
+        """Stops the flusher and writes anything still pending. Safe to call more than once."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        written = self.flush()
+        if written:
+            logger.info(f"Flushed {written} pending last_seen updates on shutdown.")
@@ -0,0 +1,50 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """
+    In-memory token buckets keyed by an arbitrary string (client IP, username, ...).
+
+    Each key may burst up to `capacity` requests and regains `refill_per_second` tokens
+    per second. At most `max_keys` buckets are tracked; the least recently used are dropped
+    first, so a flood of random keys cannot exhaust memory.
+    """
+
+    def __init__(self, capacity, refill_per_second, max_keys=10000):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, last_refill)
+        self._lock = threading.Lock()
+
+    def _refilled(self, key, now):
+        tokens, last = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - last) * self.refill_per_second)
+
+    def consume(self, key, tokens=1):
+        """Takes tokens from key's bucket. Returns False (taking nothing) if not enough are left."""
+        now = time.monotonic()
+        with self._lock:
+            available = self._refilled(key, now)
+            allowed = available >= tokens
+            if allowed:
+                available -= tokens
+            self._buckets[key] = (available, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def retry_after(self, key, tokens=1):
+        """Seconds until key's bucket holds enough tokens again (0 if it already does)."""
+        with self._lock:
+            available = self._refilled(key, time.monotonic())
+        if available >= tokens or self.refill_per_second <= 0:
+            return 0
+        return int((tokens - available) / self.refill_per_second) + 1
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
@@ -1,13 +1,27 @@
 from flask import (
     Blueprint, render_template, request, jsonify, redirect, url_for,
-    flash, session, send_from_directory, abort
+    flash, session, send_from_directory, abort, Response, stream_with_context, make_response
 )
 from werkzeug.utils import secure_filename
+from pymongo.errors import OperationFailure
 import os
 import models  # Use models.logger
 import config
-from datetime import datetime, timezone
+import timefmt
+import export
+import ratelimit
+import metrics
+import agent_stats
+import agent_settings
+import focus_events
+import cluster
+import wire_format
+import json
+import socket
+import time
+from datetime import datetime, timezone, timedelta
 import functools # For login_required decorator
+import itertools
 import logging # Good practice to have it explicitly, though using models.logger
 
 # Use the logger configured in models.py
@@ -35,57 +49,107 @@ def client_auth_required(view):
         return view(*args, **kwargs)
     return wrapped_view
 
+def track_ingest_load(view):
+    """Feeds ingest latency to the load shedder and tells agents to back off while under pressure."""
+    @functools.wraps(view)
+    def wrapped_view(*args, **kwargs):
+        agent_settings.load_shedder.request_started()
+        start = time.perf_counter()
+        try:
+            response = make_response(view(*args, **kwargs))
+        finally:
+            agent_settings.load_shedder.request_finished(time.perf_counter() - start)
+        multiplier = agent_settings.load_shedder.interval_multiplier()
+        if multiplier > 1:
+            response.headers['X-Load-Shed-Multiplier'] = str(multiplier)
+        response.headers['X-Ingest-Node'] = ingest_node_id()
+        return response
+    return wrapped_view
+
+# --- Ingest Routing ---
+# Ingest handlers keep no per-process state beyond caches, so any node can serve any agent; the ring
+# only makes each agent's node predictable so its cache entries stay on one node.
+ingest_ring = cluster.HashRing(config.INGEST_NODES)
+REPORT_CONTENT_TYPES = wire_format.supported_content_types()
+REPORT_ENCODINGS = wire_format.supported_encodings()
+
+def ingest_node_id():
+    return config.INGEST_NODE_ID or f"{socket.gethostname()}:{os.getpid()}"
+
+def current_display_timezone():
+    """Returns the logged-in admin's display timezone, or the configured default."""
+    return timefmt.resolve_timezone_name(session.get('display_timezone'))
+
+# --- Login Rate Limiting ---
+# Checked before any DB lookup or password hash so a credential-stuffing burst can't pin the CPU
+login_ip_limiter = ratelimit.TokenBucketLimiter(config.LOGIN_IP_BURST, 1 / config.LOGIN_IP_REFILL_SECONDS)
+login_user_limiter = ratelimit.TokenBucketLimiter(config.LOGIN_USER_BURST, 1 / config.LOGIN_USER_REFILL_SECONDS)
+
 bp = Blueprint('main', __name__)
 
 # --- API Endpoints (for Clients) ---
 
 @bp.route('/api/report', methods=['POST'])
 @client_auth_required
+@track_ingest_load
 def api_report_activity():
-    """Receives activity data from the client agent."""
-    # Check if content type is application/json
-    if not request.is_json:
-        logger.warning(f"/api/report error from {request.remote_addr}: Content-Type is not application/json.")
-        return jsonify({"status": "error", "message": "Invalid Content-Type, expected application/json"}), 415 # Unsupported Media Type
-
-    data = request.get_json() # Use get_json() for better error handling if not JSON
-    if data is None:
-        logger.warning(f"/api/report error from {request.remote_addr}: Failed to decode JSON.")
-        return jsonify({"status": "error", "message": "Invalid JSON data"}), 400
-
-    logger.info(f"Received /api/report data from {request.remote_addr}: {data}")
-
-    if 'employee_id' not in data or 'timestamp_utc' not in data:
-        logger.warning(f"/api/report missing required data. Received: {data}")
+    """Receives activity data from the client agent.
+
+    The body may be JSON, MessagePack or CBOR, optionally gzip/zstd compressed (see wire_format.py).
+    """
+    max_bytes = config.REPORT_MAX_BODY_BYTES
+    if request.content_length is not None and request.content_length > max_bytes: # Before reading the body
+        logger.warning(f"/api/report error from {request.remote_addr}: Content-Length {request.content_length} exceeds {max_bytes} bytes")
+        return jsonify({"status": "error", "message": f"Request body exceeds {max_bytes} bytes"}), 413 # Payload Too Large
+    try:
+        # At most one byte over the limit, also for chunked bodies without a Content-Length
+        data = wire_format.decode(request.stream.read(max_bytes + 1), request.mimetype,
+                                  request.headers.get('Content-Encoding'), max_bytes=max_bytes)
+    except wire_format.UnsupportedFormat as e:
+        logger.warning(f"/api/report error from {request.remote_addr}: {e}")
+        return jsonify({"status": "error", "message": str(e),
+                        "accepted_content_types": REPORT_CONTENT_TYPES, "accepted_encodings": REPORT_ENCODINGS}), 415 # Unsupported Media Type
+    except wire_format.BodyTooLarge as e:
+        logger.warning(f"/api/report error from {request.remote_addr}: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 413
+    except ValueError as e:
+        logger.warning(f"/api/report error from {request.remote_addr}: {e}")
+        return jsonify({"status": "error", "message": "Invalid request body"}), 400
+
+    if not isinstance(data, dict) or 'employee_id' not in data or 'timestamp_utc' not in data:
+        logger.warning(f"/api/report missing required data from {request.remote_addr}.")
         return jsonify({"status": "error", "message": "Missing required data (employee_id, timestamp_utc)"}), 400
 
     employee_id = data.get('employee_id')
     timestamp_str = data.get('timestamp_utc') # Expecting ISO 8601 format string like YYYY-MM-DDTHH:MM:SS+00:00
     active_window = data.get('active_window', 'N/A') # Optional
     idle_time = data.get('system_idle_time', 0) # Get idle time if sent
+    events = focus_events.normalize_focus_events(data.get('focus_events')) # Sent by event-driven agents
 
     try:
         # Parse timestamp string to datetime object (UTC)
-        logger.info(f"Attempting to parse timestamp for /api/report: {timestamp_str}")
-        # --- REMOVED .replace("Z", "+00:00") ---
         timestamp = datetime.fromisoformat(timestamp_str)
-        # --- Ensure timezone aware if parsing somehow resulted in naive (shouldn't with offset) ---
         if timestamp.tzinfo is None:
              logger.warning(f"Parsed timestamp '{timestamp_str}' resulted in naive datetime. Assuming UTC.")
              timestamp = timestamp.replace(tzinfo=timezone.utc)
         elif timestamp.tzinfo != timezone.utc:
-             logger.warning(f"Parsed timestamp '{timestamp_str}' has non-UTC timezone ({timestamp.tzinfo}). Converting to UTC.")
              timestamp = timestamp.astimezone(timezone.utc)
-
-        logger.info(f"Successfully parsed timestamp for /api/report: {timestamp}")
     except (ValueError, TypeError) as e: # Catch TypeError if timestamp_str is not a string
         logger.error(f"/api/report invalid timestamp format or type '{timestamp_str}': {e}")
         return jsonify({"status": "error", "message": f"Invalid timestamp format: {timestamp_str}"}), 400
 
     try:
         # Add activity log to the database
-        models.add_activity_log(employee_id, timestamp, active_window_title=active_window, system_idle_time=idle_time)
-        logger.info(f"Received activity report successfully processed for {employee_id}") # Changed log message
+        models.add_activity_log(employee_id, timestamp, active_window_title=active_window, system_idle_time=idle_time,
+                                focus_events=events)
+        if 'agent_stats' in data:
+            stats = agent_stats.normalize_agent_stats(data['agent_stats'])
+            if stats is not None:
+                models.add_agent_telemetry(employee_id, timestamp, stats)
+        # One line per report; the full payload is only logged at DEBUG
+        logger.info(f"Activity report from {employee_id} ({request.mimetype}, {len(events)} focus events) processed.")
+        if logger.isEnabledFor(logging.DEBUG): # Don't format the payload unless it's logged
+            logger.debug(f"/api/report payload from {employee_id}: {data}")
         return jsonify({"status": "success", "message": "Activity logged"}), 200
     except ConnectionError as e:
          logger.error(f"API DB connection error during /api/report: {e}")
@@ -97,6 +161,7 @@ def api_report_activity():
 
 @bp.route('/api/upload_screenshot', methods=['POST'])
 @client_auth_required
+@track_ingest_load
 def api_upload_screenshot():
     """Receives screenshot file and metadata from the client agent."""
     logger.info(f"Received POST request on /api/upload_screenshot from {request.remote_addr}") # Log entry point
@@ -160,6 +225,7 @@ def api_upload_screenshot():
 
     try:
         file.save(save_path)
+        metrics.record_screenshot_written(os.path.getsize(save_path))
         logger.info(f"Screenshot saved for {employee_id} at {save_path}")
 
         # Add screenshot metadata record to the database
@@ -187,6 +253,119 @@ def api_upload_screenshot():
                 logger.error(f"Error removing file {save_path} after processing error: {remove_err}")
         return jsonify({"status": "error", "message": "Internal server error during upload"}), 500
 
+def _remove_files(paths):
+    for path in paths:
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+                logger.info(f"Removed partially saved file: {path}")
+            except OSError as remove_err:
+                logger.error(f"Error removing file {path}: {remove_err}")
+
+@bp.route('/api/upload_screenshots', methods=['POST'])
+@client_auth_required
+@track_ingest_load
+def api_upload_screenshots():
+    """Receives one capture covering several displays: a file part per display plus a 'displays' JSON list."""
+    employee_id = request.form.get('employee_id')
+    timestamp_str = request.form.get('timestamp_utc')
+    capture_id = request.form.get('capture_id', '')
+    logger.info(f"Received /api/upload_screenshots from {request.remote_addr}: employee_id={employee_id}, capture_id={capture_id}")
+
+    if not employee_id or not employee_id.isalnum() or not timestamp_str or not capture_id.isalnum():
+        return jsonify({"status": "error", "message": "Missing required form data (employee_id, timestamp_utc, capture_id)"}), 400
+
+    try:
+        displays = json.loads(request.form.get('displays', ''))
+        if not isinstance(displays, list) or not displays:
+            raise ValueError("expected a non-empty list")
+        for item in displays:
+            item["display"] = int(item["display"])
+            item["changed"] = bool(item.get("changed", True))
+            for key in ("left", "top", "width", "height"):
+                item[key] = int(item.get(key, 0))
+    except (ValueError, TypeError, KeyError) as e:
+        logger.warning(f"/api/upload_screenshots invalid displays metadata: {e}")
+        return jsonify({"status": "error", "message": "Invalid displays metadata"}), 400
+
+    try:
+        timestamp = datetime.fromisoformat(timestamp_str)
+        timestamp = timestamp.replace(tzinfo=timezone.utc) if timestamp.tzinfo is None else timestamp.astimezone(timezone.utc)
+    except (ValueError, TypeError) as e:
+        logger.error(f"/api/upload_screenshots invalid timestamp format or type '{timestamp_str}': {e}")
+        return jsonify({"status": "error", "message": f"Invalid timestamp format: {timestamp_str}"}), 400
+
+    files = []
+    for item in displays:
+        file = request.files.get(item.get("field") or f"screenshot_{item['display']}")
+        if not file or file.filename == '':
+            logger.warning(f"/api/upload_screenshots missing file part for display {item['display']}")
+            return jsonify({"status": "error", "message": f"No file for display {item['display']}"}), 400
+        files.append(file)
+
+    employee_dir = os.path.join(config.SCREENSHOT_STORAGE_PATH, employee_id)
+    try:
+        os.makedirs(employee_dir, exist_ok=True)
+    except OSError as e:
+        logger.error(f"Error creating directory {employee_dir}: {e}")
+        return jsonify({"status": "error", "message": "Could not create storage directory"}), 500
+
+    saved_paths = []
+    try:
+        for item, file in zip(displays, files):
+            file_ext = os.path.splitext(file.filename)[1] or '.png'
+            item["filename"] = secure_filename(f"{timestamp.strftime('%Y%m%d_%H%M%S_%f')}_d{item['display']}{file_ext}")
+            save_path = os.path.join(employee_dir, item["filename"])
+            file.save(save_path)
+            saved_paths.append(save_path)
+            metrics.record_screenshot_written(os.path.getsize(save_path))
+
+        models.add_screenshot_records(employee_id, timestamp, capture_id, displays)
+        logger.info(f"Saved {len(saved_paths)} display screenshot(s) for {employee_id}, capture_id={capture_id}")
+        return jsonify({"status": "success", "message": f"{len(saved_paths)} screenshot(s) uploaded"}), 200
+    except ConnectionError as e:
+        logger.error(f"API DB connection error during /api/upload_screenshots: {e}")
+        _remove_files(saved_paths)
+        return jsonify({"status": "error", "message": "Database connection error"}), 500
+    except Exception as e:
+        logger.error(f"Error processing multi-display upload for {employee_id}: {e}", exc_info=True)
+        _remove_files(saved_paths)
+        return jsonify({"status": "error", "message": "Internal server error during upload"}), 500
+
+@bp.route('/api/agent_config', methods=['GET'])
+@client_auth_required
+def api_agent_config():
+    """Returns the effective agent settings for an employee. Supports If-None-Match (ETag)."""
+    employee_id = request.args.get('employee_id', '')
+    if not employee_id or not employee_id.isalnum():
+        return jsonify({"status": "error", "message": "Missing or invalid employee_id"}), 400
+
+    try:
+        settings = agent_settings.merge_settings(*models.get_agent_config_layers(employee_id))
+    except ConnectionError as e:
+        logger.error(f"API DB connection error during /api/agent_config: {e}")
+        return jsonify({"status": "error", "message": "Database connection error"}), 500
+
+    multiplier = agent_settings.load_shedder.interval_multiplier()
+    # Agents multiply their report/screenshot intervals by interval_multiplier (also sent as the
+    # X-Load-Shed-Multiplier header on ingest responses, so they react between config fetches)
+    document = {
+        "settings": settings,
+        "load_shedding": {"interval_multiplier": multiplier},
+    }
+    if config.INGEST_NODES:
+        document["ingest_url"] = ingest_ring.node_for(employee_id) # Where this agent sends reports/screenshots
+    # Body formats /api/report accepts (JSON always); the agent picks the most compact one it can also encode
+    document["report_formats"] = {"content_types": REPORT_CONTENT_TYPES, "encodings": REPORT_ENCODINGS}
+    etag = agent_settings.compute_etag(document)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(jsonify(document))
+    response.set_etag(etag)
+    return response
+
+
 # --- Web UI Routes (for Admin) ---
 # (No changes needed in the Web UI routes below this line)
 
@@ -202,16 +381,26 @@ def login():
              flash(error)
              return render_template('login.html')
 
+        client_ip = request.remote_addr or 'unknown'
+        user_key = username.strip().lower()
+        if not login_ip_limiter.consume(client_ip) or not login_user_limiter.consume(user_key):
+            retry_after = max(login_ip_limiter.retry_after(client_ip), login_user_limiter.retry_after(user_key))
+            logger.warning(f"Login throttled for user '{username}' from {client_ip} (retry after {retry_after}s).")
+            flash('Too many login attempts. Please try again later.', 'error')
+            return render_template('login.html'), 429, {'Retry-After': str(retry_after)}
+
         try:
-            user = models.get_user(username)
+            user = models.authenticate_user(username, password)
 
-            if user is None or not models.verify_password(user['password_hash'], password):
+            if user is None:
                 error = 'Invalid username or password.'
             else:
+                login_user_limiter.reset(user_key)
                 # Basic session management - Flask-Login is recommended for production
                 session.clear()
                 session['user_id'] = str(user['_id']) # Store MongoDB ObjectId as string
                 session['username'] = user['username']
+                session['display_timezone'] = timefmt.resolve_timezone_name(user.get('display_timezone'))
                 logger.info(f"Admin user '{username}' logged in from {request.remote_addr}.")
                 return redirect(url_for('main.dashboard'))
 
@@ -244,17 +433,37 @@ def logout():
 @login_required
 def dashboard():
     """Shows the main dashboard with a list of employees."""
+    tz_name = current_display_timezone()
+    tz_label = timefmt.timezone_label(tz_name)
     try:
-        employees = models.get_employees()
-        return render_template('dashboard.html', employees=employees)
+        employees = timefmt.localize_records(models.get_employees(), ('first_seen', 'last_seen'), tz_name)
+        return render_template('dashboard.html', employees=employees, tz_label=tz_label)
     except ConnectionError as e:
         logger.error(f"Dashboard DB connection error: {e}")
         flash("Error connecting to the database to retrieve employee list.", "error")
-        return render_template('dashboard.html', employees=[]) # Render with empty list on error
+        return render_template('dashboard.html', employees=[], tz_label=tz_label) # Render with empty list on error
     except Exception as e:
         logger.error(f"Error loading dashboard: {e}", exc_info=True)
         flash("An unexpected error occurred while loading the dashboard.", "error")
-        return render_template('dashboard.html', employees=[])
+        return render_template('dashboard.html', employees=[], tz_label=tz_label)
+
+def group_captures(screenshots):
+    """Groups localized screenshot records into captures (one per capture cycle), newest first.
+
+    Records from /api/upload_screenshots share a capture_id, one per display; older single
+    uploads have none and form a capture of their own. Returns
+    [{"capture_id", "timestamp_display", "shots": [records ordered by display]}].
+    """
+    def capture_key(shot):
+        return shot.get('capture_id') or shot.get('screenshot_path') or str(shot.get('_id'))
+
+    ordered = sorted(screenshots, key=lambda shot: (shot.get('timestamp') or datetime.min, capture_key(shot)), reverse=True)
+    captures = []
+    for capture_id, shots in itertools.groupby(ordered, key=capture_key):
+        shots = sorted(shots, key=lambda shot: shot.get('display') or 0)
+        captures.append({"capture_id": capture_id, "timestamp_display": shots[0]['timestamp_display'], "shots": shots})
+    return captures
+
 
 @bp.route('/employee/<employee_id>')
 @login_required
@@ -275,10 +484,14 @@ def employee_detail(employee_id):
         activity_logs = models.get_activity_logs(employee_id, limit=200) # Get recent logs
         screenshots = models.get_screenshots(employee_id, limit=100) # Get recent screenshots
 
+        # Convert all timestamps in one pass instead of per cell in the template
+        tz_name = current_display_timezone()
         return render_template('employee_detail.html',
-                               employee=employee,
-                               activity_logs=activity_logs,
-                               screenshots=screenshots)
+                               employee=timefmt.localize_record(employee, ('first_seen', 'last_seen'), tz_name),
+                               activity_logs=timefmt.localize_records(activity_logs, ('timestamp',), tz_name),
+                               captures=group_captures(timefmt.localize_records(screenshots, ('timestamp',), tz_name)),
+                               window_time=focus_events.time_per_window(activity_logs, config.FOCUS_MAX_GAP_SECONDS)[:20],
+                               tz_label=timefmt.timezone_label(tz_name))
     except ConnectionError as e:
         logger.error(f"Employee Detail DB connection error: {e}")
         flash(f"Error connecting to the database for employee {employee_id}.", "error")
@@ -289,6 +502,243 @@ def employee_detail(employee_id):
         return redirect(url_for('main.dashboard'))
 
 
+def _parse_export_bound(value, is_end=False):
+    """Parses a YYYY-MM-DD date or ISO 8601 timestamp into a naive UTC datetime (as stored in the DB).
+
+    A bare end date is inclusive, so it is moved to midnight of the following day.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    if is_end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+@bp.route('/export/activity')
+@login_required
+def export_activity():
+    """Streams activity logs as CSV or Parquet for a date range and optional set of employees.
+
+    Query parameters: start, end (YYYY-MM-DD or ISO 8601), format (csv|parquet),
+    employee_id (repeatable, or comma separated). All employees are exported if none are given.
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in export.CONTENT_TYPES:
+        return jsonify({"status": "error", "message": "format must be 'csv' or 'parquet'"}), 400
+    if export_format == 'parquet' and not export.parquet_available():
+        return jsonify({"status": "error", "message": "Parquet export requires the pyarrow package on the server"}), 501
+
+    try:
+        start = _parse_export_bound(request.args['start'])
+        end = _parse_export_bound(request.args['end'], is_end=True)
+    except KeyError:
+        return jsonify({"status": "error", "message": "Missing required parameters (start, end)"}), 400
+    except (ValueError, TypeError) as e:
+        return jsonify({"status": "error", "message": f"Invalid date: {e}"}), 400
+    if end <= start:
+        return jsonify({"status": "error", "message": "end must be after start"}), 400
+    if end - start > timedelta(days=config.EXPORT_MAX_DAYS):
+        return jsonify({"status": "error", "message": f"Date range exceeds {config.EXPORT_MAX_DAYS} days"}), 400
+
+    employee_ids = [e.strip() for value in request.args.getlist('employee_id') for e in value.split(',') if e.strip()]
+    if any(not e.isalnum() for e in employee_ids):
+        return jsonify({"status": "error", "message": "Invalid employee ID format"}), 400
+
+    try:
+        if not employee_ids:
+            employee_ids = models.get_employee_ids()
+    except ConnectionError as e:
+        logger.error(f"Export DB connection error: {e}")
+        return jsonify({"status": "error", "message": "Database connection error"}), 500
+
+    logger.info(f"User '{session.get('username')}' exporting {export_format} activity for "
+                f"{len(employee_ids)} employees, {start} to {end}")
+    rows = models.iter_activity_logs(employee_ids, start, end, batch_size=config.EXPORT_BATCH_SIZE)
+    if export_format == 'parquet':
+        body = export.stream_activity_parquet(rows, row_group_size=config.EXPORT_ROW_GROUP_SIZE)
+    else:
+        body = export.stream_activity_csv(rows, flush_every=config.EXPORT_BATCH_SIZE)
+
+    filename = f"activity_{start:%Y%m%d}_{end:%Y%m%d}.{export_format}"
+    return Response(stream_with_context(body),
+                    mimetype=export.CONTENT_TYPES[export_format],
+                    headers={"Content-Disposition": f"attachment; filename={filename}",
+                             "X-Accel-Buffering": "no"}) # Stop reverse proxies from buffering the whole export
+
+
+@bp.route('/search')
+@login_required
+def search_screenshots():
+    """Finds screenshots by the window titles focused around them.
+
+    Query parameters: q (words, "quoted phrase", -excluded), employee_id (repeatable or comma
+    separated), start, end (YYYY-MM-DD or ISO 8601), limit. Without start, only the
+    SCREENSHOT_SEARCH_DEFAULT_DAYS before end (or now) are searched. Returns JSON with format=json.
+    """
+    want_json = request.args.get('format') == 'json'
+    query = request.args.get('q', '').strip()
+    employee_ids = [e.strip() for value in request.args.getlist('employee_id') for e in value.split(',') if e.strip()]
+    error, error_status = None, 400
+    results = []
+    took_ms = None
+    try:
+        start = _parse_export_bound(request.args['start']) if request.args.get('start') else None
+        end = _parse_export_bound(request.args['end'], is_end=True) if request.args.get('end') else None
+        limit = min(max(1, int(request.args.get('limit', 50))), config.SCREENSHOT_SEARCH_MAX_RESULTS)
+    except (ValueError, TypeError) as e:
+        error = f"Invalid parameter: {e}"
+    else:
+        if start is None and config.SCREENSHOT_SEARCH_DEFAULT_DAYS > 0:
+            start = (end or datetime.utcnow()) - timedelta(days=config.SCREENSHOT_SEARCH_DEFAULT_DAYS)
+    if not error and any(not e.isalnum() for e in employee_ids):
+        error = "Invalid employee ID format"
+
+    if query and not error:
+        try:
+            search_start = time.perf_counter()
+            results = models.search_screenshots(query, employee_ids, start, end, limit)
+            took_ms = round((time.perf_counter() - search_start) * 1000, 1)
+            logger.info(f"User '{session.get('username')}' searched screenshots for {query!r}: {len(results)} results in {took_ms} ms")
+        except ConnectionError as e:
+            logger.error(f"Screenshot search DB connection error: {e}")
+            error, error_status = "Database connection error", 503
+        except OperationFailure as e: # e.g. the text index is missing or still being built
+            logger.error(f"Screenshot search failed for {query!r}: {e}")
+            error, error_status = "Search is not available right now, please try again later", 503
+
+    if want_json:
+        if error:
+            return jsonify({"status": "error", "message": error}), error_status
+        return jsonify({
+            "status": "success",
+            "took_ms": took_ms,
+            "start_utc": start.replace(tzinfo=timezone.utc).isoformat() if start else None,
+            "results": [{
+                "employee_id": shot["employee_id"],
+                "timestamp_utc": shot["timestamp"].replace(tzinfo=timezone.utc).isoformat(),
+                "url_path": shot["url_path"],
+                "display": shot.get("display"),
+                "capture_id": shot.get("capture_id"),
+                "window_titles": shot.get("window_titles", []),
+            } for shot in results],
+        })
+
+    if error:
+        flash(error, 'error')
+    tz_name = current_display_timezone()
+    return render_template('search.html', query=query, args=request.args, took_ms=took_ms,
+                           default_days=config.SCREENSHOT_SEARCH_DEFAULT_DAYS,
+                           results=timefmt.localize_records(results, ('timestamp',), tz_name),
+                           tz_label=timefmt.timezone_label(tz_name))
+
+
+@bp.route('/fleet')
+@login_required
+def fleet():
+    """Shows the monitoring agent's own overhead across the fleet (percentiles over agents)."""
+    try:
+        hours = min(max(int(request.args.get('hours', 24)), 1), 24 * config.AGENT_TELEMETRY_RETENTION_DAYS)
+    except ValueError:
+        hours = 24
+    try:
+        since = datetime.utcnow() - timedelta(hours=hours)
+        agents = [agent_stats.per_agent_figures(group) for group in models.get_agent_telemetry_by_employee(since)]
+    except ConnectionError as e:
+        logger.error(f"Fleet view DB connection error: {e}")
+        flash("Error connecting to the database to retrieve agent telemetry.", "error")
+        agents = []
+    agents.sort(key=lambda agent: agent['cpu_pct'] or 0, reverse=True)
+    return render_template('fleet.html',
+                           hours=hours,
+                           percentiles=agent_stats.fleet_percentiles(agents),
+                           metrics=agent_stats.FLEET_METRICS,
+                           heaviest_agents=agents[:25])
+
+
+@bp.route('/agent_config', methods=['GET', 'POST'])
+@login_required
+def agent_config():
+    """Lists and edits agent settings for the default scope, groups and individual employees."""
+    if request.method == 'POST':
+        scope = request.form.get('scope', '').strip()
+        kind, _, name = scope.partition(':')
+        valid_scope = scope == 'default' or (kind in ('group', 'employee') and name.isalnum())
+        try:
+            settings = json.loads(request.form.get('settings') or '{}')
+            clean, errors = agent_settings.validate_settings(settings)
+        except ValueError as e:
+            clean, errors = {}, [f"Invalid JSON: {e}"]
+        if not valid_scope:
+            errors.insert(0, "Scope must be 'default', 'group:<name>' or 'employee:<id>' (alphanumeric).")
+
+        if errors:
+            for error in errors:
+                flash(error, 'error')
+        else:
+            try:
+                models.save_agent_config(scope, clean, updated_by=session.get('username'))
+                logger.info(f"User '{session.get('username')}' updated agent config for scope '{scope}': {clean}")
+                flash(f"Agent settings for '{scope}' saved." if clean else f"Agent settings for '{scope}' removed.", 'info')
+                return redirect(url_for('main.agent_config'))
+            except ConnectionError as e:
+                logger.error(f"Agent config DB connection error: {e}")
+                flash("Error connecting to the database to save agent settings.", "error")
+
+    try:
+        configs = timefmt.localize_records(sorted(models.get_agent_configs().values(), key=lambda doc: doc['scope']),
+                                           ('updated_at',), current_display_timezone())
+    except ConnectionError as e:
+        logger.error(f"Agent config DB connection error: {e}")
+        flash("Error connecting to the database to load agent settings.", "error")
+        configs = []
+    return render_template('agent_config.html',
+                           configs=configs,
+                           defaults=agent_settings.DEFAULTS,
+                           schema=agent_settings.SCHEMA,
+                           load_shed_multiplier=agent_settings.load_shedder.interval_multiplier())
+
+
+@bp.route('/employee/<employee_id>/group', methods=['POST'])
+@login_required
+def set_employee_group(employee_id):
+    """Assigns an employee to an agent config group (blank removes the assignment)."""
+    group = request.form.get('group', '').strip()
+    if not employee_id.isalnum() or (group and not group.isalnum()):
+        flash('Employee ID and group name must be alphanumeric.', 'error')
+        return redirect(url_for('main.dashboard'))
+    try:
+        models.set_employee_group(employee_id, group or None)
+        flash(f"Group for {employee_id} set to '{group}'." if group else f"Group removed for {employee_id}.", 'info')
+    except ConnectionError as e:
+        logger.error(f"Set group DB connection error: {e}")
+        flash("Error connecting to the database to save the group.", "error")
+    return redirect(url_for('main.employee_detail', employee_id=employee_id))
+
+
+@bp.route('/preferences', methods=['GET', 'POST'])
+@login_required
+def preferences():
+    """Lets the logged-in admin choose the timezone used to display timestamps."""
+    if request.method == 'POST':
+        tz_name = request.form.get('display_timezone', '')
+        if not timefmt.is_valid_timezone(tz_name):
+            flash(f'Unknown timezone: {tz_name}', 'error')
+        else:
+            try:
+                models.set_user_display_timezone(session['username'], tz_name)
+                session['display_timezone'] = tz_name
+                flash(f'Display timezone set to {tz_name}.', 'info')
+                return redirect(url_for('main.dashboard'))
+            except ConnectionError as e:
+                logger.error(f"Preferences DB connection error: {e}")
+                flash("Error connecting to the database to save preferences.", "error")
+
+    return render_template('preferences.html',
+                           timezones=timefmt.available_timezones(),
+                           current_timezone=current_display_timezone())
+
+
 # --- Route for serving stored screenshots ---
 @bp.route('/screenshots/<path:employee_id>/<path:filename>') # Use path converter for more flexibility if needed
 @login_required # Ensure only logged-in admins can access screenshot files directly
@@ -0,0 +1,90 @@
+import atexit
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DeferredTitleIndexer:
+    """
+    Re-indexes the window titles of new screenshots once the reports around them have arrived.
+
+    A screenshot is indexed on upload with the titles of the logs already stored, but the focus
+    changes around it only reach the server with the agent's next reports. schedule() queues the
+    capture, and a background thread hands every capture whose delay has passed to index_batch
+    every interval seconds: a few queries per batch, instead of a screenshot lookup per report.
+
+    index_batch({employee_id: [(timestamp, [screenshot _id, ...]), ...]}) must be idempotent
+    (e.g. $addToSet). Captures queued in a process that dies keep their upload-time titles.
+    """
+
+    def __init__(self, index_batch, delay_seconds, interval=30.0):
+        self._index_batch = index_batch
+        self.delay_seconds = delay_seconds
+        self.interval = interval
+        self._queue = [] # Heap of (due monotonic time, sequence, employee_id, timestamp, ids)
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._queue)
+
+    def schedule(self, employee_id, timestamp, screenshot_ids):
+        if not self.running:
+            return # No indexer thread (scripts): upload-time titles only
+        with self._lock:
+            self._sequence += 1
+            heapq.heappush(self._queue, (time.monotonic() + self.delay_seconds, self._sequence,
+                                         employee_id, timestamp, list(screenshot_ids)))
+
+    def flush(self, everything=False):
+        """Indexes the captures that are due (all of them with everything). Returns how many."""
+        with self._flush_lock:
+            now = time.monotonic()
+            batch, count = {}, 0
+            with self._lock:
+                while self._queue and (everything or self._queue[0][0] <= now):
+                    _, _, employee_id, timestamp, ids = heapq.heappop(self._queue)
+                    batch.setdefault(employee_id, []).append((timestamp, ids))
+                    count += 1
+            if not batch:
+                return 0
+            try:
+                self._index_batch(batch)
+                return count
+            except Exception as e:
+                logger.error(f"Failed to re-index window titles of {count} screenshots: {e}")
+                return 0
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def start(self):
+        if self.running or self.interval <= 0:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="TitleIndexThread", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=10):
+        """Stops the thread and indexes what is queued with the logs stored so far."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        indexed = self.flush(everything=True)
+        if indexed:
+            logger.info(f"Re-indexed window titles of {indexed} queued screenshots on shutdown.")
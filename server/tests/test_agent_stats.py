@@ -0,0 +1,31 @@
+import pytest
+
+import agent_stats
+
+
+@pytest.mark.parametrize("values, fraction, expected", [
+    (list(range(1, 11)), 0.50, 5),
+    (list(range(1, 11)), 0.95, 10),
+    (list(range(1, 9)), 0.50, 4),
+    (list(range(1, 9)), 0.95, 8),
+    (list(range(1, 10)), 0.50, 5),
+    (list(range(1, 10)), 0.95, 9),
+    (list(range(1, 21)), 0.95, 19),
+    (list(range(1, 101)), 0.99, 99),
+    (list(range(1, 91)), 0.70, 63),
+    ([7], 0.50, 7),
+    ([1, 2], 0.0, 1),
+    ([1, 2], 1.0, 2),
+])
+def test_percentile_is_nearest_rank(values, fraction, expected):
+    assert agent_stats.percentile(values, fraction) == expected
+
+
+def test_percentile_of_nothing():
+    assert agent_stats.percentile([], 0.5) is None
+
+
+def test_fleet_percentiles_uses_nearest_rank():
+    agents = [{"cpu_pct": float(value)} for value in range(1, 11)]
+    row = next(row for row in agent_stats.fleet_percentiles(agents) if row["key"] == "cpu_pct")
+    assert (row["p50"], row["agents"]) == (5.0, 10)
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+import models
+
+
+class RecordingScreenshots:
+    """Stands in for db.screenshots: mongomock has no $text, so record the query instead."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.criteria = self.sort_by = self.limit_to = None
+
+    def find(self, criteria, projection=None):
+        self.criteria = criteria
+        return self
+
+    def sort(self, key, direction):
+        self.sort_by = (key, direction)
+        return self
+
+    def limit(self, count):
+        self.limit_to = count
+        return iter(self.docs)
+
+
+class RecordingDatabase:
+    def __init__(self, screenshots):
+        self.screenshots = screenshots
+
+
+def test_search_screenshots_filters_by_employee_and_dates(monkeypatch):
+    screenshots = RecordingScreenshots([{"employee_id": "E1", "timestamp": datetime(2024, 1, 2),
+                                         "screenshot_path": "E1/a.png", "window_titles": ["Inbox"]}])
+    monkeypatch.setattr(models, "get_db", lambda: RecordingDatabase(screenshots))
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 8)
+
+    results = models.search_screenshots("inbox", ["E1", "E2"], start, end, limit=10)
+
+    assert screenshots.criteria == {"$text": {"$search": "inbox"}, "employee_id": {"$in": ["E1", "E2"]},
+                                    "timestamp": {"$gte": start, "$lt": end}}
+    assert (screenshots.sort_by, screenshots.limit_to) == (("timestamp", -1), 10)
+    assert results[0]["url_path"] == "/screenshots/E1/a.png"
+
+
+def test_search_screenshots_without_filters(monkeypatch):
+    screenshots = RecordingScreenshots([])
+    monkeypatch.setattr(models, "get_db", lambda: RecordingDatabase(screenshots))
+    assert models.search_screenshots("inbox") == []
+    assert screenshots.criteria == {"$text": {"$search": "inbox"}}
+
+
+@pytest.fixture
+def search_calls(monkeypatch):
+    """Logged-in test client for /search; returns the arguments models.search_screenshots got."""
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient()[config.MONGO_DB_NAME]
+    monkeypatch.setattr(models, "db", database)
+    monkeypatch.setattr(models, "get_db", lambda: database)
+    monkeypatch.setattr(models, "start_background_setup", lambda: None)
+    calls = []
+    monkeypatch.setattr(models, "search_screenshots",
+                        lambda query, employee_ids, start, end, limit: calls.append((query, employee_ids, start, end)) or [])
+    import app as server_app
+    client = server_app.create_app().test_client()
+    with client.session_transaction() as session:
+        session["user_id"], session["username"] = "test", "admin"
+    return client, calls
+
+
+def test_search_route_applies_employee_and_date_filters(search_calls):
+    client, calls = search_calls
+    response = client.get("/search?q=inbox&employee_id=E1,E2&start=2024-01-01&end=2024-01-07&format=json")
+    assert response.status_code == 200
+    assert calls == [("inbox", ["E1", "E2"], datetime(2024, 1, 1), datetime(2024, 1, 8))] # End date is inclusive
+
+
+def test_search_route_defaults_to_recent_days(search_calls, monkeypatch):
+    client, calls = search_calls
+    monkeypatch.setattr(config, "SCREENSHOT_SEARCH_DEFAULT_DAYS", 30)
+    assert client.get("/search?q=inbox&format=json").status_code == 200
+    _, _, start, end = calls[-1]
+    assert end is None
+    assert abs(start - (datetime.utcnow() - timedelta(days=30))) < timedelta(minutes=1)
+
+    assert client.get("/search?q=inbox&end=2024-01-31&format=json").status_code == 200
+    assert calls[-1][2:] == (datetime(2024, 1, 2), datetime(2024, 2, 1)) # 30 days before the end of To
+
+
+def test_search_route_without_default_window(search_calls, monkeypatch):
+    client, calls = search_calls
+    monkeypatch.setattr(config, "SCREENSHOT_SEARCH_DEFAULT_DAYS", 0)
+    assert client.get("/search?q=inbox&format=json").status_code == 200
+    assert calls[-1][2:] == (None, None)
+
+
+def test_search_page_explains_default_window(search_calls, monkeypatch):
+    client, _ = search_calls
+    monkeypatch.setattr(config, "SCREENSHOT_SEARCH_DEFAULT_DAYS", 30)
+    page = client.get("/search?q=inbox").get_data(as_text=True)
+    assert "the last 30 days are searched" in page
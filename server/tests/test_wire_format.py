@@ -0,0 +1,68 @@
+import gzip
+import json
+
+import pytest
+
+import wire_format
+
+MAX_BYTES = 1000
+SMALL = json.dumps({"employee_id": "E1", "focus_events": []}).encode()
+LARGE = json.dumps({"employee_id": "E1", "pad": "x" * 5000}).encode()
+
+
+def decode(body, encoding=None):
+    return wire_format.decode(body, wire_format.JSON, encoding, max_bytes=MAX_BYTES)
+
+
+def test_identity_body_within_limit():
+    assert decode(SMALL) == {"employee_id": "E1", "focus_events": []}
+
+
+def test_identity_body_over_limit():
+    with pytest.raises(wire_format.BodyTooLarge):
+        decode(LARGE)
+
+
+def test_gzip_body_over_limit_once_decompressed():
+    body = gzip.compress(LARGE)
+    assert len(body) < MAX_BYTES
+    with pytest.raises(wire_format.BodyTooLarge):
+        decode(body, "gzip")
+
+
+def test_malformed_body_is_not_too_large():
+    with pytest.raises(ValueError) as excinfo:
+        decode(b"{not json")
+    assert not isinstance(excinfo.value, wire_format.BodyTooLarge)
+
+
+def test_unknown_encoding():
+    with pytest.raises(wire_format.UnsupportedFormat):
+        decode(SMALL, "br")
+
+
+class TestZstd:
+    zstandard = pytest.importorskip("zstandard")
+
+    def test_round_trip(self):
+        assert decode(self.zstandard.ZstdCompressor().compress(SMALL), "zstd")["employee_id"] == "E1"
+
+    def test_declared_size_over_limit(self):
+        body = self.zstandard.ZstdCompressor(write_content_size=True).compress(LARGE)
+        with pytest.raises(wire_format.BodyTooLarge):
+            decode(body, "zstd")
+
+    def test_undeclared_size_over_limit(self):
+        body = self.zstandard.ZstdCompressor(write_content_size=False).compress(LARGE)
+        assert self.zstandard.frame_content_size(body) == -1
+        with pytest.raises(wire_format.BodyTooLarge):
+            decode(body, "zstd")
+
+    def test_undeclared_size_within_limit(self):
+        body = self.zstandard.ZstdCompressor(write_content_size=False).compress(SMALL)
+        assert decode(body, "zstd")["employee_id"] == "E1"
+
+    def test_invalid_frame(self):
+        with pytest.raises(ValueError) as excinfo:
+            decode(b"\x28\xb5\x2f\xfd garbage", "zstd")
+        assert not isinstance(excinfo.value, wire_format.BodyTooLarge)
@@ -0,0 +1,86 @@
+import functools
+import logging
+from datetime import datetime, timezone
+import pytz
+import config
+
+logger = logging.getLogger(__name__)
+
+DISPLAY_FORMAT = '%Y-%m-%d %I:%M:%S %p' # Example: 2024-04-29 07:30:00 PM (abbreviation appended)
+
+# UTC offsets only change at DST/zone transitions, which always fall on a quarter hour,
+# so one pytz conversion per 15 minute bucket is enough for every timestamp inside it.
+_BUCKET_SECONDS = 900
+_EPOCH = datetime(1970, 1, 1)
+
+
+@functools.lru_cache(maxsize=64)
+def get_timezone(tz_name):
+    return pytz.timezone(tz_name)
+
+
+def is_valid_timezone(tz_name):
+    return tz_name in pytz.all_timezones_set
+
+
+def available_timezones():
+    return pytz.common_timezones
+
+
+def resolve_timezone_name(tz_name):
+    """Returns tz_name if it is a known zone, otherwise the configured default."""
+    if tz_name and is_valid_timezone(tz_name):
+        return tz_name
+    return config.DISPLAY_TIMEZONE
+
+
+@functools.lru_cache(maxsize=8192)
+def _bucket_offset(tz_name, bucket):
+    """Returns (utcoffset, abbreviation) for the given zone during one bucket."""
+    bucket_start = datetime.fromtimestamp(bucket * _BUCKET_SECONDS, tz=timezone.utc)
+    local = bucket_start.astimezone(get_timezone(tz_name))
+    return local.utcoffset(), local.tzname()
+
+
+def format_datetime(dt, tz_name=None):
+    """Formats a UTC datetime (naive values are assumed UTC, as stored in the DB) in tz_name."""
+    if dt is None:
+        return "N/A"
+    if not isinstance(dt, datetime):
+        return str(dt) # Return as string if not a datetime object
+
+    tz_name = tz_name or config.DISPLAY_TIMEZONE
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    try:
+        bucket = int((dt - _EPOCH).total_seconds() // _BUCKET_SECONDS)
+        offset, abbreviation = _bucket_offset(tz_name, bucket)
+        return f"{(dt + offset).strftime(DISPLAY_FORMAT)} {abbreviation}"
+    except (OverflowError, ValueError) as e:
+        logger.error(f"Error formatting datetime {dt!r} for timezone {tz_name}: {e}")
+        return str(dt)
+
+
+def timezone_label(tz_name=None):
+    """Short label for table headers, e.g. 'IST'."""
+    tz_name = tz_name or config.DISPLAY_TIMEZONE
+    return datetime.now(timezone.utc).astimezone(get_timezone(tz_name)).tzname()
+
+
+def localize_record(record, fields, tz_name=None):
+    """Returns a shallow copy of record with a '<field>_display' string for each datetime field.
+
+    Copies rather than mutates so cached query results stay timezone neutral.
+    """
+    if record is None:
+        return None
+    item = dict(record)
+    for field in fields:
+        item[f"{field}_display"] = format_datetime(record.get(field), tz_name)
+    return item
+
+
+def localize_records(records, fields, tz_name=None):
+    """Bulk version of localize_record for lists of DB documents."""
+    tz_name = tz_name or config.DISPLAY_TIMEZONE
+    return [localize_record(record, fields, tz_name) for record in records]
@@ -0,0 +1,127 @@
+"""
+Request body formats accepted on /api/report, negotiated by Content-Type and Content-Encoding.
+
+JSON is always accepted. MessagePack (msgpack) and CBOR (cbor2) are more compact and cheaper to
+parse; zstd (zstandard) and gzip compress the body, which pays off for reports carrying many focus
+events. Every format carries the same document as the JSON body (see client/wire_format.py).
+The optional libraries are only needed for the formats that use them; /api/agent_config tells
+agents which formats this server accepts.
+"""
+import json
+import threading
+import zlib
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+CONTENT_TYPE_ALIASES = {"application/x-msgpack": MSGPACK, "application/vnd.msgpack": MSGPACK}
+
+
+class UnsupportedFormat(ValueError):
+    """Content-Type or Content-Encoding this server can't decode (HTTP 415)."""
+
+
+class BodyTooLarge(ValueError):
+    """Body larger than max_bytes, as sent or once decompressed (HTTP 413)."""
+
+
+def _msgpack_loads(body):
+    import msgpack
+    return msgpack.unpackb(body, raw=False, strict_map_key=True)
+
+
+def _cbor_loads(body):
+    import cbor2
+    return cbor2.loads(body)
+
+
+def _module_available(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+
+_DECODERS = {JSON: json.loads, MSGPACK: _msgpack_loads, CBOR: _cbor_loads}
+_DECODER_MODULES = {MSGPACK: "msgpack", CBOR: "cbor2"}
+_ENCODING_MODULES = {"zstd": "zstandard"}
+
+
+def supported_content_types():
+    return [content_type for content_type in _DECODERS
+            if content_type not in _DECODER_MODULES or _module_available(_DECODER_MODULES[content_type])]
+
+
+def supported_encodings():
+    return [encoding for encoding in ("zstd", "gzip")
+            if encoding not in _ENCODING_MODULES or _module_available(_ENCODING_MODULES[encoding])]
+
+
+def _gunzip(body, max_bytes):
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, max_bytes + 1)
+    except zlib.error as e:
+        raise ValueError(f"Invalid gzip body: {e}")
+    if len(data) > max_bytes or decompressor.unconsumed_tail:
+        raise BodyTooLarge(f"Decompressed body exceeds {max_bytes} bytes")
+    return data
+
+
+_zstd_local = threading.local() # A ZstdDecompressor is costly to create and not thread-safe: one per thread
+
+def _unzstd(body, max_bytes):
+    try:
+        import zstandard
+    except ImportError:
+        raise UnsupportedFormat("Content-Encoding zstd is not supported by this server")
+    decompressor = getattr(_zstd_local, "decompressor", None)
+    if decompressor is None:
+        decompressor = _zstd_local.decompressor = zstandard.ZstdDecompressor()
+    try:
+        if zstandard.frame_content_size(body) > max_bytes: # Declared in the frame header: reject up front
+            raise BodyTooLarge(f"Decompressed body exceeds {max_bytes} bytes")
+        # Frames need not declare their size, so stream and stop one byte past the limit
+        chunks, size = [], 0
+        with decompressor.stream_reader(body) as reader:
+            while size <= max_bytes:
+                chunk = reader.read(max_bytes + 1 - size)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+    except zstandard.ZstdError as e:
+        raise ValueError(f"Invalid zstd body: {e}")
+    if size > max_bytes:
+        raise BodyTooLarge(f"Decompressed body exceeds {max_bytes} bytes")
+    return b"".join(chunks)
+
+
+def decode(body, content_type, content_encoding=None, max_bytes=1024 * 1024):
+    """Decodes a request body into a Python object.
+
+    content_type is the mimetype without parameters. Raises UnsupportedFormat for unknown
+    types/encodings (or ones whose library isn't installed), BodyTooLarge for bodies of more
+    than max_bytes (as sent or decompressed) and ValueError for malformed bodies.
+    """
+    content_type = (content_type or "").lower()
+    content_type = JSON if content_type.endswith("+json") else CONTENT_TYPE_ALIASES.get(content_type, content_type)
+    decoder = _DECODERS.get(content_type)
+    if decoder is None:
+        raise UnsupportedFormat(f"Unsupported Content-Type '{content_type}'")
+    if len(body) > max_bytes:
+        raise BodyTooLarge(f"Body exceeds {max_bytes} bytes")
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "gzip":
+        body = _gunzip(body, max_bytes)
+    elif encoding == "zstd":
+        body = _unzstd(body, max_bytes)
+    elif encoding != "identity":
+        raise UnsupportedFormat(f"Unsupported Content-Encoding '{encoding}'")
+    try:
+        return decoder(body)
+    except ImportError:
+        raise UnsupportedFormat(f"Content-Type '{content_type}' is not supported by this server")
+    except Exception as e: # Each library raises its own exception types for malformed input
+        raise ValueError(f"Invalid {content_type} body: {e}")